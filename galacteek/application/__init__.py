@@ -65,7 +65,7 @@ from galacteek.core.asynclib import SignalNotEmittedError
 
 from galacteek.services import cached_property
 from galacteek.core.ctx import IPFSContext
-from galacteek.core.multihashmetadb import IPFSObjectMetadataDatabase
+from galacteek.core.multihashmetadb import IPFSObjectMetadataStore
 from galacteek.core.clipboard import ClipboardTracker
 from galacteek.core.db import SqliteDatabase
 from galacteek.core import pkgResourcesListDir
@@ -122,6 +122,7 @@ from galacteek.ipdapps.loader import DappsRegistry
 
 from galacteek.ld import ldRenderersRootPath
 from galacteek.ld.manager import LDSchemasImporter
+from galacteek.ld.ctxcache import contextsCacheSetup
 
 from galacteek.dweb.webscripts import ipfsClientScripts
 from galacteek.dweb.render import defaultJinjaEnv
@@ -300,6 +301,7 @@ class GalacteekApplication(ApplicationDaemonStarterMixin,
         self.__creds = None
 
         self.sqliteDb = None
+        self.ldContextsStore = None
         self.scheduler = None
         self.orbitConnector = None
         self.netProxy = None
@@ -599,8 +601,19 @@ class GalacteekApplication(ApplicationDaemonStarterMixin,
         # Discover/preload LD schemas
         self.ldSchemas.discover()
 
-        self.multihashDb = IPFSObjectMetadataDatabase(
-            str(self._mHashDbLocation), loop=self.loop)
+        # JSON-LD contexts caches
+        self.ldContextsStore = contextsCacheSetup(
+            self._ldContextsStoreLocation)
+
+        mhCfg = cGet('multihashDb')
+        self.multihashDb = IPFSObjectMetadataStore(
+            str(self._mHashStoreLocation),
+            legacyPath=str(self._mHashDbLocation),
+            cacheSize=mhCfg.cacheSize,
+            maxSize=mhCfg.maxSize,
+            maxAge=mhCfg.maxAge
+        )
+        ensure(self.multihashDb.setup())
 
         self.resourceOpener = IPFSResourceOpener(parent=self)
 
@@ -1209,6 +1222,8 @@ class GalacteekApplication(ApplicationDaemonStarterMixin,
 
         self.__pwVaultLocation = self.dataLocation.joinpath('pwvault')
         self._mHashDbLocation = self.dataLocation.joinpath('mhashmetadb')
+        self._mHashStoreLocation = self.dataLocation.joinpath(
+            'mhashmeta.sqlite3')
         self._sqliteDbLocation = self.dataLocation.joinpath('db.sqlite')
         self._torConfigLocation = self.dataLocation.joinpath('torrc')
         self._torDataDirLocation = self.dataLocation.joinpath('tor-data')
@@ -1231,6 +1246,8 @@ class GalacteekApplication(ApplicationDaemonStarterMixin,
             'pinstatus.json')
         self._nsCacheLocation = self.dataLocation.joinpath(
             'nscache.json')
+        self._ldContextsStoreLocation = self.dataLocation.joinpath(
+            'ldcontexts.cache')
         self._torrentStateLocation = self.dataLocation.joinpath(
             'torrent_state.pickle')
         self._bitMessageDataLocation = self.dataLocation.joinpath(
@@ -1250,8 +1267,7 @@ class GalacteekApplication(ApplicationDaemonStarterMixin,
         self.settingsFileLocation = cRoot.joinpath(
             f'{GALACTEEK_NAME}.conf')
 
-        for dir in [self._mHashDbLocation,
-                    self._logsLocation,
+        for dir in [self._logsLocation,
                     self._gmScriptsLocation,
                     self.ipfsBinLocation,
                     self._torDataDirLocation,
@@ -1521,18 +1537,25 @@ class GalacteekApplication(ApplicationDaemonStarterMixin,
                 self.debug('Stopping IPFS daemon (not detached)')
                 self.ipfsd.stop()
 
-        try:
-            if not self.sqliteDb:
-                raise ValueError('sqlite database is not opened')
+        # The ORM goes first (pubsub metrics are flushed on close),
+        # each database gets its own timeout
+        for name, closeCoro in [
+                ('orm', database.closeOrm),
+                ('sqlite', self.sqliteDb.close if self.sqliteDb else None),
+                ('multihashDb', self.multihashDb.close),
+                ('nsCache', self.nsCache.close)]:
+            if not closeCoro:
+                continue
 
-            with async_timeout.timeout(1):
-                await self.sqliteDb.close()
-                await database.closeOrm()
-        except ValueError:
-            pass
-        except Exception:
-            self.debug(
-                f'Error while closing database: {traceback.format_exc()}')
+            try:
+                with async_timeout.timeout(1):
+                    await closeCoro()
+            except Exception:
+                self.debug(f'Error while closing database {name}: '
+                           f'{traceback.format_exc()}')
+
+        if self.ldContextsStore:
+            self.ldContextsStore.close()
 
         if self.debug:
             self.showTasks()
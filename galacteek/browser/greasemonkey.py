@@ -36,6 +36,8 @@ import dataclasses
 from pathlib import Path
 from typing import cast, List, Sequence, Tuple, Optional
 
+from cachetools import LRUCache
+
 from PyQt5.QtCore import pyqtSignal, QObject, QUrl
 
 from galacteek import log
@@ -297,6 +299,12 @@ class LoadResults:
         return f"Greasemonkey scripts failed to load:\n\n{lines}"
 
 
+def _is_regex_pattern(pattern: str) -> bool:
+    # For include and exclude rules if they start and end with '/' they
+    # should be treated as a (ecma syntax) regular expression.
+    return pattern.startswith('/') and pattern.endswith('/')
+
+
 class GreasemonkeyMatcher:
 
     """Check whether scripts should be loaded for a given URL."""
@@ -312,9 +320,7 @@ class GreasemonkeyMatcher:
         self.is_greaseable = url.scheme() in self.GREASEABLE_SCHEMES
 
     def _match_pattern(self, pattern):
-        # For include and exclude rules if they start and end with '/' they
-        # should be treated as a (ecma syntax) regular expression.
-        if pattern.startswith('/') and pattern.endswith('/'):
+        if _is_regex_pattern(pattern):
             matches = re.search(pattern[1:-1], self._url_string, flags=re.I)
             return matches is not None
 
@@ -334,6 +340,103 @@ class GreasemonkeyMatcher:
         return (matching_includes or matching_match) and not matching_excludes
 
 
+class CompiledPatterns:
+
+    """Include or exclude rules of a script, compiled.
+
+    The glob expressions are combined in a single regular expression.
+    """
+
+    def __init__(self, patterns: Sequence[str]):
+        globs = [pat for pat in patterns if not _is_regex_pattern(pat)]
+
+        self._globs = re.compile('|'.join(
+            f'(?:{fnmatch.translate(pat)})' for pat in globs)) if globs \
+            else None
+        self._regexes = []
+
+        for pat in patterns:
+            if not _is_regex_pattern(pat):
+                continue
+
+            try:
+                self._regexes.append(re.compile(pat[1:-1], flags=re.I))
+            except re.error as err:
+                log.debug(f"Invalid regular expression {pat}: {err}")
+
+    def matches(self, url_string: str) -> bool:
+        if self._globs and self._globs.match(url_string):
+            return True
+
+        return any(regex.search(url_string) for regex in self._regexes)
+
+
+class GreasemonkeyMatchIndex:
+
+    """Compiled matching rules for a list of scripts.
+
+    Scripts whose includes are all globs starting with a literal scheme
+    and host (like "https://example.org/") are bucketed by (scheme,
+    host), other scripts are candidates for any URL. The candidates for
+    an origin are cached.
+    """
+
+    ORIGIN_GLOB = re.compile(r'^([a-z][a-z0-9+.-]*)://([a-z0-9.-]+)/')
+
+    def __init__(self, scripts: Sequence[GreasemonkeyScript]):
+        self._scripts = list(scripts)
+        self._compiled = [(CompiledPatterns(script.includes),
+                           CompiledPatterns(script.excludes))
+                          for script in self._scripts]
+        self._generic: List[int] = []
+        self._by_origin = {}
+        self._origins = {}
+
+        for pos, script in enumerate(self._scripts):
+            origins = self._include_origins(script)
+
+            if origins is None:
+                self._generic.append(pos)
+                continue
+
+            for origin in origins:
+                self._by_origin.setdefault(origin, []).append(pos)
+
+    def _include_origins(self, script):
+        origins = set()
+
+        for pat in script.includes:
+            match = self.ORIGIN_GLOB.match(pat)
+            if not match or _is_regex_pattern(pat):
+                return None
+
+            origins.add(match.groups())
+
+        return origins
+
+    def candidates(self, url) -> List[int]:
+        origin = (url.scheme(), url.host())
+
+        positions = self._origins.get(origin)
+        if positions is None:
+            positions = self._origins[origin] = sorted(
+                self._generic + self._by_origin.get(origin, []))
+
+        return positions
+
+    def scripts_for(self, url, url_string: str):
+        scripts = []
+
+        for pos in self.candidates(url):
+            includes, excludes = self._compiled[pos]
+
+            if includes.matches(url_string) and \
+                    not excludes.matches(url_string):
+                scripts.append(self._scripts[pos])
+
+        return scripts
+
+
 class GreasemonkeyManager(QObject):
 
     """Manager of userscripts and a Greasemonkey compatible environment.
@@ -353,6 +456,11 @@ class GreasemonkeyManager(QObject):
         self._run_idle: List[GreasemonkeyScript] = []
         self._in_progress_dls: List[asyncio.Future] = []
 
+        # Match indexes and results cache (reset when scripts are added)
+        self._match_indexes: Optional[Tuple[GreasemonkeyMatchIndex, ...]] = \
+            None
+        self._matching_cache = LRUCache(256)
+
         self._scripts_dirs = scripts_dirs
 
     async def load_scripts(self, *, force: bool = False) -> LoadResults:
@@ -371,6 +479,7 @@ class GreasemonkeyManager(QObject):
         self._run_start = []
         self._run_end = []
         self._run_idle = []
+        self._scripts_changed()
 
         successful = []
         errors = []
@@ -425,8 +534,13 @@ class GreasemonkeyManager(QObject):
                 # Default as per
                 # https://wiki.greasespot.net/Metadata_Block#.40run-at
             self._run_end.append(script)
+        self._scripts_changed()
         log.debug(f"Loaded script: {script}")
 
+    def _scripts_changed(self):
+        self._match_indexes = None
+        self._matching_cache.clear()
+
     def _required_url_to_file_path(self, url):
         requires_dir = os.path.join(self._scripts_dirs[0], 'requires')
         if not os.path.exists(requires_dir):
@@ -511,14 +625,26 @@ class GreasemonkeyManager(QObject):
         matcher = GreasemonkeyMatcher(url)
         if not matcher.is_greaseable:
             return MatchingScripts(url, [], [], [])
+
+        url_string = url.toString(QUrl.FullyEncoded)
+        matching = self._matching_cache.get(url_string)
+
+        if matching is None:
+            if self._match_indexes is None:
+                self._match_indexes = tuple(
+                    GreasemonkeyMatchIndex(scripts) for scripts in
+                    (self._run_start, self._run_end, self._run_idle))
+
+            matching = self._matching_cache[url_string] = tuple(
+                index.scripts_for(url, url_string)
+                for index in self._match_indexes)
+
+        start, end, idle = matching
         return MatchingScripts(
             url=url,
-            start=[script for script in self._run_start
-                   if matcher.matches(script)],
-            end=[script for script in self._run_end
-                 if matcher.matches(script)],
-            idle=[script for script in self._run_idle
-                  if matcher.matches(script)]
+            start=list(start),
+            end=list(end),
+            idle=list(idle)
         )
 
     def all_scripts(self):
@@ -1,7 +1,9 @@
 import asyncio
 import ipaddress
+import time
 import traceback
 from pathlib import Path
+from cachetools import LRUCache
 from omegaconf import OmegaConf
 
 try:
@@ -19,8 +21,8 @@ from PyQt5.QtWebEngineCore import QWebEngineUrlRequestInfo
 from galacteek import log
 
 from galacteek.config import Configurable
-from galacteek.config import cGet
 from galacteek.config import cSet
+from galacteek.config import configHandle
 
 from galacteek.browser.schemes import isIpfsUrl
 from galacteek.browser.schemes import isEnsUrl
@@ -35,6 +37,8 @@ from galacteek.ipfs.cidhelpers import IPFSPath
 from galacteek.ipfs.fetch import fetchWithSpecificGateway
 
 
+interConfig = configHandle('galacteek.services.dweb.inter')
+
 # https://github.com/qutebrowser/qutebrowser/blob/991cf1e8baee1a2365c1e2e81f92ce348344871c/qutebrowser/components/braveadblock.py
 
 _RESOURCE_TYPE_STRINGS = {
@@ -66,25 +70,106 @@ def _resourceTypeAsString(resource_type) -> str:
 class ResourceAccessBlocker:
     """
     adblock-based resource blocker
+
+    Blocking decisions are cached, the key being the URL (without the
+    fragment), the first-party origin and the resource type. The cache
+    is reset when the filter lists are reloaded.
     """
 
     def __init__(self, interDataPath: Path):
         self.interDataPath = interDataPath
         self._engine = adblock.Engine(adblock.FilterSet())
+        self._decisions = self.decisionsCache()
+        self._enabled = False
+
+        self.hits = 0
+        self.misses = 0
+        self.latencyNs = 0
 
     @property
     def enabled(self):
-        return cGet(
-            'resourceBlocker.enabled',
-            mod='galacteek.services.dweb.inter'
-        )
+        # Read from the config when the blocker is (re)configured
+        return self._enabled
+
+    @property
+    def metrics(self) -> dict:
+        """
+        Decisions metrics: requests count, cache hit rate and average
+        decision latency (in microseconds)
+        """
+        count = self.hits + self.misses
+
+        return {
+            'requests': count,
+            'hits': self.hits,
+            'hitRate': self.hits / count if count else 0,
+            'latencyAvgUs': self.latencyNs / count / 1000 if count else 0
+        }
+
+    def decisionsCache(self):
+        return LRUCache(
+            interConfig.get('resourceBlocker.decisionsCacheSize') or 4096)
+
+    def decisionsReset(self):
+        # Replaced (not cleared) as decisions are made in the IO thread
+        self._decisions = self.decisionsCache()
+
+    def blocks(self, url: QUrl, firstPartyUrl: QUrl, resourceType) -> bool:
+        """
+        Returns True if access to the resource at url should be blocked
+        """
+        start = time.perf_counter_ns()
+
+        if firstPartyUrl is not None and firstPartyUrl.isValid():
+            origin = firstPartyUrl.adjusted(
+                QUrl.RemoveUserInfo | QUrl.RemovePath |
+                QUrl.RemoveQuery | QUrl.RemoveFragment
+            ).toString()
+        else:
+            origin = None
+
+        rType = _resourceTypeAsString(resourceType)
+        key = (url.toString(QUrl.RemoveFragment), origin, rType)
+        decisions = self._decisions
+
+        blocked = decisions.get(key)
+
+        if blocked is None:
+            self.misses += 1
+            blocked = decisions[key] = self.check(
+                url, firstPartyUrl, origin, rType)
+        else:
+            self.hits += 1
+
+        self.latencyNs += time.perf_counter_ns() - start
+        return blocked
+
+    def check(self, url: QUrl, firstPartyUrl: QUrl, origin: str,
+              rType: str) -> bool:
+        # Don't try to block IPs or localhost
+
+        firstPartyInvalid = origin is None or \
+            firstPartyUrl.scheme() == "file"
+
+        try:
+            assert firstPartyInvalid is False
+
+            ipaddress.ip_address(url.host())
+            assert url.host() != 'localhost'
+        except Exception:
+            check = self._engine.check_network_urls(
+                url.toString(),
+                origin if origin else '',
+                rType
+            )
+
+            return check.matched
+
+        return False
 
     @property
     def currentBlockListRevision(self):
-        return cGet(
-            'resourceBlocker.currentRevision',
-            mod='galacteek.services.dweb.inter'
-        )
+        return interConfig.get('resourceBlocker.currentRevision')
 
     def setNewRevision(self, checksum: str):
         cSet(
@@ -108,6 +193,7 @@ class ResourceAccessBlocker:
                 self._engine.deserialize_from_file,
                 str(cachePath)
             )
+            self.decisionsReset()
         except (OSError, AssertionError):
             return False
         except Exception as err:
@@ -118,6 +204,8 @@ class ResourceAccessBlocker:
             return True
 
     async def configure(self, cfg):
+        self._enabled = bool(interConfig.get('resourceBlocker.enabled'))
+
         if not self.enabled:
             return False
 
@@ -185,6 +273,7 @@ class ResourceAccessBlocker:
             return False
 
         self._engine = adblock.Engine(fset)
+        self.decisionsReset()
 
         await loop.run_in_executor(
             None,
@@ -213,12 +302,18 @@ class IPFSRequestInterceptor(QWebEngineUrlRequestInterceptor,
         self._dataPath = dataPath
         self._urlblocker = None
 
+    @property
+    def blockerMetrics(self):
+        return self._urlblocker.metrics if self._urlblocker else None
+
     async def reconfigure(self):
         if useAdBlock:
             # Setup the resource blocker
 
             if not self._urlblocker:
                 self._urlblocker = ResourceAccessBlocker(self._dataPath)
+            else:
+                log.debug(f'Resource blocker metrics: {self.blockerMetrics}')
 
             return await self._urlblocker.configure(
                 self.config.get('resourceBlocker')
@@ -226,31 +321,14 @@ class IPFSRequestInterceptor(QWebEngineUrlRequestInterceptor,
 
     def interceptRequest(self, info):
         url = info.requestUrl()
-        firstPartyUrl = info.firstPartyUrl()
-
-        if self._urlblocker and self._urlblocker.enabled and \
-           url.scheme() in [SCHEME_HTTP, SCHEME_HTTPS]:
-            # Don't try to block IPs or localhost
-
-            firstPartyInvalid = firstPartyUrl is None or \
-                not firstPartyUrl.isValid() or \
-                firstPartyUrl.scheme() == "file"
-
-            try:
-                assert firstPartyInvalid is False
-
-                ipaddress.ip_address(url.host())
-                assert url.host() != 'localhost'
-            except Exception:
-                check = self._urlblocker._engine.check_network_urls(
-                    url.toString(),
-                    firstPartyUrl.toString(),
-                    _resourceTypeAsString(info.resourceType())
-                )
 
-                if check.matched:
-                    # Block access to this resource
-                    info.block(True)
+        # Only http(s) requests are filtered (not the native schemes)
+        if url.scheme() in [SCHEME_HTTP, SCHEME_HTTPS] and \
+           self._urlblocker and self._urlblocker.enabled:
+            if self._urlblocker.blocks(url, info.firstPartyUrl(),
+                                       info.resourceType()):
+                # Block access to this resource
+                info.block(True)
 
         if url.scheme() == SCHEME_HTTP:
             """
@@ -39,7 +39,7 @@ from galacteek import AsyncSignal
 from galacteek.core import runningApp
 from galacteek.core.asynccache import cachedcoromethod
 
-from galacteek.config import cGet
+from galacteek.config import configHandle
 
 from galacteek.dweb.render import renderTemplate
 from galacteek.dweb.enswhois import ensContentHash
@@ -57,6 +57,11 @@ from galacteek.ipfs.ipfsops import APIErrorDecoder
 
 from galacteek.ipdapps import dappsRegisterSchemes
 
+from .streamdevice import IPFSStreamDevice
+from .streamdevice import requestRange
+
+
+schemesConfig = configHandle()
 
 # Core schemes (the URL schemes your children will soon teach you how to use)
 SCHEME_DWEB = 'dweb'
@@ -357,9 +362,9 @@ class BaseURLSchemeHandler(QWebEngineUrlSchemeHandler):
     @property
     def schemeConfig(self):
         try:
-            return cGet(f'byScheme.{self.schemeConfigName}')
+            return schemesConfig.get(f'byScheme.{self.schemeConfigName}')
         except Exception:
-            return cGet('byScheme.default')
+            return schemesConfig.get('byScheme.default')
 
     def getBuffer(self, request: QWebEngineUrlRequestJob):
         buf = QBuffer(parent=request)
@@ -580,7 +585,7 @@ class EthDNSResolver:
 
             return match.group(1)
 
-    @cachedcoromethod(TTLCache(128, 180))
+    @cachedcoromethod(TTLCache(128, 180), negativeTtl=30)
     async def _resolve(self, domain):
         """
         TTL-cached EthDNS resolver
@@ -1254,6 +1259,10 @@ class NativeIPFSSchemeHandler(BaseURLSchemeHandler):
 
                 return request.reply(cached[0].encode('ascii'), buf)
 
+        if self.schemeConfig.streamReplies:
+            return await self.fetchFromPathStreamed(
+                ipfsop, request, ipfsPath, uid, **kw)
+
         try:
             mType = None
 
@@ -1276,13 +1285,7 @@ class NativeIPFSSchemeHandler(BaseURLSchemeHandler):
             if not mType:
                 mType = MIMEType('application/octet-stream')
 
-            if self.schemeConfig.contentCacheEnable and \
-               ipfsPath.objPath not in self.contentCache and \
-               mType.type in self.schemeConfig.cacheMimeTypes.keys() and \
-               buf.size() < self.schemeConfig.contentCacheMaxObjectSize:
-                # Cache object
-                self.contentCache[ipfsPath.objPath] = (mType.type,
-                                                       bytes(buf.data()))
+            self.contentCacheStore(ipfsPath, mType, buf.data())
 
             buf.close()
 
@@ -1291,61 +1294,142 @@ class NativeIPFSSchemeHandler(BaseURLSchemeHandler):
             # Let handleRequest take care of the timeout
             raise
         except aioipfs.APIError as exc:
-            await asyncio.sleep(0)
+            return await self.fetchApiError(
+                ipfsop, request, ipfsPath, uid, exc)
+        except RuntimeError:
+            # Wrapped C++ QBuffer object deleted or something ..
+            pass
+        except Exception as gerr:
+            log.debug(f'fetchFromPath({ipfsPath}), unknown error: {gerr}')
 
-            self.warning('API error ({path}): {err}'.format(
-                path=str(ipfsPath), err=exc.message)
+            return self.reqFailed(request)
+
+    async def fetchFromPathStreamed(self, ipfsop, request, ipfsPath, uid,
+                                    **kw):
+        """
+        Serve an IPFS file with a streaming reply device: data is
+        handed to QtWebEngine as it arrives, and the Range header
+        of the request (if any) is mapped to a ranged cat.
+        """
+
+        cfg = self.schemeConfig
+        rRange = requestRange(request)
+        offset = rRange[0] if rRange else 0
+
+        try:
+            # The size has to be known before the device is opened
+            # for it to be seekable
+            stat = await ipfsop.filesStat(ipfsPath.objPath,
+                                          timeout=cfg.chunkReadTimeout)
+
+            device = IPFSStreamDevice(
+                ipfsop, ipfsPath,
+                size=stat.get('Size') if stat and
+                stat.get('Type') == 'file' else None,
+                chunkSize=cfg.chunkSizeDefault,
+                chunkTimeout=cfg.chunkReadTimeout,
+                maxBuffered=cfg.streamBufferMaxSize,
+                parent=request
             )
 
-            dec = APIErrorDecoder(exc.message)
+            first = await device.start(offset)
 
-            if dec.errNoSuchLink():
-                return self.urlNotFound(request)
+            if offset > 0:
+                header = await ipfsop.catObject(
+                    ipfsPath.objPath, offset=0, length=512)
+            else:
+                header = first
 
-            if dec.errIsDirectory():
-                url = request.requestUrl()
+            mType = await self.getMimeType(header if header else b'',
+                                           ipfsPath)
 
-                if not url.path().endswith('/'):
-                    # Critical: we tried a cat() on an object which
-                    # turns out to be a UnixFS directory and the
-                    # URL path() doesn't have a trailing '/'. We need
-                    # to create a new request cycle by redirecting
-                    # to a QUrl which does have the trailing /, otherwise
-                    # qtwebengine won't correctly resolve relative URLs
+            if device.complete and offset == 0:
+                # The whole object has already been fetched, serve it
+                # from a buffer (and cache it if needed)
+                data = device.bufferedData()
+                device.close()
 
-                    redirUrl = QUrl(url.toString())
-                    redirUrl.setPath(redirUrl.path() + '/')
+                self.contentCacheStore(ipfsPath, mType, data)
 
-                    return request.redirect(redirUrl)
+                buf = self.getBuffer(request)
+                buf.open(QIODevice.WriteOnly)
+                buf.write(data)
+                buf.close()
 
-                data = await self.renderDirectory(
-                    request,
-                    ipfsop,
-                    str(ipfsPath)
-                )
-                if data:
-                    return await self.renderData(request, ipfsPath,
-                                                 data, uid)
+                return request.reply(mType.type.encode('ascii'), buf)
 
-            if dec.errUnknownNode():
-                # DAG / TODO
-                data = await self.renderDagNode(
-                    request,
-                    uid,
-                    ipfsop,
-                    ipfsPath
-                )
-                if data:
-                    return await self.renderData(request, ipfsPath,
-                                                 data, uid)
+            request.reply(mType.type.encode('ascii'), device)
+        except asyncio.TimeoutError:
+            raise
+        except aioipfs.APIError as exc:
+            return await self.fetchApiError(
+                ipfsop, request, ipfsPath, uid, exc)
         except RuntimeError:
-            # Wrapped C++ QBuffer object deleted or something ..
             pass
         except Exception as gerr:
-            log.debug(f'fetchFromPath({ipfsPath}), unknown error: {gerr}')
+            log.debug(f'fetchFromPathStreamed({ipfsPath}), '
+                      f'unknown error: {gerr}')
 
             return self.reqFailed(request)
 
+    def contentCacheStore(self, ipfsPath, mType, data):
+        if self.schemeConfig.contentCacheEnable and \
+           ipfsPath.objPath not in self.contentCache and \
+           mType.type in self.schemeConfig.cacheMimeTypes.keys() and \
+           len(data) < self.schemeConfig.contentCacheMaxObjectSize:
+            # Cache object
+            self.contentCache[ipfsPath.objPath] = (mType.type,
+                                                   bytes(data))
+
+    async def fetchApiError(self, ipfsop, request, ipfsPath, uid, exc):
+        await asyncio.sleep(0)
+
+        self.warning('API error ({path}): {err}'.format(
+            path=str(ipfsPath), err=exc.message)
+        )
+
+        dec = APIErrorDecoder(exc.message)
+
+        if dec.errNoSuchLink():
+            return self.urlNotFound(request)
+
+        if dec.errIsDirectory():
+            url = request.requestUrl()
+
+            if not url.path().endswith('/'):
+                # Critical: we tried a cat() on an object which
+                # turns out to be a UnixFS directory and the
+                # URL path() doesn't have a trailing '/'. We need
+                # to create a new request cycle by redirecting
+                # to a QUrl which does have the trailing /, otherwise
+                # qtwebengine won't correctly resolve relative URLs
+
+                redirUrl = QUrl(url.toString())
+                redirUrl.setPath(redirUrl.path() + '/')
+
+                return request.redirect(redirUrl)
+
+            data = await self.renderDirectory(
+                request,
+                ipfsop,
+                str(ipfsPath)
+            )
+            if data:
+                return await self.renderData(request, ipfsPath,
+                                             data, uid)
+
+        if dec.errUnknownNode():
+            # DAG / TODO
+            data = await self.renderDagNode(
+                request,
+                uid,
+                ipfsop,
+                ipfsPath
+            )
+            if data:
+                return await self.renderData(request, ipfsPath,
+                                             data, uid)
+
 
 class ObjectProxySchemeHandler(NativeIPFSSchemeHandler, IPFSObjectProxyScheme):
     """
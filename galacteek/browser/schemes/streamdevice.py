@@ -0,0 +1,258 @@
+import asyncio
+import re
+
+from PyQt5.QtCore import QIODevice
+
+from galacteek import log
+from galacteek.ipfs.cidhelpers import IPFSPath
+
+
+def parseRangeHeader(value: str):
+    """
+    Parse the value of an HTTP Range header (single byte range only)
+    and return a (start, end) tuple, end being None for an open range.
+
+    Returns None if the header can't be parsed or for suffix ranges.
+    """
+
+    ma = re.match(r'^\s*bytes\s*=\s*(\d+)\s*-\s*(\d*)\s*$', value)
+    if not ma:
+        return None
+
+    start = int(ma.group(1))
+    end = int(ma.group(2)) if ma.group(2) else None
+
+    if end is not None and end < start:
+        return None
+
+    return start, end
+
+
+def requestRange(request):
+    """
+    Return the byte range requested by a QWebEngineUrlRequestJob,
+    as a (start, end) tuple, or None
+    """
+
+    try:
+        headers = request.requestHeaders()
+    except (AttributeError, RuntimeError):
+        # requestHeaders() is only available since Qt 5.13
+        return None
+
+    for name, value in headers.items():
+        if bytes(name).decode().lower() == 'range':
+            return parseRangeHeader(bytes(value).decode())
+
+
+class IPFSStreamDevice(QIODevice):
+    """
+    Read-only QIODevice that streams the contents of an IPFS file
+    to QtWebEngine while the data is being fetched with catChunked().
+
+    Only a bounded window of the object is kept in memory: the fetcher
+    pauses when the buffer is full, and consumed data is released. When
+    the size of the object is known the device is seekable, a seek
+    outside of the current window restarts the fetch at that offset
+    (mapped to a ranged cat).
+
+    The size must be set before the device is started: QIODevice only
+    checks isSequential() when the device is opened. The read position
+    is tracked by the device itself, since QIODevice.pos() is not
+    maintained for sequential devices.
+    """
+
+    def __init__(self, ipfsop, ipfsPath: IPFSPath,
+                 size: int = None,
+                 chunkSize: int = 262140,
+                 chunkTimeout: int = 30,
+                 maxBuffered: int = 4194304,
+                 parent=None):
+        super().__init__(parent)
+
+        self.ipfsop = ipfsop
+        self.ipfsPath = ipfsPath
+        self.objSize = size
+        self.chunkSize = chunkSize
+        self.chunkTimeout = chunkTimeout
+        self.maxBuffered = maxBuffered
+
+        self._buf = bytearray()
+        self._bufOffset = 0
+        self._readPos = 0
+        self._task = None
+        self._eof = False
+        self._error = None
+        self._first = None
+        self._drained = asyncio.Event()
+
+        if parent:
+            parent.destroyed.connect(self.cancelFetch)
+
+    @property
+    def finished(self):
+        return self._eof
+
+    @property
+    def bufferedEnd(self):
+        return self._bufOffset + len(self._buf)
+
+    @property
+    def complete(self):
+        """
+        True if the whole object (from offset 0) was fetched without
+        error and is still in the buffer
+        """
+        return self._eof and self._error is None and self._bufOffset == 0
+
+    def bufferedData(self) -> bytes:
+        return bytes(self._buf)
+
+    def debug(self, msg):
+        log.debug(f'StreamDevice({self.ipfsPath}): {msg}')
+
+    async def start(self, offset: int = 0):
+        """
+        Start fetching at the given offset and wait for the first
+        chunk to be received. Errors raised while reading the first
+        chunk (API errors, timeouts) are propagated to the caller.
+
+        Returns the first chunk
+        """
+
+        self.open(QIODevice.ReadOnly | QIODevice.Unbuffered)
+
+        self._first = asyncio.Future()
+        self._restart(offset)
+
+        if offset > 0 and not self.isSequential():
+            super().seek(offset)
+
+        return await self._first
+
+    def cancelFetch(self, *args):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+        self._task = None
+
+    def _restart(self, offset: int):
+        self.cancelFetch()
+
+        self._buf = bytearray()
+        self._bufOffset = offset
+        self._readPos = offset
+        self._eof = False
+        self._error = None
+        self._task = asyncio.ensure_future(self._fetch(offset))
+
+    async def _fetch(self, offset: int):
+        try:
+            async for cnum, chunk in self.ipfsop.catChunked(
+                    self.ipfsPath.objPath,
+                    chunkSize=self.chunkSize,
+                    chunkTimeout=self.chunkTimeout,
+                    offset=offset):
+                self._buf.extend(chunk)
+
+                if self._first and not self._first.done():
+                    self._first.set_result(chunk)
+                else:
+                    self.readyRead.emit()
+
+                while len(self._buf) >= self.maxBuffered:
+                    # Wait for the consumer to read
+                    self._drained.clear()
+                    await self._drained.wait()
+
+            self._eof = True
+
+            if self._first and not self._first.done():
+                self._first.set_result(b'')
+            else:
+                self.readyRead.emit()
+                self.readChannelFinished.emit()
+        except asyncio.CancelledError:
+            if self._first and not self._first.done():
+                self._first.cancel()
+        except RuntimeError:
+            # Wrapped C++ object deleted
+            self.cancelFetch()
+        except Exception as err:
+            self._error = err
+            self._eof = True
+
+            if self._first and not self._first.done():
+                self._first.set_exception(err)
+            else:
+                self.debug(f'Error while streaming: {err}')
+
+                try:
+                    self.readChannelFinished.emit()
+                except RuntimeError:
+                    pass
+
+    def isSequential(self):
+        return self.objSize is None
+
+    def size(self):
+        if self.objSize is not None:
+            return self.objSize
+
+        return self.bufferedEnd
+
+    def seek(self, pos: int):
+        if self.isSequential() or pos < 0 or pos > self.objSize:
+            return False
+
+        if pos < self._bufOffset or pos > self.bufferedEnd + \
+                self.maxBuffered or self._error is not None or \
+                (self._eof and pos > self.bufferedEnd):
+            # Out of the current window (or the fetch has stopped
+            # before reaching it), restart the fetch from there
+            self.debug(f'Seek to {pos}: restarting fetch')
+            self._restart(pos)
+        elif pos > self._bufOffset:
+            # Release what's been skipped over
+            skip = min(pos, self.bufferedEnd) - self._bufOffset
+            del self._buf[:skip]
+            self._bufOffset += skip
+            self._drained.set()
+
+        self._readPos = pos
+        return super().seek(pos)
+
+    def bytesAvailable(self):
+        return max(self.bufferedEnd - self._readPos, 0) + \
+            super().bytesAvailable()
+
+    def atEnd(self):
+        return self._eof and self._readPos >= self.bufferedEnd
+
+    def readData(self, maxlen: int):
+        rel = self._readPos - self._bufOffset
+
+        if rel < 0 or rel >= len(self._buf):
+            if self._eof:
+                # EOF, or a streaming error
+                return None if self._error else b''
+
+            return b''
+
+        data = bytes(self._buf[rel:rel + maxlen])
+
+        # Release consumed data
+        del self._buf[:rel + len(data)]
+        self._bufOffset += rel + len(data)
+        self._readPos += len(data)
+        self._drained.set()
+
+        return data
+
+    def writeData(self, data):
+        return -1
+
+    def close(self):
+        self.cancelFetch()
+        self._buf = bytearray()
+        super().close()
@@ -1,7 +1,7 @@
 import asyncio
 import attr
-import inspect
 import functools
+import sys
 import traceback
 from pathlib import Path
 
@@ -37,6 +37,12 @@ class NestedNamespace(SimpleNamespace):
 
 cCache = {}
 
+# Config handles, by module name
+cHandles = {}
+
+# Incremented every time a module's config changes
+cGeneration = 0
+
 configSaveRootPath = None
 yamlExt = 'yaml'
 configYamlName = f'config.{yamlExt}'
@@ -65,6 +71,8 @@ def merge(*cfgs):
 def configSavePackage(pkgName: str):
     cEntry = regConfigFromPyPkg(pkgName)
     if cEntry:
+        configInvalidate(pkgName)
+
         savePath = cEntry['path']
         savePath.parent.mkdir(parents=True, exist_ok=True)
 
@@ -112,6 +120,8 @@ def regConfigFromFile(pkgName: str, fpath: Path,
     }
     OmegaConf.save(cfgAll, str(savePath))
 
+    configInvalidate(pkgName)
+
     return cCache[pkgName]
 
 
@@ -208,33 +218,107 @@ def cAttr(mod, cfg, attr, value=None, merge=False):
         return OmegaConf.select(conf, attr)
 
 
-def callerMod():
+def callerMod(depth: int = 2):
+    """
+    Returns the name of the module of the caller's caller
+    """
     try:
-        frm = inspect.stack()[2]
-        mod = inspect.getmodule(frm[0])
-        return mod.__name__
+        return sys._getframe(depth).f_globals['__name__']
     except Exception as err:
         # Unlikely
         log.debug(f'Cannot determine caller module: {err}')
         return None
 
 
+class ConfigHandle:
+    """
+    Config accessor bound to a module.
+
+    Values are resolved once and kept in a flat dictionary (attribute
+    path -> value). The dictionary is cleared when the module's config
+    is changed or reloaded.
+
+    Modules with hot paths bind a handle at import time:
+
+        opsConfig = configHandle()
+
+        def opConfig(opName):
+            return opsConfig.get(f'ops.{opName}')
+    """
+
+    def __init__(self, mod: str):
+        self.mod = mod
+        self._values = {}
+
+    def get(self, attr: str):
+        try:
+            return self._values[attr]
+        except KeyError:
+            pass
+
+        cEntry = regConfigFromPyPkg(self.mod)
+        if not cEntry:
+            return None
+
+        value = cAttr(self.mod, cEntry['configAll'], attr)
+        self._values[attr] = value
+        return value
+
+    __call__ = get
+
+    def set(self, attr: str, value, **kw):
+        return cSet(attr, value, mod=self.mod, **kw)
+
+    def invalidate(self):
+        self._values.clear()
+
+
+def configHandle(mod: str = None) -> ConfigHandle:
+    """
+    Returns the config handle for a module (the caller's module
+    if not specified)
+    """
+
+    if not mod:
+        mod = callerMod()
+
+    handle = cHandles.get(mod)
+    if not handle:
+        handle = cHandles[mod] = ConfigHandle(mod)
+
+    return handle
+
+
+def configInvalidate(mod: str):
+    global cGeneration
+
+    handle = cHandles.get(mod)
+    if handle:
+        handle.invalidate()
+
+    cGeneration += 1
+
+
+def configGeneration() -> int:
+    """
+    Returns the config generation number, which changes every time
+    a config is modified (to invalidate values derived from configs)
+    """
+    return cGeneration
+
+
 def cGet(attr: str, mod=None):
     if not mod:
         mod = callerMod()
 
-    cEntry = regConfigFromPyPkg(mod)
-    if cEntry:
-        return cAttr(mod, cEntry['configAll'], attr)
+    return configHandle(mod).get(attr)
 
 
 def cParentGet(attr: str):
     mod = callerMod()
     parentMod = '.'.join(mod.split('.')[:-1])
 
-    cEntry = regConfigFromPyPkg(parentMod)
-    if cEntry:
-        return cAttr(parentMod, cEntry['configAll'], attr)
+    return configHandle(parentMod).get(attr)
 
 
 def cSet(attr: str, value, mod=None,
@@ -1,83 +1,217 @@
 import asyncio
+import attr
+import time
 
 from functools import wraps
 from cachetools import LRUCache
 from cachetools import TTLCache
 from cachetools import keys
 
-__all__ = ['amlrucache', 'cachedcoromethod']
+__all__ = ['amlrucache', 'cachedcoromethod', 'selfcachedcoromethod']
 
 
-def _wrap_coroutine_storage(cache_dict, key, future):
-    async def wrapper():
-        val = await future
-        cache_dict[key] = val
-        return val
-    return wrapper()
+@attr.s(auto_attribs=True)
+class AsyncCacheStats:
+    hits: int = 0
+    misses: int = 0
 
+    # Calls that waited for the result of an identical call in flight
+    coalesced: int = 0
 
-def _wrap_value_in_coroutine(val):
-    async def wrapper():
-        return val
-    return wrapper()
+    negativeHits: int = 0
+    errors: int = 0
 
 
-def amlrucache(f):
+class NegativeEntry:
+    """
+    Cached "no result" (None), with its own expiration time
     """
-    LRU caches the results of a coroutine method
 
-    Uses the repr of the method's object as the cache key
+    __slots__ = ('expires',)
+
+    def __init__(self, ttl: float):
+        self.expires = time.monotonic() + ttl
+
+    @property
+    def valid(self):
+        return time.monotonic() < self.expires
+
+
+class SingleFlight:
     """
-    @wraps(f)
-    def wrapper(self, *args, **kwargs):
-        _cache = getattr(self, 'cache', LRUCache(16))
-        key = repr(self)
+    Runs a coroutine once per key: concurrent calls for a key that's
+    not cached yet all wait for the same task, and the result is
+    stored in the cache when the task is done.
+
+    If negativeTtl is set, None results are cached for negativeTtl
+    seconds (instead of the cache's own policy). With maxInFlight, at
+    most maxInFlight keys are tracked (other calls are not coalesced).
+    """
+
+    def __init__(self, negativeTtl: float = None, maxInFlight: int = None):
+        self.negativeTtl = negativeTtl
+        self.maxInFlight = maxInFlight
+        self.inFlight = {}
+        self.stats = AsyncCacheStats()
+
+    def cached(self, cache, key):
+        """
+        Return a (found, value) tuple for key in cache
+        """
 
         try:
-            val = _cache[key]
-            if asyncio.iscoroutinefunction(f):
-                return _wrap_value_in_coroutine(val)
-            return val
+            val = cache[key]
         except KeyError:
-            val = f(self, *args, **kwargs)
+            return False, None
+
+        if not isinstance(val, NegativeEntry):
+            self.stats.hits += 1
+            return True, val
 
-            if asyncio.iscoroutine(val):
-                return _wrap_coroutine_storage(_cache, key, val)
+        if val.valid:
+            self.stats.negativeHits += 1
+            return True, None
 
-            _cache[key] = val
+        cache.pop(key, None)
+        return False, None
+
+    def store(self, cache, key, value):
+        try:
+            if value is None and self.negativeTtl:
+                cache[key] = NegativeEntry(self.negativeTtl)
+            else:
+                cache[key] = value
+        except ValueError:
+            # Too large for the cache
+            pass
+
+    async def call(self, cache, key, factory, flightKey=None):
+        """
+        Return the cached value for key, or the result of the coroutine
+        returned by factory()
+        """
+
+        found, val = self.cached(cache, key)
+        if found:
             return val
 
-    return wrapper
+        fKey = flightKey if flightKey is not None else key
+
+        task = self.inFlight.get(fKey)
+        if task is not None:
+            self.stats.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.stats.misses += 1
+
+        if self.maxInFlight and len(self.inFlight) >= self.maxInFlight:
+            val = await factory()
+            self.store(cache, key, val)
+            return val
+
+        task = asyncio.ensure_future(factory())
+        self.inFlight[fKey] = task
+
+        def done(t):
+            self.inFlight.pop(fKey, None)
+
+            if t.cancelled():
+                return
+            elif t.exception() is not None:
+                self.stats.errors += 1
+            else:
+                self.store(cache, key, t.result())
 
+        task.add_done_callback(done)
 
-def cachedcoromethod(cache, key=keys.hashkey):
+        return await asyncio.shield(task)
+
+
+def objCacheKey(obj):
     """
-    Caches results from a coroutine method in cache
+    Key of an object in a cache shared by several objects: the
+    object's cacheKey attribute if set, its repr otherwise
     """
-    def decorator(method):
-        async def wrapper(self, *args, **kwargs):
-            k = key(*args, **kwargs)
+
+    key = getattr(obj, 'cacheKey', None)
+    return key if key is not None else repr(obj)
+
+
+def amlrucache(f):
+    """
+    LRU caches the results of a coroutine method in the object's
+    'cache' attribute
+
+    Uses the object's cache key (see objCacheKey()) as the cache key
+    """
+
+    flight = SingleFlight()
+
+    @wraps(f)
+    def wrapper(self, *args, **kwargs):
+        _cache = getattr(self, 'cache', None)
+        if _cache is None:
+            _cache = LRUCache(16)
+
+        key = objCacheKey(self)
+
+        if not asyncio.iscoroutinefunction(f):
             try:
-                return cache[k]
+                return _cache[key]
             except KeyError:
-                pass
+                val = f(self, *args, **kwargs)
+                _cache[key] = val
+                return val
 
-            value = await method(self, *args, **kwargs)
+        return flight.call(_cache, key,
+                           lambda: f(self, *args, **kwargs),
+                           flightKey=(id(_cache), key))
 
-            try:
-                cache[k] = value
-            except ValueError:
-                pass
+    wrapper.cacheStats = flight.stats
+    return wrapper
 
-            return value
 
-        return wraps(method)(wrapper)
+def cachedcoromethod(cache, key=keys.hashkey,
+                     negativeTtl: float = None,
+                     maxInFlight: int = None):
+    """
+    Caches results from a coroutine method in cache
+
+    Concurrent calls with the same key share a single call of the
+    method (see SingleFlight)
+    """
+    def decorator(method):
+        flight = SingleFlight(negativeTtl=negativeTtl,
+                              maxInFlight=maxInFlight)
+
+        async def wrapper(self, *args, **kwargs):
+            return await flight.call(
+                cache,
+                key(*args, **kwargs),
+                lambda: method(self, *args, **kwargs)
+            )
+
+        wrapper = wraps(method)(wrapper)
+        wrapper.cacheStats = flight.stats
+        return wrapper
 
     return decorator
 
 
-def selfcachedcoromethod(cachename, key=keys.hashkey):
+def selfcachedcoromethod(cachename, key=keys.hashkey,
+                         negativeTtl: float = None,
+                         maxInFlight: int = None):
+    """
+    Caches results from a coroutine method in the object's cache
+    attribute named cachename
+
+    Concurrent calls on an object with the same key share a single call
+    of the method (see SingleFlight)
+    """
     def decorator(method):
+        flight = SingleFlight(negativeTtl=negativeTtl,
+                              maxInFlight=maxInFlight)
+
         async def wrapper(self, *args, **kwargs):
             try:
                 cache = getattr(self, cachename)
@@ -87,20 +221,15 @@ def selfcachedcoromethod(cachename, key=keys.hashkey):
                 setattr(self, cachename, cache)
 
             k = key(*args, **kwargs)
-            try:
-                return cache[k]
-            except KeyError:
-                pass
-
-            value = await method(self, *args, **kwargs)
-
-            try:
-                cache[k] = value
-            except ValueError:
-                pass
 
-            return value
+            return await flight.call(
+                cache, k,
+                lambda: method(self, *args, **kwargs),
+                flightKey=(id(cache), k)
+            )
 
-        return wraps(method)(wrapper)
+        wrapper = wraps(method)(wrapper)
+        wrapper.cacheStats = flight.stats
+        return wrapper
 
     return decorator
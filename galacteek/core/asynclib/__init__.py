@@ -458,49 +458,163 @@ class ThreadLoop:
 
 class GThrottler:
     """
-    Same as asyncio_throttle but uses loop time instead of clock time
+    Token-bucket throttler (using the loop time)
+
+    The bucket holds up to rate_limit tokens and is refilled at a rate
+    of rate_limit tokens per period. Waiters are queued in FIFO order,
+    and only the first waiter is woken up (with loop.call_at), at the
+    time the tokens it needs will be available.
+
+    Acquisitions can be weighted (acquire(weight)). The time spent
+    waiting for each acquisition is accounted in a histogram
+    (see waitHistogram()).
     """
 
+    # Upper bounds (in seconds) of the wait-time histogram buckets
+    waitBuckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
     def __init__(self, rate_limit: int, period=1.0, retry_interval=0.01,
                  name='generic-throttler'):
         self.rate_limit = rate_limit
         self.period = period
-        self.retry_interval = retry_interval
         self.name = name
 
+        # Unused, kept for compatibility with asyncio_throttle
+        self.retry_interval = retry_interval
+
         self._running = True
+        self._tokens = float(rate_limit)
+        self._tLast = None
+        self._timer = None
+        self._waiters: Deque[tuple] = deque()
+
+        self.acquiredCount = 0
+        self.waitTotal = 0.0
+        self._waitHist = [0] * (len(self.waitBuckets) + 1)
 
-        self._task_logs: Deque[float] = deque()
+    @property
+    def rate(self) -> float:
+        """ Refill rate (tokens per second) """
+        return self.rate_limit / self.period
+
+    @property
+    def waitersCount(self) -> int:
+        return len(self._waiters)
 
     def pause(self, pause=True):
         self._running = not pause
 
+        if not self._running:
+            # Release everyone
+            self._wakeup()
+
     def debug(self, msg):
         from galacteek import log
         log.debug(f'Throttler {self.name}: {msg}')
 
+    def waitHistogram(self) -> dict:
+        """
+        Wait-time histogram: the keys are the upper bounds of the
+        buckets (in seconds), the values are acquisition counts
+        """
+
+        hist = dict(zip(self.waitBuckets, self._waitHist))
+        hist[float('inf')] = self._waitHist[-1]
+        return hist
+
+    def _recordWait(self, waited: float):
+        self.acquiredCount += 1
+        self.waitTotal += waited
+
+        for idx, bound in enumerate(self.waitBuckets):
+            if waited <= bound:
+                self._waitHist[idx] += 1
+                break
+        else:
+            self._waitHist[-1] += 1
+
     def flush(self):
+        """
+        Refill the bucket according to the time elapsed since the
+        last refill
+        """
+
         nowLt = loopTime()
 
-        while self._task_logs:
-            diff = nowLt - self._task_logs[0]
-            if diff > self.period:
-                # self.debug(f'Flush item: diff {diff} > {self.period}')
-                self._task_logs.popleft()
-            else:
-                break
+        if self._tLast is not None:
+            self._tokens = min(
+                float(self.rate_limit),
+                self._tokens + ((nowLt - self._tLast) * self.rate)
+            )
+
+        self._tLast = nowLt
+        return nowLt
 
-    async def acquire(self):
-        while self._running:
-            self.flush()
+    def _take(self, weight: float) -> None:
+        if self._running:
+            self._tokens -= weight
 
-            if len(self._task_logs) < self.rate_limit:
-                # self.debug(f'acquired (log count: {len(self._task_logs)})')
+    def _wakeup(self):
+        self._timer = None
+        nowLt = self.flush()
+
+        while self._waiters:
+            fut, weight, tEnqueued = self._waiters[0]
+
+            if fut.done():
+                # Cancelled waiter
+                self._waiters.popleft()
+                continue
+
+            if self._running and self._tokens < weight:
                 break
 
-            await asyncio.sleep(self.retry_interval)
+            self._waiters.popleft()
+            self._take(weight)
+            self._recordWait(nowLt - tEnqueued)
+            fut.set_result(True)
+
+        self._schedule(nowLt)
+
+    def _schedule(self, nowLt: float):
+        if not self._waiters or self._timer:
+            return
+
+        weight = self._waiters[0][1]
+        delay = max((weight - self._tokens) / self.rate, 0)
+
+        self._timer = asyncio.get_event_loop().call_at(
+            nowLt + delay, self._wakeup)
+
+    async def acquire(self, weight: float = 1):
+        # A weight above the capacity of the bucket would never be granted
+        weight = min(weight, self.rate_limit)
+
+        nowLt = self.flush()
+
+        if not self._running or (not self._waiters and
+                                 self._tokens >= weight):
+            self._take(weight)
+            self._recordWait(0)
+            return True
+
+        fut = asyncio.get_event_loop().create_future()
+        self._waiters.append((fut, weight, nowLt))
+        self._schedule(nowLt)
+
+        try:
+            return await fut
+        except asyncio.CancelledError:
+            if self._waiters and self._waiters[0][0] is fut:
+                # The head of the queue is gone, recompute the wakeup time
+                self._waiters.popleft()
+
+                if self._timer:
+                    self._timer.cancel()
+                    self._timer = None
 
-        self._task_logs.append(loopTime())
+                self._wakeup()
+            raise
 
     async def __aenter__(self):
         await self.acquire()
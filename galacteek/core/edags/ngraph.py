@@ -3,6 +3,9 @@ from galacteek.ipfs.dag import EvolvingDAG
 
 
 class PeersGraphDAG(EvolvingDAG):
+    incremental = True
+    saveDebounce = 0.5
+
     async def initDag(self, ipfsop):
         return {
             'peers': {},
@@ -0,0 +1,112 @@
+"""
+Row-level diffing of query results, used to update models with
+minimal insert/remove/move/change notifications instead of resetting
+them
+"""
+
+from typing import Callable
+
+
+def rowsKeys(rows: list, identity: Callable) -> list:
+    """
+    Identity keys of a list of rows. Rows with the same identity get
+    distinct keys (identity, occurrence)
+    """
+
+    seen = {}
+    keys = []
+
+    for row in rows:
+        ident = identity(row)
+        count = seen.get(ident, 0)
+        seen[ident] = count + 1
+        keys.append((ident, count))
+
+    return keys
+
+
+def rowsDiff(old: list, new: list, identity: Callable = None):
+    """
+    Yield the operations that turn the rows list old into new:
+
+    - ('remove', first, count)
+    - ('insert', first, rows)
+    - ('move', source, destination) (destination < source)
+    - ('change', first, rows)
+
+    Positions are relative to the list with the previous operations
+    applied. Rows are matched by identity(row) (the row itself by
+    default).
+    """
+
+    identity = identity if identity else lambda row: row
+
+    oldKeys = rowsKeys(old, identity)
+    newKeys = rowsKeys(new, identity)
+    newSet = set(newKeys)
+
+    cur = list(zip(oldKeys, old))
+
+    # Removals (contiguous runs, from the end)
+    idx = len(cur) - 1
+    while idx >= 0:
+        if cur[idx][0] in newSet:
+            idx -= 1
+            continue
+
+        last = idx
+        while idx >= 0 and cur[idx][0] not in newSet:
+            idx -= 1
+
+        del cur[idx + 1:last + 1]
+        yield 'remove', idx + 1, last - idx
+
+    kept = set(key for key, row in cur)
+
+    idx = 0
+    while idx < len(new):
+        key = newKeys[idx]
+
+        if idx < len(cur) and cur[idx][0] == key:
+            end = idx
+            while end < len(new) and end < len(cur) and \
+                    cur[end][0] == newKeys[end] and cur[end][1] != new[end]:
+                cur[end] = (newKeys[end], new[end])
+                end += 1
+
+            if end > idx:
+                yield 'change', idx, new[idx:end]
+                idx = end
+            else:
+                idx += 1
+        elif key not in kept:
+            end = idx
+            while end < len(new) and newKeys[end] not in kept:
+                end += 1
+
+            cur[idx:idx] = list(zip(newKeys[idx:end], new[idx:end]))
+            yield 'insert', idx, new[idx:end]
+            idx = end
+        else:
+            src = next(pos for pos in range(idx + 1, len(cur))
+                       if cur[pos][0] == key)
+            cur.insert(idx, cur.pop(src))
+            yield 'move', src, idx
+
+
+def rowsPatch(rows: list, ops) -> list:
+    """
+    Apply diff operations on a list of rows (in place)
+    """
+
+    for op, first, arg in ops:
+        if op == 'remove':
+            del rows[first:first + arg]
+        elif op == 'insert':
+            rows[first:first] = arg
+        elif op == 'move':
+            rows.insert(arg, rows.pop(first))
+        elif op == 'change':
+            rows[first:first + len(arg)] = arg
+
+    return rows
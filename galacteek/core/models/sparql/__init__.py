@@ -1,9 +1,8 @@
 import asyncio
 import traceback
 
-from rdflib.plugins.sparql import prepareQuery
-
 from PyQt5.QtCore import QAbstractListModel
+from PyQt5.QtCore import QModelIndex
 from PyQt5.QtCore import Qt
 from PyQt5.QtCore import QMimeData
 from PyQt5.QtCore import QUrl
@@ -13,6 +12,8 @@ from galacteek import ensure
 from galacteek import services
 from galacteek.core.models import AbstractModel
 from galacteek.core.models import BaseAbstractItem
+from galacteek.core.models.rowdiff import rowsDiff
+from galacteek.core.models.rowdiff import rowsPatch
 from galacteek.ld.sparql import querydb
 
 from galacteek.ld.rdf.watch import GraphActivityListener
@@ -26,8 +27,17 @@ SubjectRawUriRefRole = Qt.UserRole + 1
 class SparQLQueryRunner(GAsyncObject):
     rq = None
 
+    # Results column identifying a row (rows without this column are
+    # compared as a whole). Used to update the model incrementally
+    identityColumn: str = 'uri'
+
+    # Number of rows processed between two yields to the event loop,
+    # when updating the model
+    resultsBatchSize: int = 128
+
     def __init__(self, graphUri='urn:ipg:i', graph=None,
-                 rq=None, bindings=None, debug=False):
+                 rq=None, bindings=None, debug=False,
+                 identityColumn: str = None):
         super().__init__()
 
         self.activityListener = GraphActivityListener([graphUri])
@@ -40,6 +50,12 @@ class SparQLQueryRunner(GAsyncObject):
         self._qprepared = {}
         self._varsCount = 0
         self._debug = debug
+        self._resultsLock = asyncio.Lock()
+        self._resultsGen = 0
+
+        if identityColumn:
+            self.identityColumn = identityColumn
+
         self._setup(rqQuery=rq if rq else self.rq,
                     bindings=bindings)
 
@@ -61,6 +77,96 @@ class SparQLQueryRunner(GAsyncObject):
     def rqGet(self, rqName: str) -> str:
         return querydb.get(rqName)
 
+    def rowIdentity(self, row):
+        if self.identityColumn:
+            try:
+                return row[self.identityColumn]
+            except (KeyError, IndexError, TypeError):
+                pass
+
+        return tuple(row) if isinstance(row, list) else row
+
+    def resultsReset(self, results: list) -> None:
+        self.beginResetModel()
+        self._results = list(results)
+        self.endResetModel()
+
+    def resultsOpApply(self, op) -> int:
+        """
+        Apply a diff operation (see rowsDiff()) on the results, emitting
+        the corresponding model signals. Returns the number of rows
+        affected
+        """
+
+        action, first, arg = op
+        root = QModelIndex()
+
+        if action == 'remove':
+            count = arg
+            self.beginRemoveRows(root, first, first + count - 1)
+        elif action == 'insert':
+            count = len(arg)
+            self.beginInsertRows(root, first, first + count - 1)
+        elif action == 'move':
+            count = 1
+            self.beginMoveRows(root, first, first, root, arg)
+        else:
+            count = len(arg)
+
+        rowsPatch(self._results, [op])
+
+        if action == 'remove':
+            self.endRemoveRows()
+        elif action == 'insert':
+            self.endInsertRows()
+        elif action == 'move':
+            self.endMoveRows()
+        else:
+            self.dataChanged.emit(
+                self.createIndex(first, 0),
+                self.createIndex(first + count - 1, 0)
+            )
+
+        return count
+
+    async def resultsUpdate(self, results: list) -> None:
+        """
+        Update the model with new results, emitting only the row
+        inserts, removals, moves and changes (rows are matched with
+        rowIdentity()), so that views keep their selection and
+        scroll position.
+
+        Large diffs are applied in batches of resultsBatchSize rows.
+        If newer results arrive in between, this update is abandoned.
+        """
+
+        self._resultsGen += 1
+        gen = self._resultsGen
+
+        async with self._resultsLock:
+            if gen != self._resultsGen:
+                return
+
+            if not self._results or not results:
+                return self.resultsReset(results)
+
+            try:
+                processed = 0
+
+                for op in rowsDiff(self._results, results,
+                                   identity=self.rowIdentity):
+                    processed += self.resultsOpApply(op)
+
+                    if processed >= self.resultsBatchSize:
+                        processed = 0
+                        await asyncio.sleep(0)
+
+                        if gen != self._resultsGen:
+                            return
+            except TypeError:
+                # Unhashable identity
+                self.resultsReset(results)
+
     def bindingsUpdate(self, **bindings) -> None:
         self._initBindings.update(**bindings)
 
@@ -92,11 +198,10 @@ class SparQLQueryRunner(GAsyncObject):
         self.endResetModel()
 
     def prepare(self, name, query):
-        try:
-            q = prepareQuery(query)
-        except Exception:
-            log.debug(f'Error preparing query: {traceback.format_exc()}')
-        else:
+        # Prepared queries are shared (see querydb.prepare())
+        q = querydb.prepare(query)
+
+        if q is not None:
             self._qprepared[name] = q
 
     def graphQuery(self, query, bindings=None):
@@ -110,7 +215,8 @@ class SparQLQueryRunner(GAsyncObject):
         try:
             results = await graph.queryAsync(
                 query,
-                initBindings=bindings
+                initBindings=bindings,
+                cache=True
             )
         except Exception as err:
             log.debug(f'Graph query error ocurred: {err}')
@@ -125,9 +231,7 @@ class SparQLQueryRunner(GAsyncObject):
         if results:
             self._varsCount = len(results.vars)
 
-            self.beginResetModel()
-            self._results = list(results)
-            self.endResetModel()
+            await self.resultsUpdate(list(results))
 
             self.graph.publishGraphModelUpdateEvent()
 
@@ -142,9 +246,7 @@ class SparQLQueryRunner(GAsyncObject):
             )
 
             if results:
-                self.beginResetModel()
-                self._results = results
-                self.endResetModel()
+                ensure(self.resultsUpdate(results))
         except Exception:
             return None
 
@@ -230,10 +332,12 @@ class SparQLItemModel(AbstractModel,
 
     def __init__(self, graphUri='urn:ipg:i', graph=None,
                  rq=None, bindings=None,
-                 columns=['uri']):
+                 columns=['uri'],
+                 identityColumn: str = None):
         AbstractModel.__init__(self)
         SparQLQueryRunner.__init__(self, graphUri=graphUri, graph=graph,
-                                   rq=rq, bindings=bindings)
+                                   rq=rq, bindings=bindings,
+                                   identityColumn=identityColumn)
 
         self.colList = columns
 
@@ -309,6 +413,53 @@ class SparQLItemModel(AbstractModel,
                          parent: SparQLBaseItem) -> None:
         pass
 
+    def itemIndex(self, item: SparQLBaseItem):
+        if item is self.rootItem:
+            return QModelIndex()
+
+        return self.createIndex(item.row(), 0, item)
+
+    async def itemsSync(self, parent: SparQLBaseItem, results: list) -> set:
+        """
+        Remove the children of parent that are not in the results, and
+        update the data of the other children (matched by identity).
+        Returns the identities of the children that were kept
+        """
+
+        byIdentity = {self.rowIdentity(result): result for result in results}
+
+        children = parent.childItems
+        parentIndex = self.itemIndex(parent)
+        kept = set()
+
+        idx = len(children) - 1
+        while idx >= 0:
+            child = children[idx]
+            ident = getattr(child, 'identity', None)
+            result = byIdentity.get(ident) if ident is not None else None
+
+            if result is not None:
+                if list(child.itemData) != list(result):
+                    child.itemData = list(result) if \
+                        isinstance(child.itemData, list) else result
+
+                    cIndex = self.createIndex(idx, 0, child)
+                    self.dataChanged.emit(cIndex, cIndex)
+
+                kept.add(ident)
+                idx -= 1
+                continue
+
+            last = idx
+            while idx >= 0 and byIdentity.get(
+                    getattr(children[idx], 'identity', None)) is None:
+                idx -= 1
+
+            self.removeRows(idx + 1, last - idx, parentIndex)
+            await asyncio.sleep(0)
+
+        return kept
+
     def insertItem(self,
                    item: SparQLBaseItem,
                    parent: SparQLBaseItem = None) -> None:
@@ -329,6 +480,11 @@ class SparQLItemModel(AbstractModel,
         """
         Main API: build the tree recursively, asking which sparql
         query to run for each inserted item
+
+        In 'sync' mode, the items of the parent that are not in the
+        results anymore are removed, and existing items (matched by
+        identity) are updated in place instead of being inserted (their
+        children are synced as well)
         """
 
         parent = parentItem if parentItem else self.rootItem
@@ -342,7 +498,43 @@ class SparQLItemModel(AbstractModel,
         if not isinstance(results, list):
             return
 
+        kept, keptItems = set(), {}
+
+        if buildMode == 'sync':
+            try:
+                kept = await self.itemsSync(parent, results)
+                keptItems = {getattr(child, 'identity', None): child
+                             for child in parent.childItems}
+            except TypeError:
+                # Unhashable identity, rebuild the parent's children
+                if parent is self.rootItem:
+                    self.beginResetModel()
+                    parent.childItems.clear()
+                    self.endResetModel()
+                elif parent.childCount() > 0:
+                    self.removeRows(0, parent.childCount(),
+                                    self.itemIndex(parent))
+
         for result in list(results):
+            ident = self.rowIdentity(result)
+
+            if buildMode == 'sync' and ident in kept:
+                item = keptItems.get(ident)
+
+                try:
+                    q, bds = self.queryForParent(item) if item else \
+                        (None, None)
+                    if q:
+                        await self.graphBuild(q, bindings=bds,
+                                              parentItem=item,
+                                              buildMode='sync')
+                except Exception as err:
+                    traceback.print_exc()
+                    log.debug(f'graphBuild error: {err}')
+
+                await asyncio.sleep(0)
+                continue
+
             if buildMode == 'upgrade' and len(result) > 0:
                 """
                 Upgrading: check for an item with that URI in the model
@@ -365,6 +557,7 @@ class SparQLItemModel(AbstractModel,
             item = await self.itemFromResult(result, parent)
 
             if item:
+                item.identity = ident
                 self.insertItem(item, parent)
 
                 try:
@@ -387,7 +580,8 @@ class SparQLItemModel(AbstractModel,
     def update(self):
         if self.q0:
             ensure(self.graphBuild(self.q0,
-                                   bindings=self._initBindings))
+                                   bindings=self._initBindings,
+                                   buildMode='sync'))
 
     def upgrade(self, mergedGraph=None):
         if self.q0:
@@ -1,3 +1,6 @@
+import asyncio
+import collections
+
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import QAbstractListModel
 from PyQt5.QtCore import QModelIndex
@@ -8,6 +11,9 @@ from PyQt5.QtCore import QSize
 from PyQt5.QtCore import QVariant
 
 from galacteek import log
+from galacteek import ensure
+from galacteek import AsyncSignal
+from galacteek.ipfs.ipfsops import UnixFSTimeoutError
 from galacteek.ipfs.paths import posixIpfsPath
 from galacteek.ipfs.cidhelpers import getCID
 from galacteek.ipfs.cidhelpers import IPFSPath
@@ -59,6 +65,12 @@ class UnixFSEntryInfo:
             # application/unknown ?
             self._mimeType = 'application/octet-stream'
 
+    def mimeFromMetadata(self, metadata: dict):
+        # Mime type detected when the object was opened
+        mType = metadata.get('mimetype') if metadata else None
+        if mType:
+            self._mimeType = mType
+
     @property
     def mimeCategory(self):
         if self.mimeType:
@@ -68,6 +80,10 @@ class UnixFSEntryInfo:
     def cid(self):
         return self.entry['Hash']
 
+    @property
+    def cidPath(self):
+        return joinIpfs(cidConvertBase32(self.cid))
+
     @property
     def cidObject(self):
         return getCID(self.cid)
@@ -137,6 +153,12 @@ class UnixFSDirectoryModel(QAbstractListModel):
         self.app = QApplication.instance()
         self.entries = []
 
+        # Lower-cased entry names (filename search)
+        self.names = []
+
+        # Agent fetching the next pages of the listing (fetchMore)
+        self.pager = None
+
         self.iconFolder = getIcon('folder-open.png')
         self.iconFile = getIcon('file.png')
         self.iconUnknown = getIcon('unknown-file.png')
@@ -168,9 +190,45 @@ class UnixFSDirectoryModel(QAbstractListModel):
         return True
 
     def clearModel(self):
-        self.beginRemoveRows(QModelIndex(), 0, len(self.entries))
+        self.beginResetModel()
         self.entries.clear()
-        self.endRemoveRows()
+        self.names.clear()
+        self.endResetModel()
+
+    @staticmethod
+    def entryName(entry):
+        if isinstance(entry, UnixFSEntryInfo):
+            return entry.filename
+
+        return entry.get('Name', '')
+
+    def appendEntries(self, entries: list):
+        """
+        Append a batch of entries (a single rows insertion)
+        """
+
+        if not entries:
+            return 0
+
+        rowStart = len(self.entries)
+
+        self.beginInsertRows(
+            QModelIndex(), rowStart, rowStart + len(entries) - 1)
+        self.entries.extend(entries)
+        self.names.extend(self.entryName(e).lower() for e in entries)
+        self.endInsertRows()
+
+        return len(entries)
+
+    def canFetchMore(self, parent):
+        if parent.isValid() or not self.pager:
+            return False
+
+        return self.pager.canFetchMore()
+
+    def fetchMore(self, parent):
+        if not parent.isValid() and self.pager:
+            self.pager.fetchMore()
 
     def getHashFromIdx(self, idx):
         eInfo = self.getUnixFSEntryInfoFromIdx(idx)
@@ -234,25 +292,146 @@ class UnixFSDirectoryModel(QAbstractListModel):
         elif role == Qt.SizeHintRole and 0:
             return QSize(64, 64)
 
-    def searchByFilename(self, filename):
-        return self.match(
-            self.index(0, 0, QModelIndex()),
-            Qt.DisplayRole,
-            filename,
-            -1,
-            Qt.MatchContains | Qt.MatchWrap | Qt.MatchRecursive
-        )
+    def searchByFilename(self, filename, rowStart=0):
+        """
+        Returns the indexes of the fetched entries (starting at
+        rowStart) whose name contains filename (case-insensitive)
+        """
+
+        needle = filename.lower()
+
+        return [self.index(row, 0, QModelIndex())
+                for row in range(rowStart, len(self.names))
+                if needle in self.names[row]]
+
+
+class UnixFSFilenameSearch:
+    """
+    Incremental filename search on a UnixFSDirectoryModel.
+
+    Only the rows added since the last scan are searched when the
+    results run out, so new pages of the listing are searched as
+    they're fetched. Wraps around once everything was returned.
+    """
+
+    def __init__(self, model: UnixFSDirectoryModel, text: str):
+        self.model = model
+        self.text = text
+        self.scanned = 0
+        self.results = collections.deque()
+
+    def scan(self):
+        rows = len(self.model.names)
+
+        if rows < self.scanned:
+            # Model was cleared
+            self.scanned = 0
+
+        self.results.extend(
+            self.model.searchByFilename(self.text, rowStart=self.scanned))
+        self.scanned = rows
+
+    def next(self):
+        if not self.results:
+            self.scan()
+
+        if not self.results and self.scanned > 0:
+            # Wrap
+            self.scanned = 0
+            self.scan()
+
+        if self.results:
+            return self.results.popleft()
 
 
 class UnixFSModelAgent:
     """
     The UnixFSModelAgent operates on a UnixFSDirectoryModel.
-    It can list the content of unixfs directories and fill in
-    the entries served by data()
+
+    Directories are listed page by page: listDirectory() fetches the
+    first page of entries, and the next pages are fetched when the view
+    asks for more (the model's canFetchMore/fetchMore). Every pack of
+    entries produced by the listing is inserted in the model at once.
+
+    The pages are stored in the multihash database's continuation cache
+    while listing, reopening a directory serves the cached entries first
+    and resumes the listing after them.
+
+    listingEnded is emitted (with the path) when the listing is
+    exhausted, or when it fails.
     """
 
-    def __init__(self, unixFsModel: UnixFSDirectoryModel):
+    def __init__(self, unixFsModel: UnixFSDirectoryModel,
+                 entryFactory=None,
+                 pageSize: int = 1024,
+                 packSize: int = 64,
+                 cacheEntries: bool = True):
         self.model = unixFsModel
+        self.entryFactory = entryFactory
+        self.pageSize = pageSize
+        self.packSize = packSize
+        self.cacheEntries = cacheEntries
+        self.generatorTimeout = 9
+        self.path = None
+        self.exhausted = True
+
+        self._source = None
+        self._fetchTask = None
+        self._lock = asyncio.Lock()
+
+        self.listingEnded = AsyncSignal(str)
+
+    @property
+    def metaDb(self):
+        if self.cacheEntries:
+            return getattr(self.model.app, 'multihashDb', None)
+
+    def canFetchMore(self):
+        return self._source is not None and not self.exhausted
+
+    async def entriesMetadata(self, entries: list) -> None:
+        """
+        Use the mime types detected for the listed files (kept in the
+        metadata store), with a single lookup for a pack of entries
+        """
+
+        db = self.metaDb
+        files = [e for e in entries
+                 if isinstance(e, UnixFSEntryInfo) and e.isFile()]
+
+        if not db or not files:
+            return
+
+        # Objects are stored by full path or by CID path
+        paths = [(e, e.getFullPath(), e.cidPath) for e in files]
+        try:
+            metadata = await db.getMany(
+                [path for e, fPath, cPath in paths
+                 for path in (fPath, cPath)])
+        except Exception as err:
+            log.debug(f'UnixFS list({self.path}): metadata error: {err}')
+            return
+
+        for entry, fPath, cPath in paths:
+            entry.mimeFromMetadata(
+                metadata.get(fPath) or metadata.get(cPath))
+
+    def fetchMore(self):
+        if self._fetchTask and not self._fetchTask.done():
+            return
+
+        self._fetchTask = ensure(self.fetchPage())
+
+    def close(self):
+        if self._fetchTask and not self._fetchTask.done():
+            self._fetchTask.cancel()
+
+        self._fetchTask = None
+        self._source = None
+        self.exhausted = True
+
+        if self.model.pager is self:
+            self.model.pager = None
 
     async def listDirectory(self,
                             ipfsop,
@@ -260,46 +439,120 @@ class UnixFSModelAgent:
                             resolve_type=True,
                             clearModel=True,
                             generatorTimeout=9,
-                            maxEntries=2048):
-        eCount = 0
-
-        eGenerator = ipfsop.listStreamed(path, resolve_type)
-        fetching = True
+                            raiseErrors=False):
+        self.close()
 
         if clearModel:
             self.model.clearModel()
 
-        while fetching:
+        self.path = path
+        self.generatorTimeout = generatorTimeout
+        self.exhausted = False
+        self._source = self.entriesSource(ipfsop, path, resolve_type)
+        self.model.pager = self
+
+        return await self.fetchPage(raiseErrors=raiseErrors)
+
+    async def fetchPage(self, raiseErrors=False):
+        """
+        Fetch the next page of entries from the listing
+        """
+
+        async with self._lock:
+            source, count = self._source, 0
+
+            while source and count < self.pageSize:
+                try:
+                    entries = await source.__anext__()
+                except StopAsyncIteration:
+                    entries = None
+                except Exception as err:
+                    log.warning(
+                        f'UnixFS list({self.path}): error: {err}')
+
+                    if source is self._source:
+                        self.exhausted = True
+                        await self.listingEnded.emit(self.path)
+
+                    if raiseErrors:
+                        raise err
+
+                    return False
+
+                if source is not self._source:
+                    # Listing was closed/replaced meanwhile
+                    return False
+
+                if entries is None:
+                    self.exhausted = True
+                    break
+
+                if self.entryFactory:
+                    entries = [self.entryFactory(e) for e in entries if e]
+                else:
+                    entries = [e for e in entries if e]
+
+                await self.entriesMetadata(entries)
+
+                if source is not self._source:
+                    return False
+
+                count += self.model.appendEntries(entries)
+
+            if source and self.exhausted:
+                await self.listingEnded.emit(self.path)
+
+            return True
+
+    async def entriesSource(self, ipfsop, path: str, resolve_type: bool):
+        """
+        Yields packs of entries from the dirents cache, and then from a
+        streamed ls of the directory (skipping the entries that were
+        already cached)
+        """
+
+        db = self.metaDb
+        cached = 0
+
+        if db:
+            if await db.dirEntriesComplete(path):
+                async for pack in db.getDirEntries(
+                        path, egenCount=self.packSize):
+                    yield pack
+
+                return
+
+            async for page in db.getDirEntriesPartial(path):
+                cached += len(page)
+                yield page
+
+        skip = cached
+        eGenerator = ipfsop.listStreamed(path, resolve_type,
+                                         egenCount=self.packSize)
+
+        while True:
             try:
                 entries = await ipfsop.waitFor(
                     eGenerator.__anext__(),
-                    generatorTimeout
+                    self.generatorTimeout
                 )
-                if entries is None:
-                    raise ValueError('Entries generator timeout')
+            except StopAsyncIteration:
+                break
 
-                for entry in entries:
-                    if not entry:
-                        continue
+            if entries is None:
+                raise UnixFSTimeoutError()
 
-                    eCount += 1
+            # listStreamed() reuses its list
+            pack = list(entries[skip:])
+            skip = max(0, skip - len(entries))
 
-                    if eCount >= maxEntries:
-                        # Limit reached
-                        fetching = False
-                        break
+            if not pack:
+                continue
 
-                    rowStart = self.model.rowCount(QModelIndex())
+            if db:
+                await db.writeDirEntries(path, pack, partial=True)
 
-                    self.model.beginInsertRows(
-                        QModelIndex(), rowStart, rowStart)
-                    self.model.entries.append(entry)
-                    self.model.endInsertRows()
-            except StopAsyncIteration:
-                fetching = False
-            except Exception as err:
-                log.warning(
-                    f'UnixFS list({path}): error: {err}')
-                return False
+            yield pack
 
-        return True
+        if db:
+            await db.completeDirEntries(path)
@@ -1,131 +1,627 @@
 import asyncio
-import aiofiles
+import aiosqlite
 import os.path
 import os
 import orjson
-from itertools import zip_longest
+import shutil
+import time
+
+from cachetools import LRUCache
 
 from galacteek import log
+from galacteek import ensure
 from galacteek.ipfs.cidhelpers import stripIpfs
 from galacteek.ipfs.cidhelpers import isIpfsPath
 
 
-class IPFSObjectMetadataDatabase:
+schemaScript = '''
+CREATE TABLE IF NOT EXISTS objmeta
+(key TEXT PRIMARY KEY, data BLOB, size INTEGER, atime REAL);
+
+CREATE INDEX IF NOT EXISTS objmeta_atime ON objmeta(atime);
+
+CREATE TABLE IF NOT EXISTS dirents
+(key TEXT PRIMARY KEY, complete INTEGER, pages INTEGER,
+size INTEGER, atime REAL);
+
+CREATE INDEX IF NOT EXISTS dirents_atime ON dirents(atime);
+
+CREATE TABLE IF NOT EXISTS dirents_pages
+(key TEXT, page INTEGER, data BLOB, PRIMARY KEY (key, page));
+
+CREATE TABLE IF NOT EXISTS rdfcache
+(key TEXT PRIMARY KEY, data BLOB, size INTEGER, atime REAL);
+
+CREATE INDEX IF NOT EXISTS rdfcache_atime ON rdfcache(atime);
+'''
+
+# Marks a cached lookup that found nothing
+Missing = object()
+
+
+def legacyTreeRead(treePath: str, batchSize: int = 512):
+    """
+    Reads the one-file-per-object tree of the old metadata database
+    (run in an executor), yielding batches of (kind, key, data) tuples
+    """
+
+    batch = []
+
+    for container in os.listdir(treePath):
+        cPath = os.path.join(treePath, container)
+
+        if not os.path.isdir(cPath):
+            continue
+
+        for fname in os.listdir(cPath):
+            fPath = os.path.join(cPath, fname)
+
+            try:
+                with open(fPath, 'rb') as fd:
+                    raw = fd.read()
+
+                if fname.endswith('.direntries'):
+                    batch.append(('dirents', fname[:-11],
+                                  orjson.loads(raw)))
+                elif fname.endswith('.direntries.partial'):
+                    continue
+                else:
+                    batch.append(('meta', fname, orjson.loads(raw)))
+            except Exception as err:
+                log.debug(f'Migration: cannot read {fPath}: {err}')
+                continue
+
+            if len(batch) >= batchSize:
+                yield batch
+                batch = []
+
+    if batch:
+        yield batch
+
+
+class IPFSObjectMetadataStore:
     """
-    Basic file-based database to hold metadata about IPFS objects by path
+    SQLite-based database holding metadata about IPFS objects by path,
+    the entries of UnixFS directories, and the RDF conversions of
+    JSON-LD objects.
+
+    Lookups go through an in-memory LRU cache (misses are cached too).
+    Access times are recorded in memory and written when evicting. The
+    least recently used records are evicted when the database gets
+    bigger than maxSize bytes, and records unused for more than maxAge
+    seconds are dropped.
     """
 
-    def __init__(self, metaDbPath, loop=None):
-        self._metaDbPath = metaDbPath
-        self._lock = asyncio.Lock(
-            loop=loop if loop else asyncio.get_event_loop())
+    def __init__(self, dbPath: str,
+                 legacyPath: str = None,
+                 cacheSize: int = 4096,
+                 maxSize: int = 256 * 1024 * 1024,
+                 maxAge: int = 86400 * 120,
+                 direntsPageSize: int = 512,
+                 evictEvery: int = 512):
+        self._dbPath = dbPath
+        self._legacyPath = legacyPath
+        self._db = None
+        self._lock = asyncio.Lock()
+        self._ready = asyncio.Event()
+        self._setupLock = asyncio.Lock()
+        self._cache = LRUCache(cacheSize)
+        self._atimes = {}
+        self._writes = 0
+
+        self.maxSize = maxSize
+        self.maxAge = maxAge
+        self.direntsPageSize = direntsPageSize
+        self.evictEvery = evictEvery
+
+    @property
+    def db(self):
+        return self._db
 
     @property
     def metaDbPath(self):
-        return self._metaDbPath
+        return self._dbPath
 
-    def path(self, rscPath, ext=None):
+    def key(self, rscPath):
         if isinstance(rscPath, str) and isIpfsPath(rscPath):
-            path = stripIpfs(
-                rscPath.rstrip('/')).replace('/', '_')
-            comps = path.split('/')
+            return stripIpfs(rscPath.rstrip('/')).replace('/', '_')
 
-            if len(comps) > 0:
-                containerId = comps[0][0:8]
-                containerPath = os.path.join(self.metaDbPath, containerId)
-                metaPath = os.path.join(containerPath, path)
+    async def setup(self):
+        async with self._setupLock:
+            if self._db:
+                return True
 
-                if isinstance(ext, str):
-                    metaPath = f'{metaPath}.{ext}'
+            try:
+                self._db = await aiosqlite.connect(self._dbPath)
+                await self.db.execute('PRAGMA journal_mode=WAL')
+                await self.db.execute('PRAGMA synchronous=NORMAL')
+                await self.db.executescript(schemaScript)
+                await self.db.commit()
+            except Exception as err:
+                log.debug(f'Metadata store: cannot open {self._dbPath}: '
+                          f'{err}')
+                return False
 
-                return containerPath, metaPath, os.path.exists(metaPath)
+            if self._legacyPath and os.path.isdir(self._legacyPath):
+                await self.migrate(self._legacyPath)
 
-        return None, None, False
+            self._ready.set()
 
-    def pathDirEntries(self, rscPath):
-        return self.path(rscPath, ext='direntries')
+            ensure(self.evict())
+            return True
 
-    async def write(self, metaPath, metadata, mode='w+b'):
-        async with aiofiles.open(metaPath, mode) as fd:
-            await fd.write(
-                orjson.dumps(metadata, option=orjson.OPT_INDENT_2)
-            )
+    async def ready(self):
+        if not self._ready.is_set():
+            await self.setup()
 
-    async def writeDirEntries(self, rscPath, data, mode='w+b'):
-        cPath, dePath, exists = self.pathDirEntries(rscPath)
+        return self.db is not None
 
-        if not exists:
-            if not os.path.isdir(cPath):
-                os.mkdir(cPath)
+    async def close(self):
+        if self.db:
+            await self.flushAccessTimes()
+            await self.db.close()
+            self._db = None
+            self._ready.clear()
 
-            try:
-                async with aiofiles.open(dePath, mode) as fd:
-                    await fd.write(orjson.dumps(data))
-            except BaseException:
-                log.debug(f'Error storing dirents for {rscPath}')
-            else:
-                log.debug(f'Stored dirents for {rscPath}')
+    async def migrate(self, treePath: str):
+        """
+        One-shot migration of the old (one file per object) database.
+        The tree is removed once it's been imported
+        """
+
+        loop = asyncio.get_event_loop()
+        now = time.time()
+        count = 0
+
+        log.info(f'Metadata store: migrating {treePath}')
+
+        reader = legacyTreeRead(treePath)
+
+        try:
+            while True:
+                batch = await loop.run_in_executor(None, next, reader, None)
+                if batch is None:
+                    break
+
+                for kind, key, data in batch:
+                    if kind == 'meta' and isinstance(data, dict):
+                        blob = orjson.dumps(data)
+                        await self.db.execute(
+                            'INSERT OR IGNORE INTO objmeta '
+                            '(key, data, size, atime) VALUES (?, ?, ?, ?)',
+                            (key, blob, len(blob), now))
+                    elif kind == 'dirents' and isinstance(data, list):
+                        await self._direntsInsert(key, data, now)
+
+                    count += 1
+
+                await self.db.commit()
+        except Exception as err:
+            log.warning(f'Metadata store: migration error: {err}')
+            return False
+
+        log.info(f'Metadata store: migrated {count} records')
+
+        await loop.run_in_executor(
+            None, shutil.rmtree, treePath, True)
+        return True
+
+    def _touch(self, key):
+        self._atimes[key] = time.time()
+
+    async def _written(self):
+        self._writes += 1
+
+        if self.evictEvery and self._writes % self.evictEvery == 0:
+            await self.evict()
+
+    async def flushAccessTimes(self):
+        atimes, self._atimes = self._atimes, {}
+
+        if not atimes or not self.db:
+            return
+
+        params = [(atime, key) for key, atime in atimes.items()]
+
+        await self.db.executemany(
+            'UPDATE objmeta SET atime=? WHERE key=?', params)
+        await self.db.executemany(
+            'UPDATE dirents SET atime=? WHERE key=?', params)
+        await self.db.executemany(
+            'UPDATE rdfcache SET atime=? WHERE key=?', params)
+        await self.db.commit()
+
+    async def evict(self):
+        """
+        Drop the records unused for more than maxAge seconds, and the
+        least recently used records if the database is too big
+        """
+
+        if not await self.ready():
+            return
+
+        async with self._lock:
+            await self.flushAccessTimes()
+
+            evicted = []
+
+            if self.maxAge:
+                limit = time.time() - self.maxAge
+
+                for table in ['objmeta', 'dirents', 'rdfcache']:
+                    async with self.db.execute(
+                            f'SELECT key FROM {table} WHERE atime < ?',
+                            (limit, )) as cursor:
+                        evicted += [(table, row[0]) async for row in cursor]
+
+            if self.maxSize:
+                query = '''
+                    SELECT 'objmeta', key, size, atime FROM objmeta
+                    UNION ALL
+                    SELECT 'dirents', key, size, atime FROM dirents
+                    UNION ALL
+                    SELECT 'rdfcache', key, size, atime FROM rdfcache
+                    ORDER BY atime ASC
+                '''
+                total = 0
+                async with self.db.execute(
+                        'SELECT (SELECT COALESCE(SUM(size), 0) '
+                        'FROM objmeta) + (SELECT COALESCE(SUM(size), 0) '
+                        'FROM dirents) + (SELECT COALESCE(SUM(size), 0) '
+                        'FROM rdfcache)') as cursor:
+                    row = await cursor.fetchone()
+                    total = row[0] if row else 0
+
+                if total > self.maxSize:
+                    # Make some room (down to 90% of the max size)
+                    target = total - int(self.maxSize * 0.9)
+
+                    async with self.db.execute(query) as cursor:
+                        async for table, key, size, atime in cursor:
+                            if target <= 0:
+                                break
+
+                            evicted.append((table, key))
+                            target -= size if size else 0
+
+            if not evicted:
+                return
+
+            for table, key in evicted:
+                await self.db.execute(
+                    f'DELETE FROM {table} WHERE key=?', (key, ))
+
+                if table == 'dirents':
+                    await self.db.execute(
+                        'DELETE FROM dirents_pages WHERE key=?', (key, ))
+
+                self._cache.pop(key, None)
+
+            await self.db.commit()
+
+            log.debug(f'Metadata store: evicted {len(evicted)} records')
 
     async def store(self, rscPath, **data):
-        containerPath, metaPath, exists = self.path(rscPath)
-        if metaPath and not exists:
-            await asyncio.sleep(0)
-            async with self._lock:
-                if not os.path.isdir(containerPath):
-                    os.mkdir(containerPath)
-                try:
-                    await self.write(metaPath, data)
-                except BaseException:
-                    log.debug('Error storing metadata for {0}'.format(
-                        rscPath))
-                else:
-                    log.debug('{0}: stored metadata {1}'.format(rscPath, data))
-        elif metaPath and exists:
-            # Patch the existing metadata
-            await asyncio.sleep(0)
+        """
+        Store metadata for an object. If metadata already exists
+        for this object, only the missing keys are added
+        """
+
+        key = self.key(rscPath)
+        if not key or not await self.ready():
+            return
+
+        async with self._lock:
+            metadata = await self._get(key)
 
-            metadata = await self.get(rscPath)
-            if not isinstance(metadata, dict):
+            if isinstance(metadata, dict):
+                if all(k in metadata for k in data.keys()):
+                    return
+
+                data.update(metadata)
+
+            blob = orjson.dumps(data)
+
+            try:
+                await self.db.execute(
+                    'INSERT OR REPLACE INTO objmeta '
+                    '(key, data, size, atime) VALUES (?, ?, ?, ?)',
+                    (key, blob, len(blob), time.time()))
+                await self.db.commit()
+            except Exception as err:
+                log.debug(f'Error storing metadata for {rscPath}: {err}')
                 return
+            else:
+                log.debug(f'{rscPath}: stored metadata {data}')
+
+            self._cache[key] = data
+
+        await self._written()
+
+    async def _get(self, key):
+        cached = self._cache.get(key, None)
+
+        if cached is Missing:
+            return None
+        elif cached is not None:
+            self._touch(key)
+            return cached
 
-            async with self._lock:
-                for key, value in data.items():
-                    if key not in metadata:
-                        metadata[key] = value
-                try:
-                    await self.write(metaPath, metadata)
-                except BaseException:
-                    pass
+        async with self.db.execute(
+                'SELECT data FROM objmeta WHERE key=?', (key, )) as cursor:
+            row = await cursor.fetchone()
+
+        try:
+            metadata = orjson.loads(row[0]) if row else None
+        except Exception:
+            metadata = None
+
+        self._cache[key] = metadata if metadata is not None else Missing
+
+        if metadata is not None:
+            self._touch(key)
+
+        return metadata
 
     async def get(self, rscPath):
-        containerPath, metaPath, exists = self.path(rscPath)
-        if metaPath and exists:
-            await asyncio.sleep(0)
-            async with self._lock:
-                try:
-                    async with aiofiles.open(metaPath, 'rt') as fd:
-                        data = await fd.read()
-                        return orjson.loads(data)
-                except BaseException as err:
-                    # Error reading metadata
-                    log.debug('Error reading metadata for {0}: {1}'.format(
-                        rscPath, str(err)))
-                    os.unlink(metaPath)
+        key = self.key(rscPath)
+        if not key or not await self.ready():
+            return None
+
+        try:
+            return await self._get(key)
+        except Exception as err:
+            log.debug(f'Error reading metadata for {rscPath}: {err}')
+
+    async def getMany(self, rscPaths: list, chunkSize: int = 256):
+        """
+        Returns the metadata for a list of objects, as a dict
+        (object path -> metadata or None)
+        """
+
+        result = {}
+        keys = {}
+
+        for rscPath in rscPaths:
+            key = self.key(rscPath)
+            cached = self._cache.get(key, None) if key else Missing
+
+            if cached is Missing:
+                result[rscPath] = None
+            elif cached is not None:
+                self._touch(key)
+                result[rscPath] = cached
+            else:
+                keys.setdefault(key, []).append(rscPath)
+
+        if not keys or not await self.ready():
+            return result
+
+        kList = list(keys.keys())
+
+        for idx in range(0, len(kList), chunkSize):
+            chunk = kList[idx:idx + chunkSize]
+            found = {}
+
+            query = 'SELECT key, data FROM objmeta WHERE key IN ({})'.format(
+                ','.join('?' * len(chunk)))
+
+            async with self.db.execute(query, chunk) as cursor:
+                async for key, blob in cursor:
+                    try:
+                        found[key] = orjson.loads(blob)
+                    except Exception:
+                        continue
+
+            for key in chunk:
+                metadata = found.get(key)
+
+                self._cache[key] = metadata if metadata is not None \
+                    else Missing
+
+                if metadata is not None:
+                    self._touch(key)
+
+                for rscPath in keys[key]:
+                    result[rscPath] = metadata
+
+        return result
+
+    async def _direntsInsert(self, key, entries, atime, complete=True):
+        ps = self.direntsPageSize
+        size = 0
+
+        await self.db.execute(
+            'DELETE FROM dirents_pages WHERE key=?', (key, ))
+
+        for pnum, idx in enumerate(range(0, len(entries), ps)):
+            blob = orjson.dumps(entries[idx:idx + ps])
+            size += len(blob)
+
+            await self.db.execute(
+                'INSERT INTO dirents_pages (key, page, data) '
+                'VALUES (?, ?, ?)', (key, pnum, blob))
+
+        await self.db.execute(
+            'INSERT OR REPLACE INTO dirents '
+            '(key, complete, pages, size, atime) VALUES (?, ?, ?, ?, ?)',
+            (key, 1 if complete else 0,
+             -(-len(entries) // ps), size, atime))
+
+    async def direntsState(self, rscPath):
+        key = self.key(rscPath)
+        if not key or not await self.ready():
+            return None
+
+        async with self.db.execute(
+                'SELECT complete, pages FROM dirents WHERE key=?',
+                (key, )) as cursor:
+            return await cursor.fetchone()
+
+    async def dirEntriesComplete(self, rscPath):
+        state = await self.direntsState(rscPath)
+        return state is not None and state[0] == 1
+
+    async def writeDirEntries(self, rscPath, data, partial=False):
+        """
+        Store the entries of a UnixFS directory.
+
+        With partial=True, data is a page of entries that is appended to
+        the continuation cache of the directory (the directory is still
+        being listed).
+        """
+
+        key = self.key(rscPath)
+        if not key or not data or not await self.ready():
+            return False
+
+        async with self._lock:
+            state = await self.direntsState(rscPath)
+
+            try:
+                if partial:
+                    if state and state[0] == 1:
+                        return False
+
+                    blob = orjson.dumps(data)
+                    page = state[1] if state else 0
+
+                    await self.db.execute(
+                        'INSERT OR REPLACE INTO dirents_pages '
+                        '(key, page, data) VALUES (?, ?, ?)',
+                        (key, page, blob))
+                    await self.db.execute(
+                        'INSERT INTO dirents '
+                        '(key, complete, pages, size, atime) '
+                        'VALUES (?, 0, 1, ?, ?) '
+                        'ON CONFLICT(key) DO UPDATE SET '
+                        'pages=pages + 1, size=size + ?, atime=?',
+                        (key, len(blob), time.time(),
+                         len(blob), time.time()))
+                elif not state or state[0] != 1:
+                    await self._direntsInsert(key, data, time.time())
+                else:
+                    return False
+
+                await self.db.commit()
+            except Exception as err:
+                log.debug(f'Error storing dirents for {rscPath}: {err}')
+                return False
+
+        await self._written()
+        return True
+
+    async def completeDirEntries(self, rscPath):
+        """
+        The directory was fully listed: mark its continuation cache
+        as a complete listing
+        """
+
+        key = self.key(rscPath)
+        if not key or not await self.ready():
+            return
+
+        async with self._lock:
+            await self.db.execute(
+                'UPDATE dirents SET complete=1 WHERE key=?', (key, ))
+            await self.db.commit()
+
+    async def _direntsPages(self, rscPath, complete: bool):
+        key = self.key(rscPath)
+        if not key or not await self.ready():
+            return
+
+        state = await self.direntsState(rscPath)
+        if not state or state[0] != int(complete):
+            return
+
+        self._touch(key)
+
+        # Pages are fetched one by one to keep the memory usage low
+        for pnum in range(0, state[1]):
+            async with self.db.execute(
+                    'SELECT data FROM dirents_pages WHERE key=? AND page=?',
+                    (key, pnum)) as cursor:
+                row = await cursor.fetchone()
+
+            if not row:
+                break
+
+            yield orjson.loads(row[0])
 
     async def getDirEntries(self, rscPath, egenCount=16):
-        containerPath, dePath, exists = self.pathDirEntries(rscPath)
+        """
+        Yields the entries of a fully listed directory, by packs
+        of egenCount entries
+        """
+
+        try:
+            async for page in self._direntsPages(rscPath, True):
+                for idx in range(0, len(page), egenCount):
+                    yield page[idx:idx + egenCount]
+        except GeneratorExit:
+            log.debug(f'getDirEntries {rscPath}: generator exit')
+            raise
+        except Exception as err:
+            log.debug(f'getDirEntries error: {rscPath}: {err}')
+
+    async def getDirEntriesPartial(self, rscPath):
+        """
+        Yields the pages stored in the continuation cache of a directory
+        that hasn't been fully listed
+        """
 
-        if dePath and exists:
+        try:
+            async for page in self._direntsPages(rscPath, False):
+                yield page
+        except GeneratorExit:
+            raise
+        except Exception as err:
+            log.debug(f'getDirEntriesPartial error: {rscPath}: {err}')
+
+    def rdfKey(self, rscPath, version):
+        key = self.key(rscPath)
+        if key:
+            return f'{key}@{version}'
+
+    async def getRdf(self, rscPath, version: str):
+        """
+        Return the cached RDF conversion (encoded) of an object, for
+        this version of the converter
+        """
+
+        key = self.rdfKey(rscPath, version)
+        if not key or not await self.ready():
+            return None
+
+        try:
+            async with self.db.execute(
+                    'SELECT data FROM rdfcache WHERE key=?',
+                    (key, )) as cursor:
+                row = await cursor.fetchone()
+        except Exception as err:
+            log.debug(f'Error reading RDF cache for {rscPath}: {err}')
+            return None
+
+        if row:
+            self._touch(key)
+            return row[0]
+
+    async def storeRdf(self, rscPath, version: str, data: bytes):
+        key = self.rdfKey(rscPath, version)
+        if not key or not data or not await self.ready():
+            return False
+
+        async with self._lock:
             try:
-                async with aiofiles.open(dePath, 'rt') as fd:
-                    data = orjson.loads(await fd.read())
-
-                    if isinstance(data, list):
-                        for pack in zip_longest(*[iter(data)] * egenCount,
-                                                fillvalue=None):
-                            yield [e for e in pack if e is not None]
-            except GeneratorExit:
-                log.debug(f'getDirEntries {rscPath}: generator exit')
-                raise
-            except BaseException as err:
-                log.debug(f'getDirEntries error: {rscPath}: {err}')
+                await self.db.execute(
+                    'INSERT OR REPLACE INTO rdfcache '
+                    '(key, data, size, atime) VALUES (?, ?, ?, ?)',
+                    (key, data, len(data), time.time()))
+                await self.db.commit()
+            except Exception as err:
+                log.debug(f'Error storing RDF cache for {rscPath}: {err}')
+                return False
+
+        await self._written()
+        return True
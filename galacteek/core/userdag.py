@@ -43,6 +43,9 @@ PINREQS_NODEKEY = 'pinrequests'
 
 
 class UserDAG(EvolvingDAG):
+    incremental = True
+    saveDebounce = 0.5
+
     def updateDagSchema(self, root):
         changed = False
 
@@ -1,3 +1,7 @@
+import threading
+
+from cachetools import LRUCache
+
 from Cryptodome.PublicKey import ECC
 
 from galacteek.crypto import BaseCryptoExec
@@ -10,7 +14,73 @@ from nacl.public import PublicKey
 import nacl.utils
 
 
+class Curve25519BoxCache:
+    """
+    LRU cache of NaCl Box objects (a Box holds the precomputed
+    X25519 shared key for a (private key, public key) pair).
+
+    The cache is used from the executor threads, hence the lock.
+    Entries can be tracked per peer, so that the box of a peer is
+    dropped when its public key CID changes.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self._boxes = LRUCache(maxsize=maxsize)
+        self._peers = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def box(self, privKey: bytes, pubKey: bytes,
+            peerId: str = None, keyCid: str = None) -> Box:
+        key = (bytes(privKey), bytes(pubKey))
+
+        with self._lock:
+            if peerId:
+                known = self._peers.get(peerId)
+
+                if known and known[0] != keyCid:
+                    # The peer's key has changed
+                    self._boxes.pop(known[1], None)
+
+                self._peers[peerId] = (keyCid, key)
+
+            box = self._boxes.get(key)
+
+            if box:
+                self.hits += 1
+                return box
+
+            self.misses += 1
+
+        # Shared key computation (outside of the lock)
+        box = Box(PrivateKey(privKey), PublicKey(pubKey))
+
+        with self._lock:
+            self._boxes[key] = box
+
+        return box
+
+    def invalidatePeer(self, peerId: str) -> None:
+        with self._lock:
+            known = self._peers.pop(peerId, None)
+
+            if known:
+                self._boxes.pop(known[1], None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._boxes.clear()
+            self._peers.clear()
+
+
 class Curve25519(BaseCryptoExec):
+    def __init__(self, *args, boxCacheSize: int = 256, **kw):
+        super().__init__(*args, **kw)
+
+        self.boxCache = Curve25519BoxCache(maxsize=boxCacheSize)
+
     async def genKeys(self):
         def _generateKeypair():
             key = PrivateKey.generate()
@@ -29,21 +99,42 @@ class Curve25519(BaseCryptoExec):
             self.cacheKey(pubKeyCid, key)
             return key
 
-    async def encrypt(self, msg: bytes, privKey, pubKey):
-        def _box():
-            try:
-                nonce = nacl.utils.random(Box.NONCE_SIZE)
-                box = Box(PrivateKey(privKey), PublicKey(pubKey))
-                return box.encrypt(msg, nonce)
-            except Exception:
-                return
-
-        return await self._exec(_box)
-
-    async def decrypt(self, enc, privKey, pubKey):
+    def _encrypt(self, msg: bytes, privKey, pubKey,
+                 peerId=None, keyCid=None):
+        try:
+            nonce = nacl.utils.random(Box.NONCE_SIZE)
+            box = self.boxCache.box(privKey, pubKey,
+                                    peerId=peerId, keyCid=keyCid)
+            return box.encrypt(msg, nonce)
+        except Exception:
+            return
+
+    async def encrypt(self, msg: bytes, privKey, pubKey,
+                      peerId=None, keyCid=None):
+        return await self._exec(self._encrypt, msg, privKey, pubKey,
+                                peerId=peerId, keyCid=keyCid)
+
+    async def encryptBatch(self, privKey, items: list):
+        """
+        Encrypt several messages in one executor call
+
+        :param items: list of (msg, pubKey, peerId, keyCid) tuples
+        :return: list of encrypted messages (None for failures)
+        """
+
+        def _batch():
+            return [self._encrypt(msg, privKey, pubKey,
+                                  peerId=peerId, keyCid=keyCid)
+                    for msg, pubKey, peerId, keyCid in items]
+
+        return await self._exec(_batch)
+
+    async def decrypt(self, enc, privKey, pubKey,
+                      peerId=None, keyCid=None):
         def _dec():
             try:
-                box = Box(PrivateKey(privKey), PublicKey(pubKey))
+                box = self.boxCache.box(privKey, pubKey,
+                                        peerId=peerId, keyCid=keyCid)
                 return box.decrypt(enc)
             except Exception:
                 return
@@ -17,6 +17,7 @@ from galacteek.core.asynclib import loopTime
 from galacteek.ipfs.cidhelpers import IPFSPath
 
 from galacteek.database.models import *  # noqa
+from galacteek.database import fts
 
 from galacteek.database.ops.bm import *  # noqa
 from galacteek.database.ops.pinning import *  # noqa
@@ -43,6 +44,8 @@ async def initOrm(dbpath):
         )
 
         await Tortoise.generate_schemas()
+
+        await fts.ftsSetup()
     except Exception:
         traceback.print_exc()
         return False
@@ -51,6 +54,11 @@ async def initOrm(dbpath):
 
 
 async def closeOrm():
+    from galacteek.database.psmanager import psRecorderShutdown
+
+    # Flush the pubsub metrics that haven't been written yet
+    await psRecorderShutdown()
+
     await Tortoise.close_connections()
 
 
@@ -75,8 +83,13 @@ async def hashmarksByPath(ref):
 
 async def hashmarksSearch(query=None, category=None):
     filter = Q(active=True)
+    ftsQuery = fts.ftsQuery(query) if query else None
+    ids = None
 
-    if query:
+    if ftsQuery and fts.ftsAvailable():
+        ids = await fts.hashmarksFtsSearch(ftsQuery)
+        filter = filter & Q(id__in=ids)
+    elif query:
         filter = filter & (Q(path__icontains=query) |
                            Q(title__icontains=query) |
                            Q(description__icontains=query) |
@@ -84,7 +97,14 @@ async def hashmarksSearch(query=None, category=None):
     if category:
         filter = filter & Q(category__name=category)
 
-    return await Hashmark.filter(filter)
+    hashmarks = await Hashmark.filter(filter)
+
+    if ids:
+        # Best matches first
+        rank = {hid: idx for idx, hid in enumerate(ids)}
+        hashmarks.sort(key=lambda hashmark: rank[hashmark.id])
+
+    return hashmarks
 
 
 async def hashmarksExists(pathorurl):
@@ -303,7 +323,13 @@ async def ipTagAdd(tag):
     return ex
 
 
-async def urlHistorySearch(query):
+async def urlHistorySearch(query, limit=256, ranked=False):
+    ftsQuery = fts.ftsQuery(query)
+
+    if ftsQuery and fts.ftsAvailable():
+        return await fts.urlHistoryFtsSearch(
+            ftsQuery, limit=limit, ranked=ranked)
+
     return await URLHistoryVisit.filter(
         Q(historyitem__url__icontains=query) |
         Q(title__icontains=query)).order_by(
@@ -0,0 +1,183 @@
+import re
+import traceback
+
+from tortoise import Tortoise
+
+from galacteek import log
+
+
+# Bump when the FTS tables or triggers change (they're recreated and
+# backfilled from the content tables)
+FTS_VERSION = 1
+
+ftsSchemas = {
+    # External content table, the hashmark table holds the data
+    'hashmark_fts': '''
+CREATE VIRTUAL TABLE hashmark_fts USING fts5(
+    path, url, title, description, comment,
+    content='hashmark', content_rowid='id', prefix='2 3');
+
+CREATE TRIGGER hashmark_fts_ai AFTER INSERT ON hashmark BEGIN
+    INSERT INTO hashmark_fts(rowid, path, url, title, description, comment)
+    VALUES (new.id, new.path, new.url, new.title, new.description,
+            new.comment);
+END;
+
+CREATE TRIGGER hashmark_fts_ad AFTER DELETE ON hashmark BEGIN
+    INSERT INTO hashmark_fts(hashmark_fts, rowid, path, url, title,
+                             description, comment)
+    VALUES ('delete', old.id, old.path, old.url, old.title,
+            old.description, old.comment);
+END;
+
+CREATE TRIGGER hashmark_fts_au AFTER UPDATE ON hashmark BEGIN
+    INSERT INTO hashmark_fts(hashmark_fts, rowid, path, url, title,
+                             description, comment)
+    VALUES ('delete', old.id, old.path, old.url, old.title,
+            old.description, old.comment);
+    INSERT INTO hashmark_fts(rowid, path, url, title, description, comment)
+    VALUES (new.id, new.path, new.url, new.title, new.description,
+            new.comment);
+END;
+
+INSERT INTO hashmark_fts(hashmark_fts) VALUES ('rebuild');
+''',
+
+    # One row per visit (rowid is the visit's id)
+    'urlhistory_fts': '''
+CREATE VIRTUAL TABLE urlhistory_fts USING fts5(url, title, prefix='2 3');
+
+CREATE TRIGGER urlhistory_fts_ai AFTER INSERT ON urlhistoryvisit BEGIN
+    INSERT INTO urlhistory_fts(rowid, url, title)
+    SELECT new.id, url, new.title FROM urlhistoryitem
+    WHERE id = new.historyitem_id;
+END;
+
+CREATE TRIGGER urlhistory_fts_ad AFTER DELETE ON urlhistoryvisit BEGIN
+    DELETE FROM urlhistory_fts WHERE rowid = old.id;
+END;
+
+CREATE TRIGGER urlhistory_fts_au AFTER UPDATE OF title ON urlhistoryvisit
+BEGIN
+    UPDATE urlhistory_fts SET title = new.title WHERE rowid = new.id;
+END;
+
+INSERT INTO urlhistory_fts(rowid, url, title)
+SELECT v.id, i.url, v.title FROM urlhistoryvisit v
+JOIN urlhistoryitem i ON i.id = v.historyitem_id;
+'''
+}
+
+ftsTriggers = ['ai', 'ad', 'au']
+
+ftsEnabled = False
+
+
+def ftsAvailable():
+    return ftsEnabled
+
+
+def ftsQuery(text: str):
+    """
+    Convert a search string to an FTS5 query: all the words (as
+    prefixes) must match. Returns None if there's nothing to search.
+    """
+
+    # The unicode61 tokenizer only keeps letters and numbers
+    words = re.findall(r'[^\W_]+', text)
+
+    if words:
+        return ' '.join(f'"{word}"*' for word in words)
+
+
+def ftsConnection():
+    return Tortoise.get_connection('default')
+
+
+async def ftsSetup():
+    """
+    Create the FTS5 tables and their sync triggers, and backfill them
+    from the existing rows (once per FTS_VERSION)
+    """
+
+    global ftsEnabled
+
+    conn = ftsConnection()
+
+    try:
+        await conn.execute_script('''
+CREATE TABLE IF NOT EXISTS fts_schema (
+    name TEXT PRIMARY KEY, version INTEGER);
+''')
+
+        rows = await conn.execute_query_dict(
+            'SELECT name, version FROM fts_schema')
+        versions = {row['name']: row['version'] for row in rows}
+
+        for table, schema in ftsSchemas.items():
+            if versions.get(table) == FTS_VERSION:
+                continue
+
+            log.info(f'FTS: creating index {table}')
+
+            drop = ''.join(
+                f'DROP TRIGGER IF EXISTS {table}_{trigger};\n'
+                for trigger in ftsTriggers
+            )
+
+            await conn.execute_script(
+                f'BEGIN;\n{drop}DROP TABLE IF EXISTS {table};\n'
+                f'{schema}\n'
+                f"INSERT OR REPLACE INTO fts_schema VALUES "
+                f"('{table}', {FTS_VERSION});\n"
+                'COMMIT;'
+            )
+    except Exception:
+        # No FTS5 support in this sqlite build ?
+        log.warning(f'FTS: setup failed: {traceback.format_exc()}')
+        ftsEnabled = False
+    else:
+        ftsEnabled = True
+
+    return ftsEnabled
+
+
+async def hashmarksFtsSearch(query: str):
+    """
+    Search the hashmarks index, returns the ids of all the matching
+    hashmarks (best matches first)
+    """
+
+    return [row['id'] for row in await ftsConnection().execute_query_dict(
+        'SELECT rowid AS id FROM hashmark_fts WHERE hashmark_fts MATCH ? '
+        'ORDER BY rank', [query])]
+
+
+async def urlHistoryFtsSearch(query: str, limit: int = 256,
+                              ranked: bool = False):
+    """
+    Search the URL history index, returns the (distinct) title and URL
+    of the matching visits. Most recent visits first, or best matches
+    first (bm25) if ranked is True
+    """
+
+    order = 'rank' if ranked else 'rowid DESC'
+
+    rows = await ftsConnection().execute_query_dict(
+        'SELECT v.title AS title, i.url AS url FROM ('
+        '  SELECT rowid, rank FROM urlhistory_fts '
+        f'  WHERE urlhistory_fts MATCH ? ORDER BY {order} LIMIT ?) f '
+        'JOIN urlhistoryvisit v ON v.id = f.rowid '
+        'JOIN urlhistoryitem i ON i.id = v.historyitem_id '
+        f'ORDER BY f.{order}', [query, limit])
+
+    seen = set()
+    results = []
+
+    for row in rows:
+        key = (row['title'], row['url'])
+        if key not in seen:
+            seen.add(key)
+            results.append(row)
+
+    return results
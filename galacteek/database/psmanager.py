@@ -1,32 +1,236 @@
 import asyncio
+import attr
+import time
 
 from datetime import datetime
 from datetime import timedelta
 
+from tortoise.transactions import in_transaction
+
+from galacteek import log
 from galacteek.database.models.pubsub import *
 
 
+@attr.s(auto_attribs=True)
+class PSRecorderStats:
+    # Messages recorded (buffered)
+    recorded: int = 0
+
+    # Records written to the database
+    flushed: int = 0
+
+    # Number of bulk writes
+    flushes: int = 0
+
+    # Records saved individually because they were needed right away
+    forcedSaves: int = 0
+
+    # Number of times a producer had to wait for a flush (buffer full)
+    backpressureWaits: int = 0
+
+    # Records lost because of a database error
+    dropped: int = 0
+
+    lastFlushSize: int = 0
+    lastFlushDuration: float = 0
+    maxFlushDuration: float = 0
+
+
+class PSMessageRecorder:
+    """
+    Write-behind recorder for pubsub message metrics
+
+    Message records are buffered in memory and written with a single
+    bulk insert every flushInterval seconds, or as soon as batchSize
+    records are pending. Channel activity updates are coalesced (one
+    update per channel per flush). If maxPending records are waiting,
+    producers wait for the next flush (backpressure).
+    """
+
+    def __init__(self,
+                 flushInterval: float = 2.0,
+                 batchSize: int = 256,
+                 maxPending: int = 4096):
+        self.flushInterval = flushInterval
+        self.batchSize = batchSize
+        self.maxPending = maxPending
+        self.stats = PSRecorderStats()
+
+        self._pending = []
+        self._channelsActive = {}
+        self._flushLock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    @property
+    def pendingCount(self):
+        return len(self._pending)
+
+    def start(self):
+        if not self._task or self._task.done():
+            self._task = asyncio.ensure_future(self.flushTask())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+        await self.flush()
+
+    async def flushTask(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(),
+                                       self.flushInterval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wakeup.clear()
+
+            await self.flush()
+
+    async def record(self, channel, sender, size, **kw):
+        self.start()
+
+        if len(self._pending) >= self.maxPending:
+            self.stats.backpressureWaits += 1
+            await self.flush()
+
+        now = datetime.now()
+        kw.setdefault('dateRcv', now)
+
+        rec = PubSubMsgRecord(channel=channel, sizeRaw=size,
+                              senderPeerId=sender, **kw)
+
+        self._pending.append(rec)
+        self._channelsActive[channel.id] = (channel, now)
+        self.stats.recorded += 1
+
+        if len(self._pending) >= self.batchSize:
+            self._wakeup.set()
+
+        return rec
+
+    async def ensureSaved(self, rec):
+        """
+        Make sure that a (possibly still buffered) record is stored
+        in the database (needed when other records reference it)
+
+        Returns the stored record, or None if the record was written by
+        a bulk insert but can't be found (it's never inserted twice)
+        """
+
+        async with self._flushLock:
+            if rec._saved_in_db:
+                return rec
+
+            if getattr(rec, '_psFlushed', False):
+                # Written by a bulk insert, which doesn't give us the pk
+                saved = await PubSubMsgRecord.filter(
+                    channel_id=rec.channel_id,
+                    senderPeerId=rec.senderPeerId,
+                    seqNo=rec.seqNo,
+                    dateRcv=rec.dateRcv
+                ).first()
+
+                if not saved:
+                    log.debug(f'PS recorder: flushed record for '
+                              f'{rec.senderPeerId} not found')
+
+                return saved
+
+            try:
+                self._pending.remove(rec)
+            except ValueError:
+                pass
+
+            await rec.save()
+            self.stats.forcedSaves += 1
+            return rec
+
+    async def flush(self):
+        async with self._flushLock:
+            batch, self._pending = self._pending, []
+            channels, self._channelsActive = self._channelsActive, {}
+
+            if not batch and not channels:
+                return
+
+            tStart = time.monotonic()
+
+            try:
+                async with in_transaction() as conn:
+                    if batch:
+                        await PubSubMsgRecord.bulk_create(
+                            batch, using_db=conn)
+
+                    for channel, date in channels.values():
+                        channel.dateActiveLast = date
+                        await channel.save(update_fields=['dateActiveLast'],
+                                           using_db=conn)
+            except asyncio.CancelledError:
+                # Put the batch back, it'll be written by the next flush
+                self._pending = batch + self._pending
+                channels.update(self._channelsActive)
+                self._channelsActive = channels
+                raise
+            except Exception as err:
+                log.debug(f'PS recorder: flush error: {err}')
+                self.stats.dropped += len(batch)
+                return
+
+            for rec in batch:
+                rec._psFlushed = True
+
+            duration = time.monotonic() - tStart
+
+            self.stats.flushes += 1
+            self.stats.flushed += len(batch)
+            self.stats.lastFlushSize = len(batch)
+            self.stats.lastFlushDuration = duration
+            self.stats.maxFlushDuration = max(duration,
+                                              self.stats.maxFlushDuration)
+
+
+psRecorder = None
+
+
+def psMessageRecorder() -> PSMessageRecorder:
+    global psRecorder
+
+    if not psRecorder:
+        psRecorder = PSMessageRecorder()
+
+    return psRecorder
+
+
+async def psRecorderShutdown():
+    if psRecorder:
+        await psRecorder.stop()
+
+
 class PSTopicManager:
-    def __init__(self, channel):
+    def __init__(self, channel, recorder: PSMessageRecorder = None):
         self.channel = channel
+        self.recorder = recorder if recorder else psMessageRecorder()
 
     async def active(self):
         self.channel.dateActiveLast = datetime.now()
         await self.channel.save()
 
     async def recordMessage(self, sender, size, **kw):
-        rec = PubSubMsgRecord(channel=self.channel, sizeRaw=size,
-                              senderPeerId=sender, **kw)
         try:
-            await rec.save()
-
-            await self.active()
-            return rec
+            return await self.recorder.record(
+                self.channel, sender, size, **kw)
         except asyncio.CancelledError:
             pass
 
     async def recordMsgAttribute(self, msgrecord, msgType, attrName, value):
         try:
+            msgrecord = await self.recorder.ensureSaved(msgrecord)
+            if not msgrecord:
+                return None
+
             rec = PubSubMsgAttrRecord(msgrecord=msgrecord, attrName=attrName,
                                       msgType=msgType,
                                       attrStrValue=str(value))
@@ -109,6 +109,11 @@ class IPIdentifier(DAGOperations):
     def local(self):
         return self._localId is True
 
+    @property
+    def cacheKey(self):
+        # Key in the (shared) JSON-LD expanded cache
+        return self._did
+
     @property
     def unlocked(self):
         return self._unlocked
@@ -218,11 +223,10 @@ class IPIdentifier(DAGOperations):
         print(json.dumps(self.doc, indent=4))
 
     async def onDidChanged(self, cid):
-        cacheKey = repr(self)
-        if cacheKey in self.cache:
+        if self.cacheKey in self.cache:
             # Reset expanded cache
             self.message('LRU cache reset')
-            del self.cache[cacheKey]
+            del self.cache[self.cacheKey]
 
     @ipfsOp
     async def rdfGraph(self, ipfsop):
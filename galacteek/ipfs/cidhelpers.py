@@ -20,6 +20,7 @@ from galacteek.ipfs.cid import make_cid
 from galacteek.ipfs.cid import BaseCID
 from galacteek.ipfs.stat import StatInfo
 
+import attr
 import multihash
 import functools
 
@@ -275,14 +276,14 @@ def cidValid(cid):
         return False
 
     if isinstance(cid, str):
-        c = getCID(cid)
+        return cidDecode(cid) is not None
     elif issubclass(cid.__class__, BaseCID):
-        c = cid
-    else:
-        return False
+        return cidObjValid(cid)
 
-    if c is None:
-        return False
+    return False
+
+
+def cidObjValid(c: BaseCID):
     if c.version in [0, 1]:
         # Ensure that we can decode the multihash
         try:  # can raise ValueError
@@ -293,6 +294,20 @@ def cidValid(cid):
     return False
 
 
+@functools.lru_cache(maxsize=8192)
+def cidDecode(cidStr: str):
+    """
+    Decode and validate a CID string in a single pass
+
+    :param str cidStr: the CID string
+    :return: the (shared, don't modify it) CID if valid, None otherwise
+    """
+
+    c = getCID(cidStr)
+    if c is not None and cidObjValid(c):
+        return c
+
+
 domainReStr = r'([A-Za-z0-9]\.|[A-Za-z0-9][A-Za-z0-9-]{0,61}[A-Za-z0-9]\.){1,3}[A-Za-z]{2,6}'  # noqa
 
 domainRe = re.compile(rf'^{domainReStr}$')
@@ -379,26 +394,215 @@ ipnsPathMagicRe = re.compile(ipfsMdMagic + ipnsPathRe.pattern,
                              flags=re.UNICODE)
 
 
+@attr.s(frozen=True, slots=True)
+class IPFSPathInfo:
+    """
+    Result of the analysis of an IPFS path string (immutable, shared by
+    all the IPFSPath instances created from the same input)
+    """
+
+    input = attr.ib(default=None)
+    valid: bool = attr.ib(default=False)
+    scheme: str = attr.ib(default=None)
+    rootCid: BaseCID = attr.ib(default=None)
+    rootCidV: int = attr.ib(default=None)
+    rootCidUseB32: bool = attr.ib(default=False)
+    rootCidRepr: str = attr.ib(default=None)
+    rscPath: str = attr.ib(default=None)
+    subPath: str = attr.ib(default=None)
+    fragment: str = attr.ib(default=None)
+    query: str = attr.ib(default=None)
+    ipnsId: str = attr.ib(default=None)
+
+
+def pathjoin(path1, path2):
+    return posixIpfsPath.join(path1, path2.lstrip('/'))
+
+
+def parseRootCid(cidStr, autoCidConv=False, enableBase32=True):
+    """
+    Decode the root CID of a path
+
+    :return: a (cid, version, useBase32, repr) tuple, or None if invalid
+    """
+
+    cid = cidDecode(cidStr)
+    if not cid:
+        return None
+
+    version = cid.version if cid.version in range(0, 2) else None
+
+    if autoCidConv and cid.version == 0:
+        # Automatic V0-to-V1 conversion
+        cid = cidUpgrade(cid)
+
+    # Use base32 for CIDv1
+    useB32 = cid.version == 1 and enableBase32
+
+    return (
+        cid,
+        version,
+        useB32,
+        cid.encode('base32').decode() if useB32 else str(cid)
+    )
+
+
+def ipfsRootInfo(text, cidStr, autoCidConv, enableBase32, subpath, **kw):
+    root = parseRootCid(cidStr, autoCidConv, enableBase32)
+    if not root:
+        return IPFSPathInfo(input=text)
+
+    cid, version, useB32, cidRepr = root
+
+    return IPFSPathInfo(
+        input=text,
+        valid=True,
+        scheme='ipfs',
+        rootCid=cid,
+        rootCidV=version,
+        rootCidUseB32=useB32,
+        rootCidRepr=cidRepr,
+        rscPath=pathjoin(joinIpfs(cidRepr), subpath) if subpath else
+        joinIpfs(cidRepr),
+        subPath=subpath,
+        **kw
+    )
+
+
+@functools.lru_cache(maxsize=8192)
+def ipfsPathParse(input: str,
+                  autoCidConv: bool = False,
+                  enableBase32: bool = True) -> IPFSPathInfo:
+    """
+    Analyze an IPFS path string (the results are cached, keyed by the
+    raw input)
+
+    :rtype: IPFSPathInfo
+    """
+
+    text = input.strip()
+
+    if len(text) > IPFSPath.maxLength:
+        return IPFSPathInfo(input=text)
+
+    ma = ipfsRegSearchSubDomain(text)
+    if ma:
+        gdict = ma.groupdict()
+        rCid = gdict.get('rootcid')
+        subpath = gdict.get('subpath')
+        scheme = gdict.get('gwscheme')
+
+        if scheme == 'ipfs':
+            info = ipfsRootInfo(text, rCid, autoCidConv, enableBase32,
+                                subpath)
+            if not info.valid:
+                return info
+
+            return attr.evolve(
+                info,
+                subPath=subpath if subpath else '/',
+                query=gdict.get('query'),
+                fragment=gdict.get('fragment')
+            )
+
+        return IPFSPathInfo(
+            input=text,
+            valid=True,
+            scheme=scheme,
+            rscPath=pathjoin(joinIpns(rCid), subpath) if subpath else
+            joinIpns(rCid),
+            ipnsId=rCid,
+            subPath=subpath if subpath else '/',
+            query=gdict.get('query'),
+            fragment=gdict.get('fragment')
+        )
+
+    for search in [ipfsDedSearchPath, ipfsRegSearchPath]:
+        ma = search(text)
+        if ma:
+            gdict = ma.groupdict()
+            if 'rootcid' not in gdict or 'fullpath' not in gdict:
+                return IPFSPathInfo(input=text)
+
+            return ipfsRootInfo(
+                text, ma.group('rootcid'), autoCidConv, enableBase32,
+                gdict.get('subpath'),
+                query=gdict.get('query'),
+                fragment=gdict.get('fragment')
+            )
+
+    ma = ipnsRegSearchPath(text)
+    if ma:
+        gdict = ma.groupdict()
+
+        subpath = gdict.get('subpath')
+        ipnsIdV1 = ipnsKeyCidV1(gdict.get('fqdn'))
+        _id = ipnsIdV1 if ipnsIdV1 else gdict.get('fqdn')
+
+        return IPFSPathInfo(
+            input=text,
+            valid=True,
+            scheme='ipns',
+            rscPath=pathjoin(joinIpns(_id), subpath) if subpath else
+            joinIpns(_id),
+            ipnsId=_id,
+            subPath=subpath,
+            query=gdict.get('query'),
+            fragment=gdict.get('fragment')
+        )
+
+    ma = ipfsRegSearchCid(text)
+    if ma:
+        return ipfsRootInfo(text, ma.group('cid'), autoCidConv,
+                            enableBase32, None)
+
+    return IPFSPathInfo(input=text)
+
+
+def parseCacheStats():
+    """
+    Hit/miss counters of the CID and path parsing caches
+    """
+
+    return {
+        'cid': cidDecode.cache_info()._asdict(),
+        'path': ipfsPathParse.cache_info()._asdict()
+    }
+
+
+def parseCacheClear():
+    cidDecode.cache_clear()
+    ipfsPathParse.cache_clear()
+
+
 class IPFSPath:
     maxLength = 1024
 
     def __init__(self, input, autoCidConv=False, enableBase32=True):
-        self._valid = False
         self._enableBase32 = enableBase32
         self._autoCidConv = autoCidConv
-        self._rootCid = None
-        self._rootCidV = None
-        self._rootCidUseB32 = False
-        self._input = input
-        self._rscPath = None
-        self._subPath = None
-        self._fragment = None
-        self._scheme = None
         self._resolvedCid = None
-        self._ipnsId = None
-        self._query = None
 
-        self._valid = self.__analyze()
+        if isinstance(input, str):
+            info = ipfsPathParse(input, autoCidConv, enableBase32)
+        else:
+            info = IPFSPathInfo(input=input)
+
+        self._valid = info.valid
+        self._input = info.input
+        self._rootCid = info.rootCid
+        self._rootCidV = info.rootCidV
+        self._rootCidUseB32 = info.rootCidUseB32
+        self._rootCidRepr = info.rootCidRepr
+        self._rscPath = info.rscPath
+        self._subPath = info.subPath
+        self._fragment = info.fragment
+        self._scheme = info.scheme
+        self._ipnsId = info.ipnsId
+        self._query = info.query
+
+        if self._valid:
+            self.hubNotify()
 
     @property
     def autoCidConv(self):
@@ -448,11 +652,11 @@ class IPFSPath:
 
     @property
     def rootCidRepr(self):
-        if self.rootCidUseB32:
-            return self._rootCid.encode('base32').decode()
-        else:
+        if self._rootCidRepr is None:
             return str(self._rootCid)
 
+        return self._rootCidRepr
+
     @property
     def rootCidUseB32(self):
         return self._rootCidUseB32
@@ -660,160 +864,6 @@ class IPFSPath:
         ref = uri if isinstance(uri, URIRef) else URIRef(uri)
         return IPFSPath(unquote(str(ref)))
 
-    def __analyze(self):
-        """
-        Analyze the path and returns a boolean (valid or not)
-
-        :rtype bool
-        """
-
-        if not isinstance(self.input, str):
-            return False
-
-        self._input = self._input.strip()
-
-        if len(self.input) > self.maxLength:
-            return False
-
-        ma = ipfsRegSearchSubDomain(self.input)
-        if ma:
-            gdict = ma.groupdict()
-            rCid = gdict.get('rootcid')
-            subpath = gdict.get('subpath')
-            scheme = gdict.get('gwscheme')
-
-            if scheme == 'ipfs':
-                if not self.parseCid(rCid):
-                    return False
-
-                if subpath:
-                    self._rscPath = self.pathjoin(
-                        joinIpfs(self.rootCidRepr),
-                        subpath
-                    )
-                else:
-                    self._rscPath = joinIpfs(self.rootCidRepr)
-            elif scheme == 'ipns':
-                if subpath:
-                    self._rscPath = self.pathjoin(
-                        joinIpns(rCid),
-                        subpath
-                    )
-                else:
-                    self._rscPath = joinIpns(rCid)
-
-                self._ipnsId = rCid
-
-            self._subPath = subpath if subpath else '/'
-            self._scheme = scheme
-            self._query = gdict.get('query')
-            self._fragment = gdict.get('fragment')
-
-            self.hubNotify()
-
-            return True
-
-        ma = ipfsDedSearchPath(self.input)
-        if ma:
-            gdict = ma.groupdict()
-            if 'rootcid' not in gdict or 'fullpath' not in gdict:
-                return False
-
-            cid = ma.group('rootcid')
-
-            if not self.parseCid(cid):
-                return False
-
-            subpath = gdict.get('subpath')
-
-            if subpath:
-                self._rscPath = self.pathjoin(
-                    joinIpfs(self.rootCidRepr),
-                    subpath
-                )
-            else:
-                self._rscPath = joinIpfs(self.rootCidRepr)
-
-            self._query = gdict.get('query')
-            self._fragment = gdict.get('fragment')
-            self._subPath = subpath
-            self._scheme = 'ipfs'
-
-            self.hubNotify()
-
-            return True
-
-        ma = ipfsRegSearchPath(self.input)
-        if ma:
-            gdict = ma.groupdict()
-            if 'rootcid' not in gdict or 'fullpath' not in gdict:
-                return False
-
-            cid = ma.group('rootcid')
-
-            if not self.parseCid(cid):
-                return False
-
-            subpath = gdict.get('subpath')
-            if subpath:
-                self._rscPath = self.pathjoin(
-                    joinIpfs(self.rootCidRepr),
-                    subpath
-                )
-            else:
-                self._rscPath = joinIpfs(self.rootCidRepr)
-
-            self._query = gdict.get('query')
-            self._fragment = gdict.get('fragment')
-            self._subPath = gdict.get('subpath')
-            self._scheme = 'ipfs'
-
-            self.hubNotify()
-
-            return True
-
-        ma = ipnsRegSearchPath(self.input)
-        if ma:
-            gdict = ma.groupdict()
-
-            subpath = gdict.get('subpath')
-            ipnsIdV1 = ipnsKeyCidV1(gdict.get('fqdn'))
-            _id = ipnsIdV1 if ipnsIdV1 else gdict.get('fqdn')
-
-            if subpath:
-                self._rscPath = self.pathjoin(
-                    joinIpns(_id),
-                    subpath
-                )
-            else:
-                self._rscPath = joinIpns(_id)
-
-            self._ipnsId = _id
-            self._query = gdict.get('query')
-            self._fragment = gdict.get('fragment')
-            self._subPath = gdict.get('subpath')
-            self._scheme = 'ipns'
-
-            self.hubNotify()
-
-            return True
-
-        ma = ipfsRegSearchCid(self.input)
-        if ma:
-            cidStr = ma.group('cid')
-
-            if not self.parseCid(cidStr):
-                return False
-
-            self._rscPath = joinIpfs(self.rootCidRepr)
-            self._scheme = 'ipfs'
-
-            self.hubNotify()
-
-            return True
-
-        return False
-
     def hubNotify(self):
         pass
 
@@ -829,27 +879,15 @@ class IPFSPath:
         )
 
     def pathjoin(self, path1, path2):
-        return posixIpfsPath.join(path1, path2.lstrip('/'))
+        return pathjoin(path1, path2)
 
     def parseCid(self, cidStr):
-        if not cidValid(cidStr):
-            return False
-
-        self._rootCid = getCID(cidStr)
-        if self.rootCid:
-            self._rootCidV = self.rootCid.version if \
-                self.rootCid.version in range(0, 2) else None
-        else:
+        root = parseRootCid(cidStr, self._autoCidConv, self._enableBase32)
+        if not root:
             return False
 
-        if self._autoCidConv and self.rootCid.version == 0:
-            # Automatic V0-to-V1 conversion
-            self._rootCid = cidUpgrade(self._rootCid)
-
-        if self.rootCid.version == 1 and self._enableBase32:
-            # rootCidRepr will convert it to base32
-            self._rootCidUseB32 = True
-
+        (self._rootCid, self._rootCidV, self._rootCidUseB32,
+         self._rootCidRepr) = root
         return True
 
     def ipnsIdCompare(self, p):
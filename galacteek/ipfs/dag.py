@@ -1,5 +1,7 @@
 import asyncio
 import aiorwlock
+import hashlib
+import orjson
 
 from cachetools import TTLCache
 from typing import Union
@@ -9,7 +11,6 @@ from async_generator import async_generator, yield_, yield_from_
 from PyQt5.QtCore import (pyqtSignal, QObject)
 
 from galacteek import log
-from galacteek import partialEnsure
 from galacteek import AsyncSignal
 
 from galacteek.core.asynccache import selfcachedcoromethod
@@ -338,6 +339,20 @@ class EvolvingDAG(QObject, DAGOperations):
         describing this DAG
     """
 
+    # Incremental persistence: dict subtrees whose encoded size is at
+    # least blockMinSize bytes are stored as separate IPLD blocks, linked
+    # by CID from their parent (the keys of the linked subtrees are
+    # listed in the parent, under blocksKey). Only the blocks that
+    # changed since the last save are stored again. The DAG is modified
+    # in place by its users, so there's no dirty tracking: every save
+    # encodes the whole tree to find the blocks that changed
+    incremental = False
+    blockMinSize = 1024
+    blocksKey = '_dagblocks'
+
+    # Changes made within this delay (in seconds) are saved together
+    saveDebounce = 0
+
     # TODO: use AsyncSignal() for all the EDAG core signals
 
     # Emitted by the async context manager
@@ -375,10 +390,16 @@ class EvolvingDAG(QObject, DAGOperations):
         self._autoUpdateDates = autoUpdateDates
         self._cipheredMeta = cipheredMeta
 
+        # Digest -> CID of the blocks in the last saved DAG
+        self._blocks = {}
+
+        self._saveTask = None
+        self._savePending = False
+
         self.dagUpdated = AsyncSignal(str)
         self.available = AsyncSignal(object)
 
-        self.changed.connect(partialEnsure(self.ipfsSave))
+        self.changed.connect(self.saveSchedule)
 
     @property
     def wLock(self):
@@ -392,6 +413,14 @@ class EvolvingDAG(QObject, DAGOperations):
     def dagMetaMfsPath(self):
         return self._dagMetaMfsPath  # path inside the mfs
 
+    @property
+    def dagMetaNewPath(self):
+        return self._dagMetaMfsPath + '.new'
+
+    @property
+    def dagMetaOldPath(self):
+        return self._dagMetaMfsPath + '.old'
+
     @property
     def dagMetaMaxHistoryItems(self):
         return self._dagMetaMaxHistoryItems
@@ -440,15 +469,120 @@ class EvolvingDAG(QObject, DAGOperations):
     async def load(self):
         await self.loadDag()
 
+    async def metaRead(self, op, path):
+        if self._cipheredMeta:
+            return await op.rsaAgent.decryptMfsJson(path)
+        else:
+            return await op.filesReadJsonObject(path)
+
+    async def metaWrite(self, op, path, meta):
+        if self._cipheredMeta:
+            return await op.rsaAgent.encryptJsonToMfs(meta, path)
+        else:
+            return await op.filesWriteJsonObject(path, meta)
+
+    def blockDigest(self, data: bytes) -> str:
+        return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+    async def blocksEncode(self, op, node, blocks: dict, split=False):
+        """
+        Encode a node of the DAG for storage, storing the large dict
+        subtrees as separate blocks. Returns an (encoded node, CID)
+        tuple, the CID is set if the node itself was stored as a block.
+
+        :param dict blocks: digest -> CID of the blocks of the new DAG
+        """
+
+        if isinstance(node, dict):
+            enc, linked = {}, []
+
+            for key, value in node.items():
+                enc[key], cid = await self.blocksEncode(
+                    op, value, blocks, split=True)
+
+                if cid:
+                    linked.append(key)
+
+            if linked:
+                enc[self.blocksKey] = linked
+
+            if not split:
+                return enc, None
+
+            data = orjson.dumps(enc, option=orjson.OPT_SORT_KEYS)
+
+            if len(data) < self.blockMinSize:
+                return enc, None
+
+            digest = self.blockDigest(data)
+            cid = self._blocks.get(digest)
+
+            if not cid:
+                # New or changed subtree. The root is pinned recursively
+                cid = await op.dagPut(enc, pin=False, offline=self._offline)
+
+                if not cid:
+                    raise DAGError('Could not store DAG block')
+
+            blocks[digest] = cid
+            return self.mkLink(cid), cid
+        elif isinstance(node, list):
+            return [(await self.blocksEncode(op, item, blocks))[0]
+                    for item in node], None
+
+        return node, None
+
+    async def blocksInflate(self, op, node):
+        """
+        Rebuild the full DAG from a stored node, loading the blocks
+        linked from it
+        """
+
+        if isinstance(node, dict):
+            linked = node.pop(self.blocksKey, [])
+
+            for key in list(node.keys()):
+                value = node[key]
+
+                if key in linked and isinstance(value, dict) and \
+                        '/' in value:
+                    block = await op.dagGet(value['/'])
+
+                    if block is None:
+                        raise DAGError(f'Could not load block {value}')
+
+                    self._blocks[self.blockDigest(orjson.dumps(
+                        block, option=orjson.OPT_SORT_KEYS))] = value['/']
+
+                    value = block
+
+                node[key] = await self.blocksInflate(op, value)
+        elif isinstance(node, list):
+            for idx, item in enumerate(node):
+                node[idx] = await self.blocksInflate(op, item)
+
+        return node
+
     @ipfsOp
     async def loadDag(self, op):
         self.debug('Loading DAG metadata file')
 
-        if self._cipheredMeta:
-            meta = await op.rsaAgent.decryptMfsJson(self.dagMetaMfsPath)
-        else:
-            meta = await op.filesReadJsonObject(self.dagMetaMfsPath)
-            # self.debug('Metadata is {}'.format(meta))
+        meta = await self.metaRead(op, self.dagMetaMfsPath)
+
+        if meta is None:
+            # Interrupted while swapping the metadata files ?
+            meta = await self.metaRead(op, self.dagMetaNewPath)
+
+            if meta is not None:
+                self.debug('Recovered metadata from the new file')
+                await op.filesMv(self.dagMetaNewPath, self.dagMetaMfsPath)
+
+        if meta is None:
+            meta = await self.metaRead(op, self.dagMetaOldPath)
+
+            if meta is not None:
+                self.debug('Recovered metadata from the old file')
+                await op.filesMv(self.dagMetaOldPath, self.dagMetaMfsPath)
 
         if meta is not None:
             self._dagMeta = meta
@@ -456,7 +590,8 @@ class EvolvingDAG(QObject, DAGOperations):
             if latest:
                 self.dagCid = latest
                 self.debug('Getting DAG: {cid}'.format(cid=self.dagCid))
-                self._dagRoot = await op.dagGet(self.dagCid)
+                self._dagRoot = await self.blocksInflate(
+                    op, await op.dagGet(self.dagCid))
 
                 if self.dagRoot:
                     if self.updateDagSchema(self.dagRoot) is True:
@@ -483,6 +618,30 @@ class EvolvingDAG(QObject, DAGOperations):
         self.parser = traverseParser(self.dagRoot)
         await self.available.emit(self.dagRoot)
 
+    def saveSchedule(self):
+        """
+        Schedule a save of the DAG. The changes made within saveDebounce
+        seconds, or while a save is running, are saved together.
+        """
+
+        self._savePending = True
+
+        if self._saveTask is None:
+            self._saveTask = asyncio.ensure_future(self._saveLater())
+
+    async def _saveLater(self):
+        try:
+            while self._savePending:
+                if self.saveDebounce > 0:
+                    await asyncio.sleep(self.saveDebounce)
+
+                self._savePending = False
+                await self.ipfsSave()
+        except Exception as err:
+            self.debug(f'Save error: {err}')
+        finally:
+            self._saveTask = None
+
     @ipfsOp
     async def ipfsSave(self, op, emitDataChanged=True):
         self.debug('Saving (acquiring lock)')
@@ -504,7 +663,20 @@ class EvolvingDAG(QObject, DAGOperations):
             # We always PIN the latest DAG and do a pin update using the
             # previous item in the history
 
-            cid = await op.dagPut(self.dagRoot, pin=True,
+            blocks = {}
+            historyPrev = list(history)
+
+            try:
+                if self.incremental:
+                    root, _c = await self.blocksEncode(
+                        op, self.dagRoot, blocks)
+                else:
+                    root = self.dagRoot
+            except DAGError as err:
+                self.debug(f'DAG could not be built: {err}')
+                return False
+
+            cid = await op.dagPut(root, pin=True,
                                   offline=self._offline)
             if cid is not None:
                 if prevCid is not None and prevCid not in history:
@@ -522,7 +694,12 @@ class EvolvingDAG(QObject, DAGOperations):
                             prevCid, cid, unpin=self._unpinOnUpdate)
 
                 # Save the new CID and update the metadata
-                await self.saveNewCid(cid)
+                if not await self.saveNewCid(cid):
+                    history[:] = historyPrev
+                    return False
+
+                if self.incremental:
+                    self._blocks = blocks
             else:
                 # Bummer
                 self.debug('DAG could not be built')
@@ -536,23 +713,39 @@ class EvolvingDAG(QObject, DAGOperations):
 
     @ipfsOp
     async def saveNewCid(self, ipfsop, cid):
-        # Save the new CID and update the metadata
-        self.dagCid = cid
+        # Save the new CID and update the metadata. The metadata is
+        # written to a new file which then replaces the current one (put
+        # aside as the old file), so that there's always a metadata file
+        # referencing a complete DAG (see loadDag()).
+        # Returns False if the metadata could not be replaced
 
-        if self._cipheredMeta:
-            await ipfsop.rsaAgent.encryptJsonToMfs(
-                self.dagMeta,
-                self.dagMetaMfsPath
-            )
+        meta = dict(self.dagMeta)
+        meta[self.keyCidLatest] = cid
+
+        await self.metaWrite(ipfsop, self.dagMetaNewPath, meta)
+        await ipfsop.filesRm(self.dagMetaOldPath)
+
+        moved = await ipfsop.filesMv(self.dagMetaMfsPath,
+                                     self.dagMetaOldPath)
+
+        if not await ipfsop.filesMv(self.dagMetaNewPath,
+                                    self.dagMetaMfsPath):
+            self.debug('Could not replace the metadata file')
+
+            if moved:
+                await ipfsop.filesMv(self.dagMetaOldPath,
+                                     self.dagMetaMfsPath)
+
+            return False
+
+        self.dagCid = cid
 
-        else:
-            await ipfsop.filesWriteJsonObject(self.dagMetaMfsPath,
-                                              self.dagMeta)
         entry = await ipfsop.filesStat(self.dagMetaMfsPath)
         if entry:
             self.curMetaEntry = entry
 
         await self.dagUpdated.emit(cid)
+        return True
 
     @ipfsOp
     async def rewind(self, ipfsop):
@@ -583,14 +776,20 @@ class EvolvingDAG(QObject, DAGOperations):
                     raise DAGRewindException(
                         'Previous object unavailable')
 
-                # Pop it now and set the latest CID
+                try:
+                    root = await self.blocksInflate(ipfsop, pDag)
+                except DAGError as err:
+                    raise DAGRewindException(str(err))
+
+                # Pop it now and save the metadata (this sets the
+                # latest CID), replacing dagRoot. Do the pin update
                 history.pop(0)
-                self.dagMeta[self.keyCidLatest] = newCid
 
-                # Save metadata, and save this DAG, replacing dagRoot
-                # Do the pin update
-                self._dagRoot = pDag
-                await self.saveNewCid(newCid)
+                if not await self.saveNewCid(newCid):
+                    history.insert(0, newCid)
+                    raise DAGRewindException('Could not save the metadata')
+
+                self._dagRoot = root
 
                 await ipfsop.waitFor(
                     ipfsop.pinUpdate(prevCid, newCid,
@@ -5,11 +5,13 @@ import os
 import orjson
 import hashlib
 import uuid
+import functools
 import aiofiles
 import asyncio
 import aiohttp
 import re
 import multiaddr
+import collections
 
 from concurrent.futures import TimeoutError
 
@@ -35,6 +37,7 @@ from galacteek.ipfs.stat import StatInfo
 from galacteek.ipfs.stat import UnixFsStatInfo
 
 from galacteek.config import cGet
+from galacteek.config import configHandle
 
 from galacteek.core.asynccache import amlrucache
 from galacteek.core.asynccache import cachedcoromethod
@@ -61,6 +64,8 @@ from .ldops import LinkedDataOps
 
 GFILES_ROOT_PATH = '/galacteek/'
 
+opsConfig = configHandle()
+
 
 def isDict(data):
     return isinstance(data, dict)
@@ -360,7 +365,7 @@ class IPFSOperator(RemotePinningOps,
         return cGet('nsCache')
 
     def opConfig(self, opName):
-        return cGet(f'ops.{opName}')
+        return opsConfig.get(f'ops.{opName}')
 
     def debug(self, msg):
         log.debug('IPFSOp({0}): {1}'.format(self.uid, msg))
@@ -845,7 +850,14 @@ class IPFSOperator(RemotePinningOps,
 
                 rPath = self.nsCache.nsCacheGet(
                     path, maxLifetime=maxCacheLifetime,
-                    knownOrigin=True)
+                    knownOrigin=True,
+                    revalidate=functools.partial(
+                        self.nameResolve, path,
+                        timeout=timeout,
+                        recursive=recursive,
+                        cache='always',
+                        cacheOrigin=cacheOrigin
+                    ))
 
                 if rPath and IPFSPath(rPath).valid:
                     self.debug(
@@ -1587,7 +1599,7 @@ class IPFSOperator(RemotePinningOps,
         elif isinstance(cid, dict) and 'Hash' in cid:
             return {"/": cid['Hash']}
 
-    @cachedcoromethod(sResolveCache)
+    @cachedcoromethod(sResolveCache, negativeTtl=5)
     async def objectPathMapCacheResolve(self, path):
         """
         Simple async TTL cache for results from nameResolveStreamFirst()
@@ -1634,40 +1646,91 @@ class IPFSOperator(RemotePinningOps,
     async def catChunked(self, path: str,
                          chunkSize: int = 65535,
                          chunkTimeout: int = 30,
-                         incrementFactor=0):
+                         incrementFactor=0,
+                         window: int = None,
+                         adaptive: bool = None,
+                         offset: int = 0):
         """
         async generator that reads an IPFS file by chunks
 
         For each chunk read it yields a tuple (chunk_number, chunk_bytes)
 
+        Up to **window** ranged cat requests are kept in flight, chunks
+        are always yielded in order. When **adaptive** is set, the size
+        of the chunks requested next is adjusted from the measured
+        round-trip time of each request (between chunkSize and
+        the chunkSizeMax setting).
+
         :param str path: IPFS path of the object to read
         :param int chunkTimeout: timeout to read a chunk
         :param int chunkSize: chunk size in bytes
+        :param int window: number of concurrent ranged requests
+        :param bool adaptive: adapt the chunk size to the RTT
+        :param int offset: offset (in bytes) to start reading from
         """
 
-        offset, cnum = 0, 0
+        cfg = self.opConfig('catChunked')
+
+        window = max(1, window if window else cfg.window)
+        adaptive = adaptive if adaptive is not None else \
+            cfg.adaptiveChunkSize
+        sizeMin = chunkSize
+        sizeMax = max(chunkSize, cfg.chunkSizeMax)
+        targetTime = cfg.chunkTargetTime
+
+        cnum, reqOffset = 0, offset
+        eof = False
+        pending = collections.deque()
 
         async def getChunk(offset, length):
-            return await asyncio.wait_for(
+            started = loopTime()
+
+            data = await asyncio.wait_for(
                 self.client.cat(
                     path,
                     offset=offset, length=length
                 ),
                 chunkTimeout
             )
+            return data, loopTime() - started
 
-        try:
-            buff = await getChunk(offset, chunkSize)
-            assert buff is not None
+        def schedule():
+            nonlocal reqOffset
 
-            while buff:
-                yield cnum, buff
+            while not eof and len(pending) < window:
+                pending.append((
+                    reqOffset,
+                    chunkSize,
+                    asyncio.ensure_future(getChunk(reqOffset, chunkSize))
+                ))
+                reqOffset += chunkSize
 
-                offset += chunkSize
-                buff = await getChunk(offset, chunkSize)
+        try:
+            schedule()
 
+            while pending:
+                offset, length, fut = pending.popleft()
+
+                buff, rtt = await fut
                 assert buff is not None
 
+                if not buff:
+                    break
+
+                if len(buff) < length:
+                    # Short read: this is the end of the file
+                    eof = True
+
+                if adaptive and not eof:
+                    if rtt < targetTime / 2:
+                        chunkSize = min(chunkSize * 2, sizeMax)
+                    elif rtt > targetTime * 2:
+                        chunkSize = max(int(chunkSize / 2), sizeMin)
+
+                schedule()
+
+                yield cnum, buff
+
                 cnum += 1
 
                 await self.sleep(0)
@@ -1678,6 +1741,9 @@ class IPFSOperator(RemotePinningOps,
         except Exception as err:
             self.debug(f'catChunked({path}): error at offset {offset}: {err}')
             raise err
+        finally:
+            for _o, _l, fut in pending:
+                fut.cancel()
 
     async def catChunkedToTmpFile(self,
                                   path: str,
@@ -1685,7 +1751,7 @@ class IPFSOperator(RemotePinningOps,
         h = hashlib.sha512()
         try:
             with TmpFile(mode='wb', delete=False) as file:
-                async for cno, data in self.catChunked(path):
+                async for cno, data in self.catChunked(path, **kw):
                     file.write(data)
                     h.update(data)
 
@@ -1,6 +1,9 @@
+import asyncio
+import functools
 import os.path
 import orjson
 import aioipfs
+import pkg_resources
 import yaml
 import traceback
 from yaml import Loader
@@ -8,6 +11,7 @@ from yaml import Loader
 import rdflib_jsonld  # noqa
 
 from galacteek import log
+from galacteek.__version__ import __version__
 
 from galacteek.core import runningApp
 from galacteek.core.asynclib import async_enterable
@@ -15,6 +19,7 @@ from galacteek.core.asynclib import asyncReadFile
 from galacteek.ipfs.cidhelpers import IPFSPath
 from galacteek.ipfs.cidhelpers import cidValid
 from galacteek.ld.ldloader import aioipfs_document_loader
+from galacteek.ld import jsonldrdf
 
 from galacteek.ld import asyncjsonld as jsonld
 from galacteek.ld import ldContextsRootPath
@@ -23,6 +28,23 @@ from galacteek.ld import gLdBaseUri
 from galacteek.ld import gLdDefaultContext
 
 
+@functools.lru_cache(maxsize=1)
+def rdfCacheVersion():
+    """
+    Version key of the rdfify cache. The conversions depend on the
+    converter, and on the JSON-LD contexts (shipped with galacteek
+    and the LD schemas package)
+    """
+
+    try:
+        ldVersion = pkg_resources.get_distribution(
+            'galacteek-ld-web4').version
+    except Exception:
+        ldVersion = '0'
+
+    return f'{jsonldrdf.ROWS_FORMAT}-{__version__}-{ldVersion}'
+
+
 def yamlOrJsonLoad(arg):
     try:
         # Ying
@@ -156,28 +178,59 @@ class LDOpsContext(object):
 
     async def rdfify(self,
                      obj,
-                     debug=False):
+                     debug=False,
+                     useCache=True):
         """
-        IPFS DAG (or object, string) to RDF, via the rdflib-jsonld plugin
+        IPFS DAG (or object, string) to RDF
+
+        The expanded JSON-LD is converted to triples in an executor
+        (see galacteek.ld.jsonldrdf). The conversions of immutable
+        objects (/ipfs paths) are cached in the metadata store.
         """
         from galacteek.ld.rdf import BaseGraph
-        try:
-            # Expand
 
-            if isinstance(obj, IPFSPath) or isinstance(obj, dict) or \
-               isinstance(obj, str):
-                dag = await self.dagExpandAggressive(obj)
-                assert dag is not None
+        app = runningApp()
+        loop = asyncio.get_event_loop()
+        executor = app.executor if app else None
+        store = getattr(app, 'multihashDb', None) if useCache else None
+        rows = None
+
+        try:
+            if isinstance(obj, IPFSPath) and obj.isIpfs and store:
+                # IPFS objects are immutable, the RDF is cached by path
+                cacheKey = str(obj)
             else:
-                raise ValueError('Invalid argument for RDF conversion')
+                cacheKey = None
 
-            # Build the RDF graph from the expanded JSON-LD
-            graph = BaseGraph()
+            if cacheKey:
+                data = await store.getRdf(cacheKey, rdfCacheVersion())
 
-            graph.parse(
-                data=orjson.dumps(dag).decode(),
-                format='json-ld'
-            )
+                if data:
+                    rows = await loop.run_in_executor(
+                        executor, jsonldrdf.rowsDecode, data)
+
+            if rows is None:
+                # Expand
+
+                if isinstance(obj, IPFSPath) or isinstance(obj, dict) or \
+                   isinstance(obj, str):
+                    dag = await self.dagExpandAggressive(obj)
+                    assert dag is not None
+                else:
+                    raise ValueError('Invalid argument for RDF conversion')
+
+                rows = await loop.run_in_executor(
+                    executor, jsonldrdf.expandedToRows, dag)
+
+                if cacheKey and rows:
+                    await store.storeRdf(
+                        cacheKey, rdfCacheVersion(),
+                        await loop.run_in_executor(
+                            executor, jsonldrdf.rowsEncode, rows))
+
+            # Build the RDF graph from the triples
+            graph = await loop.run_in_executor(
+                executor, jsonldrdf.rowsToGraph, rows, BaseGraph())
 
             if not graph:
                 raise Exception('Graph is empty')
@@ -1,63 +1,108 @@
-import json
 import aiofiles
 import asyncio
+import attr
+import orjson
+import os
 import time
 import traceback
+from collections import OrderedDict
 from pathlib import Path
 
 from galacteek import log
-from galacteek.core import jsonSchemaValidate
 from galacteek.config import cParentGet
 
 from galacteek.ipfs.cidhelpers import joinIpns
 from galacteek.ipfs.cidhelpers import stripIpns
 from galacteek.ipfs.cidhelpers import ipnsKeyCidV1
 
-ppRe = r"^(/ipns/[\w<>\:\;\,\?\!\*\%\&\=\@\$\~/\s\.\-_\\\'\(\)\+]{1,1024}$)"
-nsCacheSchema = {
-    "title": "NS cache",
-    "description": "NS cache schema",
-    "type": "object",
-    "patternProperties": {
-        ppRe: {
-            "properties": {
-                "resolved": {
-                    "type": "string"
-                },
-                "resolvedLast": {
-                    "type": "integer"
-                },
-                "cacheOrigin": {
-                    "type": "string"
-                }
-            }
-        }
-    }
-}
-
 
 class InvalidCacheError(Exception):
     pass
 
 
+@attr.s(auto_attribs=True)
+class NSCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    # Expired entries returned while being revalidated
+    staleHits: int = 0
+    revalidations: int = 0
+
+    evicted: int = 0
+    snapshots: int = 0
+    logWrites: int = 0
+
+
+def entryValid(entry):
+    return isinstance(entry, dict) and \
+        isinstance(entry.get('resolved'), str) and \
+        isinstance(entry.get('resolvedLast'), int)
+
+
 class IPNSCache:
-    def __init__(self, path: Path):
+    """
+    IPNS resolutions cache
+
+    Entries are evicted when they're older than maxAge, or when
+    there are more than maxEntries (least recently used first).
+
+    Updates are appended to a log file (replayed on load), and
+    coalesced into snapshots of the cache, written atomically at
+    most every snapshotDelay seconds. The log is discarded once
+    the snapshot is written.
+    """
+
+    def __init__(self, path: Path,
+                 maxEntries: int = None,
+                 maxAge: int = None,
+                 staleLifetime: int = None,
+                 snapshotDelay: float = None):
         self.nsCachePath = path
         self._lock = asyncio.Lock()
-        self.cache = {}
+        self._loaded = False
+        self._logFd = None
+        self._dirty = False
+        self._snapshotTask = None
+        self._revalidating = {}
+
+        self.maxEntries = maxEntries if maxEntries else \
+            self.cNsCache.get('maxEntries', 4096)
+        self.maxAge = maxAge if maxAge else \
+            self.cNsCache.get('maxAge', 86400 * 7)
+        self.staleLifetime = staleLifetime if staleLifetime else \
+            self.cNsCache.get('staleLifetime', 3600)
+        self.snapshotDelay = snapshotDelay if snapshotDelay else \
+            self.cNsCache.get('snapshotDelay', 30)
+
+        self.cache = OrderedDict()
+        self.stats = NSCacheStats()
 
     @property
     def cNsCache(self):
         return cParentGet('nsCache')
 
+    @property
+    def nsLogPath(self):
+        return Path(f'{self.nsCachePath}.log')
+
+    @property
+    def nsLogRotatedPath(self):
+        return Path(f'{self.nsCachePath}.log.old')
+
     def nsCacheLoad(self):
+        if self._loaded or not self.nsCachePath:
+            return
+
+        self._loaded = True
+
         try:
-            with open(str(self.nsCachePath), 'r') as fd:
-                cache = json.load(fd)
+            with open(str(self.nsCachePath), 'rb') as fd:
+                cache = orjson.loads(fd.read())
 
-            if not jsonSchemaValidate(cache, nsCacheSchema):
-                raise InvalidCacheError('Invalid NS cache schema')
-        except InvalidCacheError:
+            if not isinstance(cache, dict):
+                raise InvalidCacheError('Invalid NS cache')
+        except (InvalidCacheError, orjson.JSONDecodeError):
             log.warning(f'Invalid cache: {self.nsCachePath}')
         except FileNotFoundError:
             log.debug('No NS cache found')
@@ -65,42 +110,221 @@ class IPNSCache:
             traceback.print_exc()
         else:
             log.warning(f'IPNS cache: loaded from {self.nsCachePath}')
-            self.cache = cache
+
+            # Least recently resolved first
+            for path, entry in sorted(
+                    cache.items(),
+                    key=lambda it: it[1].get('resolvedLast', 0)
+                    if isinstance(it[1], dict) else 0):
+                if entryValid(entry):
+                    self.cache[path] = entry
+
+        # Replay the changes that were not part of a snapshot
+        replayed = 0
+        for logPath in [self.nsLogRotatedPath, self.nsLogPath]:
+            replayed += self.nsLogReplay(logPath)
+
+        self.evict()
+
+        if replayed > 0:
+            self._dirty = True
+
+    def nsLogReplay(self, logPath: Path):
+        count = 0
+
+        try:
+            with open(str(logPath), 'rb') as fd:
+                for line in fd:
+                    try:
+                        path, entry = orjson.loads(line)
+                    except Exception:
+                        # Truncated write
+                        continue
+
+                    if entryValid(entry):
+                        self.cache[path] = entry
+                        self.cache.move_to_end(path)
+                        count += 1
+        except FileNotFoundError:
+            pass
+        except Exception as err:
+            log.debug(f'IPNS cache: cannot replay {logPath}: {err}')
+
+        return count
+
+    def nsLogAppend(self, path, entry):
+        if not self.nsCachePath:
+            return
+
+        try:
+            if not self._logFd:
+                self._logFd = open(str(self.nsLogPath), 'ab')
+
+            self._logFd.write(orjson.dumps([path, entry]) + b'\n')
+            self._logFd.flush()
+            self.stats.logWrites += 1
+        except Exception as err:
+            log.debug(f'IPNS cache: log write error: {err}')
+
+    def nsLogRotate(self):
+        if self._logFd:
+            self._logFd.close()
+            self._logFd = None
+
+        try:
+            if self.nsLogPath.exists():
+                os.replace(str(self.nsLogPath), str(self.nsLogRotatedPath))
+        except Exception as err:
+            log.debug(f'IPNS cache: log rotation error: {err}')
+
+    def evict(self):
+        limit = int(time.time()) - self.maxAge
+
+        expired = [path for path, entry in self.cache.items()
+                   if entry['resolvedLast'] < limit]
+        for path in expired:
+            del self.cache[path]
+
+        while len(self.cache) > self.maxEntries:
+            self.cache.popitem(last=False)
+            self.stats.evicted += 1
+
+        self.stats.evicted += len(expired)
 
     async def nsCacheSave(self):
         if not self.nsCachePath or not isinstance(self.cache, dict):
             return
 
         async with self._lock:
-            async with aiofiles.open(str(self.nsCachePath), 'w+t') as fd:
-                await fd.write(json.dumps(self.cache))
+            self.evict()
+
+            # Changes from now on go to a new log
+            data = orjson.dumps(self.cache)
+            self.nsLogRotate()
+            self._dirty = False
+
+            tmpPath = Path(f'{self.nsCachePath}.tmp')
+
+            try:
+                async with aiofiles.open(str(tmpPath), 'wb') as fd:
+                    await fd.write(data)
+
+                os.replace(str(tmpPath), str(self.nsCachePath))
+
+                if self.nsLogRotatedPath.exists():
+                    self.nsLogRotatedPath.unlink()
+            except Exception as err:
+                log.debug(f'IPNS cache: snapshot error: {err}')
+                self._dirty = True
+            else:
+                self.stats.snapshots += 1
+
+    async def snapshotLater(self):
+        await asyncio.sleep(self.snapshotDelay)
+
+        self._snapshotTask = None
+        await self.nsCacheSave()
+
+    def snapshotSchedule(self):
+        self._dirty = True
+
+        if not self._snapshotTask:
+            self._snapshotTask = asyncio.ensure_future(self.snapshotLater())
+
+    async def close(self):
+        if self._snapshotTask:
+            self._snapshotTask.cancel()
+            self._snapshotTask = None
+
+        for task in list(self._revalidating.values()):
+            task.cancel()
+
+        if self._dirty:
+            await self.nsCacheSave()
+
+        if self._logFd:
+            self._logFd.close()
+            self._logFd = None
+
+    def revalidateStart(self, path, revalidate):
+        if path in self._revalidating:
+            return
+
+        def done(fut):
+            self._revalidating.pop(path, None)
+
+            if not fut.cancelled() and fut.exception():
+                log.debug(f'IPNS cache: revalidation of {path} failed: '
+                          f'{fut.exception()}')
+
+        self.stats.revalidations += 1
+
+        task = asyncio.ensure_future(revalidate())
+        task.add_done_callback(done)
+        self._revalidating[path] = task
+
+    def nsCacheGet(self, path, maxLifetime=None, knownOrigin=False,
+                   revalidate=None):
+        """
+        Return the cached resolution for an IPNS path
+
+        If the entry is older than maxLifetime but not older than
+        maxLifetime + staleLifetime, and a revalidate coroutine function
+        is passed, the entry is returned and the coroutine is
+        scheduled to refresh the entry (once per path).
+        """
 
-    def nsCacheGet(self, path, maxLifetime=None, knownOrigin=False):
         entry = self.cache.get(path)
 
-        if isinstance(entry, dict):
-            rLast = entry['resolvedLast']
+        if not isinstance(entry, dict):
+            self.stats.misses += 1
+            return None
 
-            if knownOrigin is True and entry.get('cacheOrigin') == 'unknown':
-                return None
+        if knownOrigin is True and entry.get('cacheOrigin') == 'unknown':
+            return None
 
-            if not maxLifetime or (int(time.time()) - rLast) < maxLifetime:
-                return entry['resolved']
+        age = int(time.time()) - entry['resolvedLast']
+
+        if age > self.maxAge:
+            del self.cache[path]
+            self.stats.evicted += 1
+            self.stats.misses += 1
+            return None
+
+        self.cache.move_to_end(path)
+
+        if not maxLifetime or age < maxLifetime:
+            self.stats.hits += 1
+            return entry['resolved']
+
+        if revalidate and age < maxLifetime + self.staleLifetime:
+            self.stats.staleHits += 1
+            self.revalidateStart(path, revalidate)
+            return entry['resolved']
+
+        self.stats.misses += 1
+
+    def nsCacheUpdate(self, path, entry):
+        self.cache[path] = entry
+        self.cache.move_to_end(path)
+        self.nsLogAppend(path, entry)
 
     async def nsCacheSet(self, path, resolved, origin=None):
-        self.cache[path] = {
+        entry = {
             'resolved': resolved,
             'resolvedLast': int(time.time()),
             'cacheOrigin': origin
         }
 
+        self.nsCacheUpdate(path, entry)
+
         # Cache v1
         v1 = ipnsKeyCidV1(stripIpns(path))
         if v1:
-            self.cache[joinIpns(v1)] = {
-                'resolved': resolved,
-                'resolvedLast': int(time.time()),
-                'cacheOrigin': origin
-            }
+            self.nsCacheUpdate(joinIpns(v1), dict(entry))
 
-        await self.nsCacheSave()
+        while len(self.cache) > self.maxEntries:
+            self.cache.popitem(last=False)
+            self.stats.evicted += 1
+
+        self.snapshotSchedule()
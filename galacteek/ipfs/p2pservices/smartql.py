@@ -8,8 +8,6 @@ import collections
 
 from cachetools import TTLCache
 
-from asyncio_throttle import Throttler
-
 from aiohttp import web
 from aiohttp import BasicAuth
 from aiohttp import hdrs
@@ -21,6 +19,7 @@ from rdflib_jsonld.serializer import resource_from_rdf
 from galacteek import log
 from galacteek.core import runningApp
 from galacteek.core.asynclib import loopTime
+from galacteek.core.asynclib import GThrottler
 from galacteek.ipfs.tunnel import P2PListener
 from galacteek.ipfs.p2pservices import P2PService
 from galacteek.ld.rdf import BaseGraph
@@ -53,6 +52,10 @@ class SparQLServiceConfig:
 
     processTimeQueueSize: int = 8
 
+    # Delta sync: serve the changes journaled since a given revision
+    deltasAllow: bool = True
+    changeLogMaxEntries: int = 16384
+
 
 class SparQLWebApp(web.Application):
     pass
@@ -64,10 +67,10 @@ class SparQLSiteHandler:
     """
 
     def __init__(self, service):
-        self.throttler = Throttler(
+        self.throttler = GThrottler(
             rate_limit=500.0,
             period=30.0,
-            retry_interval=2.0
+            name='smartql'
         )
         self.service = service
         self.app = runningApp()
@@ -242,6 +245,43 @@ class SparQLSiteHandler:
                 log.debug(f'Export error: {err}')
                 return await self.msgError(error='Export error')
 
+    async def changes(self, request):
+        """
+        Return the triples added/removed since a given revision of the
+        graph (delta sync), in N-Triples format, wrapped in JSON.
+
+        If the journal can't provide the changes (unknown epoch,
+        revision too old), {"resync": true} is returned and the
+        peer should do a full sync.
+        """
+
+        changeLog = self.service.graph.changeLogCheck()
+
+        if not self.cfg.deltasAllow or changeLog is None:
+            return await self.msgError(status=403)
+
+        try:
+            since = int(request.query.get('since'))
+            epoch = request.query.get('epoch')
+            assert since >= 0
+        except Exception:
+            return await self.msgError(error='Invalid revision')
+
+        async with self.throttler:
+            delta = None
+
+            if epoch == changeLog.epoch:
+                delta = changeLog.changesSince(since)
+
+            if not delta:
+                return web.json_response({
+                    'resync': True,
+                    'epoch': changeLog.epoch,
+                    'revision': changeLog.revision
+                })
+
+            return web.json_response(delta.serialize(changeLog.epoch))
+
     def isAllowedSparqlQuery(self, query: str):
         try:
             parseQuery(query)
@@ -434,6 +474,10 @@ class P2PSmartQLService(P2PService):
 
         self.mwAuth = SmartQLPeerBasedAuthMiddleware()
 
+        if self.config.deltasAllow:
+            self.graph.changeLogEnable(
+                maxEntries=self.config.changeLogMaxEntries)
+
         super().__init__(
             'smartql',
             listenerClass=SparQLListener,
@@ -459,6 +503,7 @@ class SparQLListener(P2PListener):
                 self.webapp.router.add_post('/sparql', self.handler.sparql)
 
                 self.webapp.router.add_get('/export', self.handler.export)
+                self.webapp.router.add_get('/changes', self.handler.changes)
 
                 # SmartQL endpoints
                 self.webapp.router.add_route(
@@ -1,9 +1,14 @@
 import asyncio
 import aiofiles
+import functools
 import orjson
+import os
 import os.path
 import time
 
+from collections import deque
+from collections import OrderedDict
+
 import aioipfs
 
 from galacteek import log
@@ -24,9 +29,15 @@ class PinningMaster(Configurable):
     """
     The Local pinning orchestrator
 
-    Pins objects on request through an async queue
+    Pins objects on request through an async queue. Queued objects are
+    scheduled by priority class (user-initiated pins go before the
+    background pins), round-robin between the queues of the same class,
+    with a limit on the number of objects pinned concurrently.
     """
 
+    PRIORITY_USER = 0
+    PRIORITY_BACKGROUND = 1
+
     def __init__(self, ctx, checkPinned=False, statusFilePath=None):
         super().__init__()
 
@@ -37,10 +48,19 @@ class PinningMaster(Configurable):
         self._ctx = ctx
         self._pinStatus = {}
         self._processTask = None
+        self._statusTask = None
+        self._statusDirty = False
         self._statusFilePath = statusFilePath
         self._checkPinned = checkPinned
         self._sCleanupLast = None
 
+        # Scheduler: priority -> (qname -> orders)
+        self._pending = {
+            self.PRIORITY_USER: OrderedDict(),
+            self.PRIORITY_BACKGROUND: OrderedDict()
+        }
+        self._pinTasks = set()
+
         database.HashmarkAdded.connectTo(self.onMarkAdded)
 
     @property
@@ -59,6 +79,26 @@ class PinningMaster(Configurable):
     def cPinnedExpires(self):
         return self.config.pinnedExpires
 
+    @property
+    def cMaxConcurrent(self):
+        return self.config.scheduler.maxConcurrent
+
+    @property
+    def cBackgroundQueues(self):
+        return self.config.scheduler.backgroundQueues
+
+    @property
+    def cStalledTimeout(self):
+        return self.config.scheduler.stalledTimeout
+
+    @property
+    def cStalledRequeueMax(self):
+        return self.config.scheduler.stalledRequeueMax
+
+    @property
+    def cStatusSaveInterval(self):
+        return self.config.scheduler.statusSaveInterval
+
     @property
     def ordersQueue(self):
         return self._ordersQueue
@@ -75,6 +115,15 @@ class PinningMaster(Configurable):
     def queuesNames(self):
         return list(self.pinStatus.keys())
 
+    @property
+    def pendingCount(self):
+        return sum(len(orders) for queues in self._pending.values()
+                   for orders in queues.values())
+
+    @property
+    def runningCount(self):
+        return len(self._pinTasks)
+
     def configApply(self, cfg):
         pass
 
@@ -107,7 +156,8 @@ class PinningMaster(Configurable):
                         'recursive': pinData['recursive'],
                         'pinned': pinData['pinned'],
                         'ts_queued': pinData['ts_queued'],
-                        'progress': progress
+                        'progress': progress,
+                        'rate': pinData.get('rate', 0)
                     })
 
         return export
@@ -169,7 +219,9 @@ class PinningMaster(Configurable):
                 'ts_queued': int(time.time()),
                 'ts_pinned': 0,
                 'pinned': False,
-                'cancel': False
+                'cancel': False,
+                'requeued': 0,
+                'rate': 0
             }
 
         self.ipfsCtx.pinNewItem.emit(path)
@@ -197,7 +249,9 @@ class PinningMaster(Configurable):
         """
         Pin the object referenced by ``path``
 
-        Returns a (path, statuscode, errmsg) tuple
+        Returns a (path, statuscode, errmsg) tuple. A stalled pin
+        (no progress for stalledTimeout seconds) returns status code 3
+        and stays registered.
         """
         self.debug('Pinning object {path} to {qname} (recursive {rec})'.format(
             path=path, rec=recursive, qname=qname))
@@ -209,13 +263,20 @@ class PinningMaster(Configurable):
                 await self.pathDelete(path)
                 return (path, 0, 'Already pinned')
 
-        pItem = await self.pathRegister(qname, path, recursive)
+        pItem = await self.statusFromPath(path, qname=qname)
+        if not pItem:
+            pItem = await self.pathRegister(qname, path, recursive)
 
-        await self.saveStatus()
+        if pItem['cancel'] is True:
+            await self.pathDelete(path)
+            return (path, 2, 'Cancelled')
+
+        self.statusChanged()
 
         try:
             stalledCn = 0
-            lastPTime = None
+            startTime = lastPTime = time.time()
+            lastProgress = 0
 
             async for pinned in op.client.pin.add(
                     await op.objectPathMapper(path), recursive=recursive):
@@ -229,22 +290,25 @@ class PinningMaster(Configurable):
                 pins = pinned.get('Pins', None)
                 progress = pinned.get('Progress', None)
 
-                if progress:
+                if isinstance(progress, int) and progress > lastProgress:
+                    # Throughput (blocks/s)
                     lastPTime = now
+                    lastProgress = progress
+                    pItem['rate'] = round(progress / (now - startTime), 2)
                     self.debug('Progress {0}: {1}'.format(path, progress))
 
                 if pinned != pItem['status']:
                     pItem['status'] = pinned
                     self.ipfsCtx.pinItemStatusChanged.emit(qname, path, pItem)
 
-                if pins is None and progress is None and not lastPTime:
+                if pins is None and progress is None and not lastProgress:
                     # Never received any progress status yet
                     stalledCn += 1
 
-                if stalledCn >= self.cMaxStalled:
-                    self.debug('{0}: stalled (removing)'.format(path))
-                    await self.pathDelete(path)
-                    return (path, 2, 'Stalled')
+                if pins is None and (stalledCn >= self.cMaxStalled or
+                                     now - lastPTime > self.cStalledTimeout):
+                    self.debug('{0}: stalled'.format(path))
+                    return (path, 3, 'Stalled')
 
                 await asyncio.sleep(1)
         except aioipfs.APIError as err:
@@ -274,25 +338,131 @@ class PinningMaster(Configurable):
                 pItem['ts_pinned'] = now
                 self.ipfsCtx.pinFinished.emit(path)
 
-            await self.saveStatus()
+            self.statusChanged()
 
             await self._emitItemsCount()
 
             return (path, 0, 'OK')
 
-    async def queue(self, path, recursive, onSuccess, qname='default'):
-        """ Queue an item for processing """
-        await self.ordersQueue.put((qname, path, recursive, onSuccess))
+    async def queue(self, path, recursive, onSuccess, qname='default',
+                    priority=None):
+        """
+        Queue an item for processing
+
+        :param int priority: priority class (PRIORITY_USER or
+            PRIORITY_BACKGROUND). By default the queues listed in the
+            backgroundQueues setting are background queues.
+        """
+        if priority is None:
+            priority = self.queuePriority(qname)
+
+        await self.ordersQueue.put(
+            (qname, path, recursive, onSuccess, priority))
         self.ipfsCtx.pinQueueSizeChanged.emit(self.ordersQueue.qsize())
 
+    def queuePriority(self, qname):
+        if qname in self.cBackgroundQueues:
+            return self.PRIORITY_BACKGROUND
+
+        return self.PRIORITY_USER
+
+    def pendingPush(self, order):
+        qname, path, recursive, callback, priority = order
+
+        self._pending[priority].setdefault(qname, deque()).append(order)
+
+    def pendingPop(self):
+        """
+        Pop the next order to process: highest priority class first,
+        round-robin between the queues of the class
+        """
+        for priority in sorted(self._pending.keys()):
+            queues = self._pending[priority]
+
+            if not queues:
+                continue
+
+            qname, orders = queues.popitem(last=False)
+            order = orders.popleft()
+
+            if orders:
+                # Back of the line for this queue
+                queues[qname] = orders
+
+            return order
+
+    def schedule(self):
+        """
+        Start pinning pending orders, up to maxConcurrent pins
+        """
+        while len(self._pinTasks) < self.cMaxConcurrent:
+            order = self.pendingPop()
+            if not order:
+                break
+
+            qname, path, recursive, callback, priority = order
+
+            task = asyncio.ensure_future(
+                self.pin(path, recursive=recursive, qname=qname))
+            task.add_done_callback(
+                functools.partial(self.onPinDone, order))
+            self._pinTasks.add(task)
+
+    def onPinDone(self, order, task):
+        qname, path, recursive, callback, priority = order
+
+        self._pinTasks.discard(task)
+
+        try:
+            path, code, msg = task.result()
+        except BaseException:
+            code = None
+
+        if code == 3:
+            # Stalled: requeue it (the slot goes to the next order)
+            pItem = (self.queueStatus(qname) or {}).get(path)
+
+            if pItem and pItem['requeued'] < self.cStalledRequeueMax:
+                self.debug(f'{path}: stalled, requeueing')
+                pItem['requeued'] += 1
+                pItem['status'] = None
+                self.pendingPush(order)
+                self.schedule()
+                return
+
+            ensure(self.pathDelete(path))
+
+        if callback:
+            callback(task)
+
+        self.schedule()
+
+    def statusChanged(self):
+        self._statusDirty = True
+
+    async def statusSnapshots(self):
+        """
+        Periodically save the status file (if the status changed)
+        """
+        while True:
+            await asyncio.sleep(self.cStatusSaveInterval)
+
+            if self._statusDirty:
+                await self.saveStatus()
+
     async def start(self):
         self._processTask = await self.ipfsCtx.app.scheduler.spawn(
             self.process())
+        self._statusTask = await self.ipfsCtx.app.scheduler.spawn(
+            self.statusSnapshots())
 
     async def stop(self):
         if self._processTask:
             await self._processTask.close()
 
+        if self._statusTask:
+            await self._statusTask.close()
+
         await self.saveStatus()
 
     def restoreStatus(self, data):
@@ -311,14 +481,19 @@ class PinningMaster(Configurable):
 
     async def saveStatus(self):
         async with self.sflock:
-            async with aiofiles.open(self._statusFilePath, 'w+b') as fd:
+            self._statusDirty = False
+            tmpPath = self._statusFilePath + '.tmp'
+
+            async with aiofiles.open(tmpPath, 'w+b') as fd:
                 await fd.write(orjson.dumps(await self.status()))
 
+            os.replace(tmpPath, self._statusFilePath)
+
     async def cancel(self, qname, path):
         status = await self.statusFromPath(path, qname=qname)
         if status:
             status['cancel'] = True
-            await self.saveStatus()
+            self.statusChanged()
 
     async def process(self):
         if os.path.exists(self._statusFilePath):
@@ -344,16 +519,17 @@ class PinningMaster(Configurable):
                 self.ipfsCtx.pinQueueSizeChanged.emit(self.ordersQueue.qsize())
 
                 try:
-                    qname, path, recursive, callback = item
+                    qname, path, recursive, callback, priority = item
 
                     if await self.pathRegistered(path):
                         self.debug(f'{path}: already queued')
                         continue
 
-                    f = asyncio.ensure_future(
-                        self.pin(path, recursive=recursive, qname=qname))
-                    if callback:
-                        f.add_done_callback(callback)
+                    await self.pathRegister(qname, path, recursive)
+                    self.statusChanged()
+
+                    self.pendingPush(item)
+                    self.schedule()
                 except Exception:
                     self.debug('Invalid item in queue')
                     continue
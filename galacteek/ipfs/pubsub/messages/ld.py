@@ -120,6 +120,13 @@ hbSchema = {
                             "type": "string",
                         }
                     },
+                    "graphRevision": {
+                        "type": "integer"
+                    },
+                    "graphRevisionEpoch": {
+                        "type": "string",
+                        "pattern": r"\w{1,64}"
+                    },
                     "smartqlEndpointAddr": {
                         "type": "string",
                         "pattern": r"\w{2,512}"
@@ -12,6 +12,7 @@ from galacteek import ensureLater
 from galacteek.core.asynclib import GThrottler
 
 from galacteek.config import cParentGet
+from galacteek.config import configGeneration
 from galacteek.config import configModRegCallback
 from galacteek.config import Configurable
 from galacteek.config import merge as configMerge
@@ -122,6 +123,7 @@ class PubsubService(Configurable, GService):
         self._ltServeStart = 0
         self._serveLifetime = serveLifetime  # in seconds
         self._metrics = metrics
+        self._configCached = None
 
         GService.__init__(self, **kw)
         Configurable.__init__(self, applyNow=True)
@@ -164,8 +166,21 @@ class PubsubService(Configurable, GService):
         else:
             return self.topicBase
 
+    def configCached(self):
+        """
+        Returns the service's config (merged from several nodes by
+        config()), which is only recomputed when a config changes
+        """
+
+        generation = configGeneration()
+
+        if not self._configCached or self._configCached[0] != generation:
+            self._configCached = (generation, self.config())
+
+        return self._configCached[1]
+
     def messageConfig(self, messageType: str):
-        cfg = self.config()
+        cfg = self.configCached()
         try:
             return cfg.messages.get(messageType)
         except Exception:
@@ -773,11 +788,13 @@ class Curve25519JSONPubsubService(JSONPubsubService):
             # Get the peer's default curve25519 public key
             pubKey = await piCtx.defaultCurve25519PubKey()
 
-            # curve25519 decryption
+            # curve25519 decryption (the box for this peer is cached)
             dec = await ipfsop.ctx.curve25Exec.decrypt(
                 base64.b64decode(msg['data']),
                 await self.getPrivEccKey(),
-                pubKey
+                pubKey,
+                peerId=sender,
+                keyCid=piCtx.ident.defaultCurve25519PubKeyCid
             )
 
             if not dec:
@@ -825,6 +842,8 @@ class Curve25519JSONPubsubService(JSONPubsubService):
         else:
             usePmfp = asyncio.iscoroutinefunction(pmfp)
 
+        batch = []
+
         async for piCtx, sessionKey, _topic, pubKeyCid in self.peersToSend():
             if await self.peerEncFilter(piCtx, msg) is True:
                 continue
@@ -848,14 +867,20 @@ class Curve25519JSONPubsubService(JSONPubsubService):
             if not isinstance(msgString, str):
                 continue
 
-            enc = await ipfsop.ctx.curve25Exec.encrypt(
-                msgString.encode(),
-                await self.getPrivEccKey(),
-                pubKey
-            )
+            batch.append((piCtx, topic, (
+                msgString.encode(), pubKey, piCtx.peerId, pubKeyCid
+            )))
 
-            await ipfsop.sleep(0.05)
+        if not batch:
+            return
+
+        # Encrypt for all the peers in a single executor call
+        encrypted = await ipfsop.ctx.curve25Exec.encryptBatch(
+            await self.getPrivEccKey(),
+            [item for piCtx, topic, item in batch]
+        )
 
+        for (piCtx, topic, item), enc in zip(batch, encrypted):
             if enc:
                 await super().send(
                     base64.b64encode(enc).decode(),
@@ -19,10 +19,11 @@ import asyncio
 import copy
 import hashlib
 import json
+import orjson
 import re
 import sys
 import traceback
-from collections import deque, namedtuple
+from collections import OrderedDict, namedtuple
 from numbers import Integral, Real
 from pyld.__about__ import (__copyright__, __license__, __version__)
 
@@ -5887,30 +5888,99 @@ def _is_relative_iri(v):
     return _is_string(v)
 
 
+def context_digest(ctx):
+    """
+    Returns a digest of a (local or active) context, the inverse context
+    of an active context is ignored.
+
+    :param ctx: the context.
+
+    :return: the hex digest.
+    """
+    if _is_object(ctx) and ctx.get('inverse'):
+        ctx = {k: v for k, v in ctx.items() if k != 'inverse'}
+
+    try:
+        data = orjson.dumps(ctx)
+    except TypeError:
+        data = json.dumps(ctx, default=str).encode()
+
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
 class ActiveContextCache(object):
     """
     An ActiveContextCache caches active contexts so they can be reused without
     the overhead of recomputing them.
+
+    Entries are keyed on the digests of the active and local contexts. A
+    cached active context is keyed by the key it was cached with, so
+    processing a context on top of it doesn't require serializing it.
+
+    Cached active contexts are shared, not copied: _process_context() clones
+    an active context before modifying it.
+
+    If store is set, store(key, result) is called for every new entry.
     """
 
-    def __init__(self, size=100):
-        self.order = deque()
-        self.cache = {}
+    def __init__(self, size=100, store=None):
         self.size = size
+        self.store = store
+        self.cache = OrderedDict()
+        self.keys = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _ctx_key(self, ctx):
+        # the key of a cached active context (the cache holds a reference
+        # to the context, so its id can't be reused)
+        key = self.keys.get(id(ctx))
+        return key if key is not None else context_digest(ctx)
+
+    def key(self, active_ctx, local_ctx):
+        return hashlib.blake2b(
+            (self._ctx_key(active_ctx) + context_digest(local_ctx)).encode(),
+            digest_size=16).hexdigest()
 
     def get(self, active_ctx, local_ctx):
-        key1 = json.dumps(active_ctx)
-        key2 = json.dumps(local_ctx)
-        return self.cache.get(key1, {}).get(key2)
+        key = self.key(active_ctx, local_ctx)
+        result = self.cache.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+
+        self.cache.move_to_end(key)
+        self.hits += 1
+        return result
 
     def set(self, active_ctx, local_ctx, result):
-        if len(self.order) == self.size:
-            entry = self.order.popleft()
-            del self.cache[entry['activeCtx']][entry['localCtx']]
-        key1 = json.dumps(active_ctx)
-        key2 = json.dumps(local_ctx)
-        self.order.append({'activeCtx': key1, 'localCtx': key2})
-        self.cache.setdefault(key1, {})[key2] = json.loads(json.dumps(result))
+        key = self.key(active_ctx, local_ctx)
+        self.add(key, result)
+
+        if self.store:
+            self.store(key, result)
+
+    def add(self, key, result):
+        """
+        Adds a processed context with its key.
+        """
+        self._discard(key, self.cache.pop(key, None))
+        self.cache[key] = result
+        self.keys[id(result)] = key
+        self.resize(self.size)
+
+    def resize(self, size):
+        self.size = size
+        while len(self.cache) > self.size:
+            self._discard(*self.cache.popitem(last=False))
+
+    def clear(self):
+        self.cache.clear()
+        self.keys.clear()
+
+    def _discard(self, key, result):
+        if result is not None and self.keys.get(id(result)) == key:
+            del self.keys[id(result)]
 
 
 # Shared in-memory caches.
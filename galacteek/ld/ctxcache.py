@@ -0,0 +1,145 @@
+import orjson
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+from galacteek import log
+from galacteek.config import cParentGet
+
+from galacteek.ld import asyncjsonld
+from galacteek.ld import ldloader
+
+
+# Bump when the format of the processed contexts changes
+CTXSTORE_VERSION = 1
+
+
+class LDContextStore:
+    """
+    Persistent store for the processed JSON-LD contexts (the active
+    contexts cached by asyncjsonld's ActiveContextCache)
+
+    New entries are appended to a log file (orjson lines) which is
+    read on startup. The log is rewritten when it holds more than
+    twice maxEntries entries.
+    """
+
+    def __init__(self, path: Path, maxEntries: int = 512):
+        self.path = path
+        self.maxEntries = maxEntries
+        self.written = 0
+        self._fd = None
+
+    @property
+    def version(self):
+        return f'{CTXSTORE_VERSION}:{asyncjsonld.__version__}'
+
+    def load(self) -> OrderedDict:
+        """
+        Read the log and return the processed contexts, by key (least
+        recently stored first)
+        """
+
+        entries = OrderedDict()
+
+        try:
+            with open(str(self.path), 'rb') as fd:
+                header = orjson.loads(fd.readline())
+
+                if header != {'version': self.version}:
+                    raise ValueError(f'Invalid context store: {header}')
+
+                for line in fd:
+                    self.written += 1
+
+                    try:
+                        key, ctx = orjson.loads(line)
+                        assert isinstance(ctx, dict)
+                    except Exception:
+                        # Truncated write
+                        continue
+
+                    entries.pop(key, None)
+                    entries[key] = ctx
+        except FileNotFoundError:
+            pass
+        except Exception as err:
+            log.debug(f'LD contexts store: cannot load {self.path}: {err}')
+            entries.clear()
+            self.compact(entries)
+
+        while len(entries) > self.maxEntries:
+            entries.popitem(last=False)
+
+        if self.written > self.maxEntries * 2:
+            self.compact(entries)
+
+        return entries
+
+    def compact(self, entries: OrderedDict):
+        self.close()
+
+        tmpPath = Path(f'{self.path}.tmp')
+
+        try:
+            with open(str(tmpPath), 'wb') as fd:
+                fd.write(orjson.dumps({'version': self.version}) + b'\n')
+
+                for key, ctx in entries.items():
+                    fd.write(orjson.dumps([key, ctx]) + b'\n')
+
+            os.replace(str(tmpPath), str(self.path))
+        except Exception as err:
+            log.debug(f'LD contexts store: compaction error: {err}')
+        else:
+            self.written = len(entries)
+
+    def append(self, key: str, ctx: dict):
+        try:
+            if not self._fd:
+                if not self.path.exists():
+                    self.compact(OrderedDict())
+
+                self._fd = open(str(self.path), 'ab')
+
+            self._fd.write(orjson.dumps([key, ctx]) + b'\n')
+            self._fd.flush()
+            self.written += 1
+        except Exception as err:
+            log.debug(f'LD contexts store: write error: {err}')
+
+    def close(self):
+        if self._fd:
+            self._fd.close()
+            self._fd = None
+
+
+def contextsCacheSetup(storePath: Path = None):
+    """
+    Configure the asyncjsonld active contexts cache and the context
+    documents cache. If storePath is set, the processed contexts are
+    persisted in this file.
+
+    Returns the context store, if any
+    """
+
+    cfg = cParentGet('contextsCache')
+    size = cfg.get('activeContexts', 512)
+    store = None
+
+    ldloader.contextsCacheResize(cfg.get('documents', 256))
+
+    cache = asyncjsonld.ActiveContextCache(size=size)
+
+    if storePath and cfg.get('persist', True):
+        store = LDContextStore(storePath, maxEntries=size)
+
+        for key, ctx in store.load().items():
+            cache.add(key, ctx)
+
+        cache.store = store.append
+
+        log.debug(f'LD contexts store: loaded {len(cache.cache)} contexts')
+
+    asyncjsonld._cache['activeCtx'] = cache
+    return store
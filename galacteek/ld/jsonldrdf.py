@@ -0,0 +1,215 @@
+"""
+Conversion of expanded JSON-LD documents to RDF triples
+
+The expanded document is converted to triples directly, without the
+second expansion done by the rdflib json-ld parser. Triples are first
+converted to rows (JSON-serializable, used by the rdfify cache), from
+which the rdflib terms are built. Both steps are synchronous and are
+meant to be run in an executor.
+"""
+
+import orjson
+
+from rdflib import BNode
+from rdflib import Literal
+from rdflib import URIRef
+
+from galacteek.ld import asyncjsonld as jsonld
+from galacteek.ld.asyncjsonld import IdentifierIssuer
+from galacteek.ld.asyncjsonld import RDF
+from galacteek.ld.asyncjsonld import RDF_FIRST
+from galacteek.ld.asyncjsonld import RDF_NIL
+from galacteek.ld.asyncjsonld import RDF_REST
+from galacteek.ld.asyncjsonld import RDF_TYPE
+from galacteek.ld.asyncjsonld import XSD_STRING
+
+
+# Version of the rows format (part of the rdfify cache key)
+ROWS_FORMAT = 2
+
+RDF_JSON_LITERAL = RDF + 'JSON'
+
+# Row term types
+T_IRI = 'i'
+T_BNODE = 'b'
+T_LITERAL = 'l'
+
+
+class RowsBuilder:
+    """
+    Walks an expanded JSON-LD document and builds the triple rows
+    """
+
+    def __init__(self):
+        self.issuer = IdentifierIssuer('_:b')
+        self.rows = []
+
+    def iriRow(self, iri: str):
+        if iri.startswith('_:'):
+            return [T_BNODE, self.issuer.get_id(iri)]
+        elif jsonld._is_absolute_iri(iri):
+            return [T_IRI, iri]
+
+        # Relative IRIs are skipped
+
+    def valueRow(self, item):
+        """
+        Row for a value: literal, node reference or (embedded) node
+        """
+
+        if isinstance(item, str):
+            return self.iriRow(item)
+        elif not isinstance(item, dict):
+            return None
+
+        if '@value' in item:
+            value = item['@value']
+            datatype = item.get('@type')
+
+            if datatype == '@json' or isinstance(value, (dict, list)):
+                # JSON literal (canonical form, as done by toRDF)
+                value = orjson.dumps(
+                    value, option=orjson.OPT_SORT_KEYS).decode()
+                datatype = RDF_JSON_LITERAL
+
+            if '@language' in item:
+                return [T_LITERAL, value, None, item['@language']]
+
+            if datatype == XSD_STRING:
+                datatype = None
+
+            return [T_LITERAL, value, datatype, None]
+        elif '@list' in item:
+            return self.listRows(item['@list'])
+        elif len(item) == 1 and '@id' in item:
+            return self.iriRow(item['@id'])
+
+        return self.nodeRows(item)
+
+    def listRows(self, items: list):
+        """
+        Rows of an RDF collection, returns the head of the list
+        """
+
+        if not items:
+            return [T_IRI, RDF_NIL]
+
+        head = prev = None
+
+        for item in items:
+            node = [T_BNODE, self.issuer.get_id()]
+
+            if prev:
+                self.rows.append([prev, [T_IRI, RDF_REST], node])
+            else:
+                head = node
+
+            obj = self.valueRow(item)
+            if obj:
+                self.rows.append([node, [T_IRI, RDF_FIRST], obj])
+
+            prev = node
+
+        self.rows.append([prev, [T_IRI, RDF_REST], [T_IRI, RDF_NIL]])
+        return head
+
+    def nodeRows(self, node: dict):
+        """
+        Rows of a node object, returns the node's subject
+        """
+
+        nodeId = node.get('@id')
+        subject = self.iriRow(nodeId) if nodeId else \
+            [T_BNODE, self.issuer.get_id()]
+
+        for prop, values in node.items():
+            if prop == '@type':
+                if subject:
+                    for ntype in values:
+                        obj = self.iriRow(ntype)
+                        if obj:
+                            self.rows.append(
+                                [subject, [T_IRI, RDF_TYPE], obj])
+            elif prop == '@reverse':
+                for rprop, rvalues in values.items():
+                    predicate = self.predicateRow(rprop)
+
+                    for rvalue in rvalues:
+                        obj = self.valueRow(rvalue)
+                        if obj and subject and predicate:
+                            self.rows.append([obj, predicate, subject])
+            elif prop in ['@graph', '@included']:
+                # Triples of named graphs go in the same list
+                for gnode in values:
+                    self.nodeRows(gnode)
+            elif prop.startswith('@'):
+                continue
+            else:
+                predicate = self.predicateRow(prop)
+
+                for value in values:
+                    obj = self.valueRow(value)
+                    if obj and subject and predicate:
+                        self.rows.append([subject, predicate, obj])
+
+        return subject
+
+    def predicateRow(self, prop: str):
+        # No blank node predicates (generalized RDF)
+        if not prop.startswith('_:') and jsonld._is_absolute_iri(prop):
+            return [T_IRI, prop]
+
+
+def expandedToRows(expanded) -> list:
+    """
+    Convert an expanded JSON-LD document to a list of triple rows
+    """
+
+    builder = RowsBuilder()
+
+    for node in (expanded if isinstance(expanded, list) else [expanded]):
+        if isinstance(node, dict):
+            builder.nodeRows(node)
+
+    return builder.rows
+
+
+def rowsToTriples(rows: list):
+    """
+    Yield the rdflib triples for a list of triple rows. Blank nodes
+    get new identifiers
+    """
+
+    bnodes = {}
+
+    def term(row):
+        if row[0] == T_IRI:
+            return URIRef(row[1])
+        elif row[0] == T_BNODE:
+            node = bnodes.get(row[1])
+            if node is None:
+                node = bnodes[row[1]] = BNode()
+            return node
+        else:
+            _, value, datatype, lang = row
+            if lang:
+                return Literal(value, lang=lang)
+            elif datatype:
+                return Literal(value, datatype=URIRef(datatype))
+            return Literal(value)
+
+    for s, p, o in rows:
+        yield term(s), term(p), term(o)
+
+
+def rowsToGraph(rows: list, graph):
+    graph.addN((s, p, o, graph) for s, p, o in rowsToTriples(rows))
+    return graph
+
+
+def rowsEncode(rows: list) -> bytes:
+    return orjson.dumps(rows)
+
+
+def rowsDecode(data: bytes) -> list:
+    return orjson.loads(data)
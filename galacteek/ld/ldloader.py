@@ -3,6 +3,7 @@ import asyncio
 import aioipfs
 
 from cachetools import cached
+from cachetools import LRUCache
 from cachetools import TTLCache
 
 from urllib.parse import urlparse
@@ -19,7 +20,18 @@ async def keysList(client):
     return await client.key.list()
 
 
-contextsCache = TTLCache(32, 180)
+# Context documents, by (immutable) IPFS object path
+contextsCache = LRUCache(256)
+
+
+def contextsCacheResize(size: int):
+    global contextsCache
+
+    cache = LRUCache(size)
+    for path, obj in list(contextsCache.items())[-size:]:
+        cache[path] = obj
+
+    contextsCache = cache
 
 
 async def aioipfs_document_loader(ipfsClient: aioipfs.AsyncIPFS,
@@ -61,16 +73,6 @@ async def aioipfs_document_loader(ipfsClient: aioipfs.AsyncIPFS,
                         code='loading document failed'
                     )
 
-                if url in contextsCache:
-                    # In cache already
-
-                    return {
-                        'contentType': 'application/ld+json',
-                        'document': contextsCache[url],
-                        'documentUrl': url,
-                        'contextUrl': None
-                    }
-
                 sIpfsPath = await ldSchemas.nsToIpfs(ipsKey)
                 path = None if sIpfsPath is None else sIpfsPath.child(o.path)
             else:
@@ -79,16 +81,19 @@ async def aioipfs_document_loader(ipfsClient: aioipfs.AsyncIPFS,
                     raise Exception(f'Not a valid path: {url}')
 
             if path and path.valid:
-                data = await asyncio.wait_for(
-                    client.cat(path.objPath), 10
-                )
+                obj = contextsCache.get(path.objPath)
 
-                obj = orjson.loads(data.decode())
-                assert obj is not None
+                if obj is None:
+                    data = await asyncio.wait_for(
+                        client.cat(path.objPath), 10
+                    )
+
+                    obj = orjson.loads(data.decode())
+                    assert obj is not None
 
-                if url not in contextsCache and len(data) < 4096:
-                    # Cache contexts <4kb
-                    contextsCache[url] = obj
+                    if path.isIpfs:
+                        # Immutable, cache it whatever its size
+                        contextsCache[path.objPath] = obj
 
                 return {
                     'contentType': 'application/ld+json',
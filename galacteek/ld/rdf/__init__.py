@@ -4,7 +4,9 @@ import io
 import re
 import time
 import traceback
+import weakref
 
+from cachetools import LRUCache
 from pathlib import Path
 
 from rdflib import RDF
@@ -23,6 +25,9 @@ from galacteek.core.ps import hubPublish
 from galacteek.core.ps import makeKeyService
 from galacteek.ld import gLdDefaultContext
 from galacteek.ld.iri import urnParse
+from galacteek.ld.sparql import querydb
+
+from .changelog import GraphChangeLog
 
 
 # Default NS bindings used by BaseGraph
@@ -39,6 +44,10 @@ nsBindings = {
     'didv': 'https://w3id.org/did#'
 }
 
+# Write revisions of the rdflib stores (a store can be shared by
+# several graphs, a write on any of them bumps the store's revision)
+storeRevisions = weakref.WeakKeyDictionary()
+
 
 @attr.s(auto_attribs=True)
 class GraphUpdateEvent:
@@ -81,6 +90,9 @@ class GraphURIRef(URIRef):
 
 
 class GraphCommonMixin(object):
+    # Maximum number of cached query results
+    queryCacheSize: int = 128
+
     def __init__(self, *args, **kw):
         super().__init__(*args, **kw)
         self.loop = asyncio.get_event_loop()
@@ -88,6 +100,8 @@ class GraphCommonMixin(object):
 
         self.synchronizer = None
         self.synchronizerSettings: dict = {}
+        self.changeLog: GraphChangeLog = None
+        self.queryCache = LRUCache(self.queryCacheSize)
         self._guardian = kw.pop('guardian', None)
 
     @ property
@@ -101,6 +115,117 @@ class GraphCommonMixin(object):
     def setGuardian(self, g):
         self._guardian = g
 
+    def changeLogEnable(self, maxEntries: int = 16384) -> GraphChangeLog:
+        """
+        Start journaling the changes made on this graph (used for
+        delta synchronization)
+        """
+
+        if self.changeLog is None:
+            self.changeLog = GraphChangeLog(maxEntries=maxEntries)
+            self.changeLog.storeRevision = self.storeRevision
+
+        return self.changeLog
+
+    def changeLogCheck(self) -> GraphChangeLog:
+        """
+        Return the change log of this graph, or None if changes can't be
+        tracked. If the store has been written without the changes being
+        journaled (through another graph sharing the store, a SPARQL
+        update, parse()), a new epoch of the change log is started.
+        """
+
+        changeLog, srev = self.changeLog, self.storeRevision
+
+        if changeLog is None or srev is None:
+            return None
+
+        if changeLog.storeRevision != srev:
+            changeLog.reset()
+            changeLog.storeRevision = srev
+
+        return changeLog
+
+    @property
+    def revision(self) -> int:
+        changeLog = self.changeLogCheck()
+        return changeLog.revision if changeLog else None
+
+    @property
+    def storeRevision(self) -> int:
+        """
+        Write revision of the graph's store (None if it can't be tracked)
+        """
+
+        try:
+            return storeRevisions.get(self.store, 0)
+        except TypeError:
+            return None
+
+    def storeWritten(self, journaled: bool = False) -> None:
+        # Called after a write, so that results of queries that ran
+        # during the write are not reused
+        try:
+            rev = storeRevisions.get(self.store, 0) + 1
+            storeRevisions[self.store] = rev
+        except TypeError:
+            return
+
+        if journaled and self.changeLog is not None and \
+                self.changeLog.storeRevision == rev - 1:
+            # The change log is still in sync with the store
+            self.changeLog.storeRevision = rev
+
+    def add(self, triple):
+        journaled = self.changeLog is not None and len(triple) == 3
+
+        if journaled:
+            self.changeLog.recordAdd(triple)
+
+        try:
+            return super().add(triple)
+        finally:
+            self.storeWritten(journaled=journaled)
+
+    def addN(self, quads):
+        try:
+            if self.changeLog is None:
+                return super().addN(quads)
+
+            quads = list(quads)
+
+            for s, p, o, c in quads:
+                self.changeLog.recordAdd((s, p, o))
+
+            return super().addN(quads)
+        finally:
+            self.storeWritten(journaled=self.changeLog is not None)
+
+    def remove(self, triple):
+        journaled = self.changeLog is not None and len(triple) == 3
+
+        if journaled:
+            for t in list(self.triples(triple)):
+                self.changeLog.recordRemove(t)
+
+        try:
+            return super().remove(triple)
+        finally:
+            self.storeWritten(journaled=journaled)
+
+    def parse(self, *args, **kw):
+        # Conjunctive graphs parse in a context graph (not a mixin)
+        try:
+            return super().parse(*args, **kw)
+        finally:
+            self.storeWritten()
+
+    def update(self, *args, **kw):
+        try:
+            return super().update(*args, **kw)
+        finally:
+            self.storeWritten()
+
     def iNsBind(self):
         # Bind some useful things in the NS manager
         for ns, uri in nsBindings.items():
@@ -150,18 +275,61 @@ class GraphCommonMixin(object):
         else:
             return results, time.perf_counter_ns() - start_time
 
-    async def queryAsync(self, query, initBindings=None):
+    def queryCacheKey(self, query, initBindings):
+        try:
+            key = (query, frozenset(initBindings.items()) if initBindings
+                   else None)
+            hash(key)
+            return key
+        except TypeError:
+            return None
+
+    async def queryAsync(self, query, initBindings=None,
+                         cache: bool = False):
+        """
+        Run a SparQL query in the executor. Query strings are prepared
+        once (see querydb.prepare()).
+
+        If cache is True, the results of SELECT and ASK queries are
+        cached until the next write in the graph's store.
+        """
+
+        revision = self.storeRevision
+        key = self.queryCacheKey(query, initBindings) if cache and \
+            revision is not None else None
+
+        if key is not None:
+            entry = self.queryCache.get(key)
+            if entry and entry[0] == revision:
+                return entry[1]
+
         def runQuery(q, bindings):
             try:
-                return self.query(q, initBindings=bindings)
+                if isinstance(q, str):
+                    q = querydb.prepare(q) or q
+
+                results = self.query(q, initBindings=bindings)
+
+                if results.type == 'SELECT':
+                    # Evaluate now (in the executor)
+                    results.bindings
+                elif results.type != 'ASK':
+                    return results, False
+
+                return results, True
             except Exception:
-                return None
+                return None, False
 
-        return await self.loop.run_in_executor(
+        results, cacheable = await self.loop.run_in_executor(
             runningApp().executor,
             runQuery, query, initBindings
         )
 
+        if key is not None and cacheable:
+            self.queryCache[key] = (revision, results)
+
+        return results
+
     @ipfsOp
     async def rdfifyObject(self, ipfsop, doc: dict):
         async with ipfsop.ldOps() as ld:
@@ -176,8 +344,7 @@ class GraphCommonMixin(object):
             async with ipfsop.ldOps() as ld:
                 graph = await ld.rdfify(doc)
 
-            # Could be optimized using another rdflib method
-            self.parse(await graph.ttlize(), format='ttl')
+            self.addN((s, p, o, self) for s, p, o in graph)
         except Exception as err:
             log.debug(f'Error pulling object {doc}: {err}')
 
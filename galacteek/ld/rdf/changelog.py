@@ -0,0 +1,113 @@
+import attr
+import collections
+import secrets
+
+from rdflib import Graph
+
+
+@attr.s(auto_attribs=True)
+class GraphDelta:
+    """
+    Net changes of a graph between two revisions
+    """
+
+    fromRevision: int
+    toRevision: int
+    added: list = attr.Factory(list)
+    removed: list = attr.Factory(list)
+
+    @staticmethod
+    def ntriples(triples: list) -> str:
+        return '\n'.join(
+            f'{s.n3()} {p.n3()} {o.n3()} .' for s, p, o in triples
+        )
+
+    @staticmethod
+    def graphFromNt(data: str) -> Graph:
+        graph = Graph()
+
+        if data:
+            graph.parse(data=data, format='nt')
+
+        return graph
+
+    def serialize(self, epoch: str) -> dict:
+        return {
+            'epoch': epoch,
+            'fromRevision': self.fromRevision,
+            'revision': self.toRevision,
+            'added': self.ntriples(self.added),
+            'removed': self.ntriples(self.removed)
+        }
+
+
+class GraphChangeLog:
+    """
+    Journal of the triples added to/removed from a graph.
+
+    Every recorded change bumps the revision of the graph. The journal
+    is bounded: if a peer asks for the changes since a revision that
+    is no longer in the journal, it has to do a full resync.
+
+    The epoch is a random token identifying this journal (it changes
+    when the application restarts), a peer that sees a different epoch
+    must not ask for a delta with its last-seen revision.
+
+    storeRevision is the write revision of the graph's store that the
+    journal is in sync with: if the store was written without the
+    changes being journaled, a new epoch is started (see reset()).
+    """
+
+    def __init__(self, maxEntries: int = 16384):
+        self.epoch = secrets.token_hex(8)
+        self.revision = 0
+        self.storeRevision = None
+        self.journal = collections.deque([], maxlen=maxEntries)
+
+    def reset(self) -> None:
+        """
+        Start a new epoch, peers will have to do a full sync
+        """
+
+        self.epoch = secrets.token_hex(8)
+        self.journal.clear()
+
+    @property
+    def oldestRevision(self) -> int:
+        if len(self.journal) == 0:
+            return self.revision
+
+        return self.journal[0][0] - 1
+
+    def _record(self, op: str, triple) -> None:
+        self.revision += 1
+        self.journal.append((self.revision, op, triple))
+
+    def recordAdd(self, triple) -> None:
+        self._record('+', triple)
+
+    def recordRemove(self, triple) -> None:
+        self._record('-', triple)
+
+    def changesSince(self, revision: int) -> GraphDelta:
+        """
+        Return the net changes since the given revision, or None
+        if the journal can't provide them
+        """
+
+        if revision > self.revision or revision < self.oldestRevision:
+            return None
+
+        net = {}
+
+        for rev, op, triple in self.journal:
+            if rev > revision:
+                # Last operation on a triple wins
+                net[triple] = op
+
+        return GraphDelta(
+            fromRevision=revision,
+            toRevision=self.revision,
+            added=[t for t, op in net.items() if op == '+'],
+            removed=[t for t, op in net.items() if op == '-']
+        )
@@ -1,5 +1,6 @@
 import attr
 import asyncio
+import collections
 import re
 import traceback
 import json
@@ -238,11 +239,96 @@ class TriplesUpgradeRule:
         return re.compile(self.object)
 
 
+class TriplesRulesMatcher:
+    """
+    Rules matcher, compiled once when the guardian is configured.
+
+    For each term (subject, predicate, object) we compute (once) a
+    bitmask of the rules whose regular expression matches the term.
+    The first rule matching a triple is the lowest bit set in the
+    combined mask, which gives the same result as testing the rules
+    in order.
+    """
+
+    # Term masks cached by the matcher (cleared when full)
+    cacheMaxTerms = 65536
+
+    def __init__(self, rules: list):
+        self.rules = list(rules)
+        self._sMasks = {}
+        self._pMasks = {}
+        self._oMasks = {}
+
+    def _mask(self, cache: dict, term, attr: str) -> int:
+        mask = cache.get(term)
+
+        if mask is None:
+            if len(cache) >= self.cacheMaxTerms:
+                cache.clear()
+
+            mask = 0
+            sterm = str(term)
+
+            for idx, rule in enumerate(self.rules):
+                if getattr(rule, attr).match(sterm):
+                    mask |= 1 << idx
+
+            cache[term] = mask
+
+        return mask
+
+    def match(self, s, p, o):
+        mask = self._mask(self._sMasks, s, 'reSub')
+        if mask:
+            mask &= self._mask(self._pMasks, p, 'rePredicate')
+        if mask:
+            mask &= self._mask(self._oMasks, o, 'reObject')
+
+        if mask:
+            return self.rules[(mask & -mask).bit_length() - 1].a
+
+
+class CooperativeBudget:
+    """
+    Time budget used to yield control periodically during long
+    graph operations (instead of yielding on every triple)
+    """
+
+    def __init__(self, budget: float = 0.02):
+        self.budget = budget
+        self.tLast = time.monotonic()
+
+    def exhausted(self) -> bool:
+        now = time.monotonic()
+
+        if now - self.tLast >= self.budget:
+            self.tLast = now
+            return True
+
+        return False
+
+    async def cooperate(self):
+        if self.exhausted():
+            await asyncio.sleep(0)
+
+
+def storeCommit(graph: Graph):
+    try:
+        graph.commit()
+    except Exception as err:
+        log.debug(f'Graph {graph.identifier}: commit failed: {err}')
+
+
 class GraphGuardian:
     def __init__(self, uri, cfg):
         self.uri = uri
         self.cfg = cfg
         self.tUpRules = []
+        self._matcher = TriplesRulesMatcher(self.tUpRules)
+
+    @property
+    def mergeTimeBudget(self) -> float:
+        return self.cfg.get('mergeTimeBudget', 0.02)
 
     def configure(self):
         uprules = self.cfg.get('rules', [])
@@ -257,21 +343,15 @@ class GraphGuardian:
             else:
                 self.tUpRules.append(rule)
 
+        self._matcher = TriplesRulesMatcher(self.tUpRules)
         return True
 
+    def matcher(self) -> TriplesRulesMatcher:
+        return self._matcher
+
     def decide(self, graph, subject: URIRef,
                predicate, obj):
-        action = None
-        for rule in self.tUpRules:
-            if rule.reSub.match(str(subject)):
-                ma_p = rule.rePredicate.match(str(predicate))
-                ma_o = rule.reObject.match(str(obj))
-
-                if ma_p and ma_o:
-                    action = rule.a
-                    break
-
-        return action
+        return self._matcher.match(subject, predicate, obj)
 
     async def merge(self, graph: Graph, dst: Graph):
         """
@@ -280,19 +360,41 @@ class GraphGuardian:
         For each triple, we apply an appropriate action
         (upgrade, trigger, ..).
 
-        Trigger calls a coroutine.
+        Trigger calls a coroutine, the triple is not added if the
+        trigger fails. An upgrade replaces the (subject, predicate)
+        values (the last upgraded triple wins).
+
+        The additions and upgrade removals are applied in batches,
+        a batch is flushed before running a trigger so that the
+        trigger sees the triples merged before it.
         """
 
         residue = []
+        upgrades, pending = set(), collections.defaultdict(list)
+        budget = CooperativeBudget(self.mergeTimeBudget)
+
+        def flush():
+            for s, p in upgrades:
+                dst.remove((s, p, None))
+
+            dst.addN((s, p, o, dst) for (s, p), objs in pending.items()
+                     for o in objs)
+
+            upgrades.clear()
+            pending.clear()
 
         for s, p, o in graph:
-            action = self.decide(dst, s, p, o)
+            action = self._matcher.match(s, p, o)
 
             if action:
                 if action.do == 'upgrade':
-                    dst.remove((s, p, None))
+                    # Replaces what's been merged for (s, p) so far
+                    upgrades.add((s, p))
+                    pending[(s, p)] = []
 
                 elif action.do == 'trigger':
+                    flush()
+
                     try:
                         coro = getattr(action, action.call)
                         assert asyncio.iscoroutinefunction(coro)
@@ -307,8 +409,12 @@ class GraphGuardian:
                         traceback.print_exc()
                         continue
 
-            dst.add((s, p, o))
-            await asyncio.sleep(0.05)
+            pending[(s, p)].append(o)
+
+            await budget.cooperate()
+
+        flush()
+        storeCommit(dst)
 
         return residue
 
@@ -327,20 +433,26 @@ class GraphGuardian:
         :param bool bnodes: Allow BNodes
         """
 
+        budget = CooperativeBudget(self.mergeTimeBudget)
+
         def mergeReplaceRun(gsrc: Graph, gdst: Graph) -> bool:
             try:
-                for s, p, o in gsrc:
+                if not bnodes:
                     # No BNodes allowed by default
-                    if isinstance(s, BNode) and not bnodes:
-                        gsrc.remove((s, p, o))
-                    elif isinstance(o, BNode) and not bnodes:
-                        gsrc.remove((s, p, o))
+                    for s, p, o in list(gsrc):
+                        if isinstance(s, BNode) or isinstance(o, BNode):
+                            gsrc.remove((s, p, o))
 
+                for s, p in set(gsrc.subject_predicates()):
                     gdst.remove((s, p, None))
-                    time.sleep(0.05)
+
+                    if budget.exhausted():
+                        # Release the GIL
+                        time.sleep(0)
 
                 # Should lock here
-                gdst += gsrc
+                gdst.addN((s, p, o, gdst) for s, p, o in gsrc)
+                storeCommit(gdst)
             except Exception:
                 log.warning(f'mergeReplace failure ! {traceback.format_exc()}')
                 return False
@@ -356,3 +468,42 @@ class GraphGuardian:
         loop = asyncio.get_event_loop()
         return await loop.run_in_executor(None, mergeReplaceRun,
                                           graph, dst)
+
+    async def mergeDelta(self,
+                         added: Graph,
+                         removed: Graph,
+                         dst: BaseGraph,
+                         bnodes=False) -> bool:
+        """
+        Apply a delta (triples added to and removed from a remote graph)
+        to the destination graph, in one batch
+
+        :param Graph added: triples to add
+        :param Graph removed: triples to remove
+        :param Graph dst: destination graph
+        :param bool bnodes: Allow BNodes
+        """
+
+        def accept(s, p, o) -> bool:
+            return bnodes or not (isinstance(s, BNode) or
+                                  isinstance(o, BNode))
+
+        def mergeDeltaRun() -> bool:
+            try:
+                for s, p, o in removed:
+                    if accept(s, p, o):
+                        dst.remove((s, p, o))
+
+                dst.addN((s, p, o, dst) for s, p, o in added
+                         if accept(s, p, o))
+                storeCommit(dst)
+            except Exception:
+                log.warning(f'mergeDelta failure ! {traceback.format_exc()}')
+                return False
+            else:
+                log.debug(f'mergeDelta success: +{len(added)} triples, '
+                          f'-{len(removed)} triples')
+                return True
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, mergeDeltaRun)
@@ -48,7 +48,8 @@ async def getLdHashmark(resourceUri: Union[URIRef, str],
         initBindings={
             'uri': subj,
             'searchQuery': Literal('')
-        }
+        },
+        cache=True
     ))
 
     if result:
@@ -328,7 +329,7 @@ async def searchLdHashmarks(title: str = '',
     if extraBindings:
         bindings.update(extraBindings)
 
-    return await graph.queryAsync(query, initBindings=bindings)
+    return await graph.queryAsync(query, initBindings=bindings, cache=True)
 
 
 async def ldHashmarkPrefsGet(resourceUrl: Union[IPFSPath, str, URIRef],
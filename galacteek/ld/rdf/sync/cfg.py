@@ -24,6 +24,10 @@ class GraphSparQLSyncConfig:
     debug: bool = False
     run: list = []
 
+    # Pull only the changes since the last-seen revision of the
+    # remote graph (when the peer advertises its graph revision)
+    delta: bool = False
+
 
 @attr.s(auto_attribs=True)
 class GraphSemChainSyncConfig:
@@ -48,3 +48,26 @@ class SmartQLClient:
         else:
             log.debug(f'resource graph pull for {iri}: success')
             return gdata
+
+    async def changes(self, since: int, epoch: str, timeout=60):
+        """
+        Fetch the changes made on the remote graph since the given
+        revision (delta sync). Returns the decoded JSON reply
+        """
+
+        url = self.dial.httpUrl('/changes')
+
+        params = {
+            'since': str(since),
+            'epoch': epoch
+        }
+
+        try:
+            with async_timeout.timeout(timeout):
+                async with aiohttp.ClientSession(auth=self.auth) as session:
+                    async with session.get(url, params=params) as resp:
+                        assert resp.status == 200
+
+                        return await resp.json()
+        except Exception as err:
+            log.debug(f'changes pull error (since {since}): {err}')
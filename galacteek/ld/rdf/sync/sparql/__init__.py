@@ -1,10 +1,15 @@
+from rdflib import Graph
+from rdflib import URIRef
+
 from galacteek import log
 
 from galacteek.services import GService
 
 from galacteek.ld.iri import ipfsPeerUrn
 from galacteek.ld.rdf.sync.base import BaseGraphSynchronizer
+from galacteek.ld.rdf.changelog import GraphDelta
 from galacteek.ld.rdf.sync.cfg import GraphSparQLSyncConfig
+from galacteek.ld.rdf.sync.smartqlclient import SmartQLClient
 from galacteek.ld.sparql.aioclient import Sparkie
 
 
@@ -12,6 +17,38 @@ class GraphSparQLSynchronizer(BaseGraphSynchronizer):
     def __init__(self, config=None):
         self.config = config if config else GraphSparQLSyncConfig()
 
+        # Last-seen (epoch, revision) of remote graphs, by (peer, iri)
+        self._peerRevisions = {}
+
+    @property
+    def stepsScopable(self) -> bool:
+        # Can the steps be restricted to a list of subjects ?
+        return len(self.config.run) > 0 and all(
+            '@SUBJECTS_LIST@' in step.query for step in self.config.run
+        )
+
+    async def fetchDelta(self, dial, auth, since: int, epoch: str):
+        """
+        Pull the changes made on the remote graph since the revision
+        we've last seen.
+
+        Returns an (added, removed) tuple of graphs, or None if the
+        peer can't provide the delta
+        """
+
+        client = SmartQLClient(dial, auth=auth)
+        reply = await client.changes(since, epoch)
+
+        if not reply or reply.get('resync') is True:
+            return None
+
+        try:
+            return (GraphDelta.graphFromNt(reply.get('added')),
+                    GraphDelta.graphFromNt(reply.get('removed')))
+        except Exception as err:
+            log.debug(f'Invalid delta (since {since}): {err}')
+            return None
+
     async def sync(self, ipfsop, peerId, iri, dial,
                    auth, p2pLibertarianId=None,
                    **kw):
@@ -20,13 +57,46 @@ class GraphSparQLSynchronizer(BaseGraphSynchronizer):
 
         subjectsOfInterest = kw.pop('subjectsOfInterest', None)
         opid = kw.pop('smartqlOperationId', None)
+        revision = kw.pop('graphRevision', None)
+        epoch = kw.pop('graphRevisionEpoch', None)
 
         if localGraph is None:
             return
 
+        rKey = (peerId, str(iri))
+        seen = self._peerRevisions.get(rKey)
+        removed = None
+
+        if revision is not None and seen and seen[0] == epoch:
+            if seen[1] == revision and not subjectsOfInterest:
+                # Nothing changed on the remote graph since the last sync
+                return True
+
+            delta = None
+            if self.config.delta and self.stepsScopable:
+                delta = await self.fetchDelta(dial, auth, seen[1], epoch)
+
+            if delta:
+                # The delta only tells us which subjects have changed,
+                # the steps are run for these subjects (and the subjects
+                # of interest) so that their filters still apply
+                added, removed = delta
+                changed = set(added.subjects()) | set(removed.subjects())
+
+                subjects = set(subjectsOfInterest or [])
+                subjects.update(str(s) for s in changed
+                                if isinstance(s, URIRef))
+
+                if not subjects:
+                    self._peerRevisions[rKey] = (epoch, revision)
+                    return True
+
+                subjectsOfInterest = list(subjects)
+
         client = Sparkie(dial.httpUrl('/sparql'), auth=auth)
 
         peerUriRef = ipfsPeerUrn(peerId)
+        failed = False
 
         for step in self.config.run:
             try:
@@ -78,14 +148,37 @@ class GraphSparQLSynchronizer(BaseGraphSynchronizer):
                         print(g.serialize(format='ttl'))
 
                     if action == 'merge':
-                        await localGraph.guardian.mergeReplace(
-                            g, localGraph,
-                            notify=False  # don't notify !
-                        )
+                        if removed is not None and len(removed) > 0:
+                            # Apply the removals for the subjects
+                            # that this step has fetched
+                            fetched = set(g.subjects())
+                            scoped = Graph()
+
+                            for s, p, o in removed:
+                                if s in fetched:
+                                    scoped.add((s, p, o))
+
+                            if not await localGraph.guardian.mergeDelta(
+                                    Graph(), scoped, localGraph):
+                                raise ValueError('Delta merge failed')
+
+                        if not await localGraph.guardian.mergeReplace(
+                                g, localGraph,
+                                notify=False  # don't notify !
+                        ):
+                            raise ValueError('Merge failed')
                     else:
                         raise ValueError(f'Unknown step action: {action}')
             except Exception as err:
+                failed = True
                 log.debug(f'Sparql sync for graph {iri}: '
                           f'step {sname} failed with error: {err}')
 
         await client.close()
+
+        if revision is not None and not failed:
+            # Only remember the revision if all the steps succeeded,
+            # the next sync will retry otherwise
+            self._peerRevisions[rKey] = (epoch, revision)
+
+        return not failed
@@ -1,9 +1,30 @@
+import functools
+import traceback
 
 from pathlib import Path
+from rdflib.plugins.sparql import prepareQuery
+
 from galacteek import log
 from galacteek.core import pkgResourcesRscFilename
 
 
+@functools.lru_cache(maxsize=None)
+def read(name: str) -> str:
+    """
+    Read an .rq file stored inside this module (the contents are
+    cached)
+    """
+
+    filep = Path(
+        pkgResourcesRscFilename(__name__, f'{name}.rq')
+    )
+
+    assert filep.is_file()
+
+    with open(filep, 'rt') as fd:
+        return fd.read()
+
+
 def get(name: str, *args) -> str:
     """
     Get a SparQL query (as string) from an .rq file stored
@@ -14,17 +35,10 @@ def get(name: str, *args) -> str:
     """
 
     try:
-        filep = Path(
-            pkgResourcesRscFilename(__name__, f'{name}.rq')
-        )
-
-        assert filep.is_file()
-
-        with open(filep, 'rt') as fd:
-            if len(args) > 0:
-                return fd.read() % args
+        if len(args) > 0:
+            return read(name) % args
 
-            return fd.read()
+        return read(name)
     except Exception as err:
         log.warning(f'rq rqGET: {name} error: {err}')
 
@@ -32,4 +46,38 @@ def get(name: str, *args) -> str:
         raise err
 
 
-__all__ = ['get']
+@functools.lru_cache(maxsize=256)
+def prepare(query: str):
+    """
+    Parse and translate a SparQL query, returns the prepared query
+    (reusable with different initBindings), or None if the query
+    can't be prepared (for example if it uses prefixes that are
+    not declared in the query)
+
+    :param str query: SparQL query
+    """
+
+    try:
+        return prepareQuery(query)
+    except Exception:
+        log.debug(f'Cannot prepare query: {traceback.format_exc()}')
+        return None
+
+
+def prepared(name: str, *args):
+    """
+    Get a prepared SparQL query from an .rq file stored inside
+    this module
+
+    :param str name: Name of the query to retrieve (without the .rq suffix)
+    """
+
+    return prepare(get(name, *args))
+
+
+def cacheClear() -> None:
+    read.cache_clear()
+    prepare.cache_clear()
+
+
+__all__ = ['get', 'prepare', 'prepared', 'cacheClear']
@@ -507,20 +507,37 @@ class RDFStoresService(ProntoServiceModels,
         # Add definition for graph
         # SmartQL http credentials are set by the curve pubsub service
 
-        msg.graphs.append({
-            'graphIri': service.graph.identifier,
+        msg.graphs.append(self.hbGraphDef(
+            service,
+            subjectsOfInterest=subjUris,
+            smartqlOperationId=uid4()
+        ))
+
+        await self.psService.send(msg)
 
-            'subjectsOfInterest': subjUris,
-            'smartqlOperationId': uid4(),
+    def hbGraphDef(self, service, **extra) -> dict:
+        """
+        Heartbeat definition for the graph of a SmartQL service. The
+        graph's revision is advertised so that peers can ask for a delta
+        """
 
+        graphdef = {
+            'graphIri': service.graph.identifier,
             'smartqlEndpointAddr': service.endpointAddr(),
             'smartqlCredentials': {
                 'user': 'smartql',
                 'password': ''
             }
-        })
+        }
 
-        await self.psService.send(msg)
+        changeLog = service.graph.changeLogCheck()
+
+        if changeLog is not None:
+            graphdef['graphRevision'] = changeLog.revision
+            graphdef['graphRevisionEpoch'] = changeLog.epoch
+
+        graphdef.update(extra)
+        return graphdef
 
     async def onSparqlHeartBeat(self, sender: str,
                                 message: SparQLHeartbeatMessage):
@@ -656,8 +673,9 @@ class RDFStoresService(ProntoServiceModels,
                     graphDescr=graphdef,
                     p2pLibertarianId=msg.p2pLibertarianId,
                     subjectsOfInterest=subjectsOfInterest,
-                    smartqlOperationId=graphdef.get('smartqlOperationId')
-
+                    smartqlOperationId=graphdef.get('smartqlOperationId'),
+                    graphRevision=graphdef.get('graphRevision'),
+                    graphRevisionEpoch=graphdef.get('graphRevisionEpoch')
                 )
         except Exception:
             traceback.print_exc()
@@ -724,14 +742,7 @@ class RDFStoresService(ProntoServiceModels,
                 if not syncSettings or not syncSettings.hbPeriodicSend:
                     continue
 
-                msg.graphs.append({
-                    'graphIri': service.graph.identifier,
-                    'smartqlEndpointAddr': service.endpointAddr(),
-                    'smartqlCredentials': {
-                        'user': 'smartql',
-                        'password': ''
-                    }
-                })
+                msg.graphs.append(self.hbGraphDef(service))
 
             if len(msg.graphs) > 0:
                 self._hbdeq.appendleft((
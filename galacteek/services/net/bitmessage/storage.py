@@ -1,21 +1,116 @@
 import asyncio
 import traceback
 import base64
+import hashlib
+import os
+import time
+import orjson
 from io import BytesIO
 from pathlib import Path
 from email.message import EmailMessage
 from email.parser import BytesParser
+from email.utils import parsedate_to_datetime
+
+from cachetools import LRUCache
 
 from mailbox import Maildir
 from mailbox import MaildirMessage
 
 from galacteek import log
+from galacteek import ensure
 from galacteek import AsyncSignal
 from galacteek import database
 
 from galacteek.config import cParentGet
 
 
+class MailHeadersIndex:
+    """
+    Headers index of a maildir folder: message key -> headers (sender,
+    subject, date ..), subdir and flags. Used to list, sort and search
+    the messages without reading them.
+    """
+
+    headers = ['From', 'To', 'Subject', 'Date']
+
+    def __init__(self, entries: dict = None):
+        self.entries = entries if entries else {}
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, key: str, msg, subdir: str = 'new', flags: str = ''):
+        entry = {
+            name.lower(): str(msg[name]) if msg[name] else ''
+            for name in self.headers
+        }
+
+        try:
+            entry['ts'] = parsedate_to_datetime(entry['date']).timestamp()
+        except Exception:
+            entry['ts'] = time.time()
+
+        entry['subdir'] = subdir
+        entry['flags'] = flags
+
+        self.entries[key] = entry
+        return entry
+
+    def remove(self, key: str):
+        return self.entries.pop(key, None)
+
+    def update(self, key: str, **fields):
+        if key in self.entries:
+            self.entries[key].update(fields)
+            return True
+
+        return False
+
+    def list(self, sortBy: str = 'ts', reverse: bool = True):
+        """
+        Sorted list of (key, entry) tuples
+        """
+        return sorted(self.entries.items(),
+                      key=lambda it: it[1].get(sortBy, ''),
+                      reverse=reverse)
+
+    def search(self, text: str, fields: list = ['from', 'subject']):
+        """
+        Search (case-insensitive) text in the headers, returns the
+        matching (key, entry) tuples, sorted by date
+        """
+        text = text.lower()
+
+        return [(key, entry) for key, entry in self.list()
+                if any(text in entry.get(f, '').lower() for f in fields)]
+
+    def message(self, key: str):
+        """
+        Headers-only MaildirMessage for the message with this key
+        """
+        entry = self.entries[key]
+
+        msg = MaildirMessage()
+        for name in self.headers:
+            if entry.get(name.lower()):
+                msg[name] = entry[name.lower()]
+
+        msg.set_subdir(entry['subdir'])
+        msg.set_flags(entry['flags'])
+        return msg
+
+    def dumps(self) -> bytes:
+        return orjson.dumps(self.entries)
+
+    @classmethod
+    def loads(cls, data: bytes):
+        entries = orjson.loads(data)
+        return cls(entries if isinstance(entries, dict) else None)
+
+
 class BitMessageMailDir:
     bmAddress: str = None
 
@@ -89,27 +184,146 @@ class BitMessageMailDir:
 
 
 class EncryptedMailDir(BitMessageMailDir):
+    """
+    Maildir with encrypted messages. The headers of the messages are
+    kept in an index (stored encrypted, as a single file), so listing
+    the messages does not need to decrypt them. Messages are decrypted
+    when opened, and the last decrypted messages are kept in an LRU
+    cache.
+
+    The RSA keys are not persistent yet (new keys are generated on every
+    start), so the messages and the index stored in a previous session
+    can't be decrypted. The id of the key the index was encrypted with
+    is stored next to it: if it doesn't match the current key, the
+    index is not loaded and the messages are not decrypted again.
+    """
+
     def __init__(self, bmAddr: str, mailDirPath: Path):
         super().__init__(bmAddr, mailDirPath)
-        self.parser = BytesParser()
+        self.parser = BytesParser(_class=MaildirMessage)
+        self.index = MailHeadersIndex()
+        self.indexPath = self.path.joinpath('headers.index')
+        self.indexKeyPath = self.path.joinpath('headers.index.keyid')
+        self.decrypted = LRUCache(
+            cParentGet('maildir.decryptedCacheSize') or 32)
+
+    async def messageDecrypt(self, key):
+        message = self.folderInbox[key]
+        payload = base64.b64decode(
+            message.get_payload().encode())
+
+        decoded = await self.rsaExec.decryptData(
+            BytesIO(payload),
+            self.privKey)
+
+        msg = self.parser.parsebytes(decoded)
+        msg.set_subdir(message.get_subdir())
+        msg.set_flags(message.get_flags())
+        return msg
 
     async def getMessageByKey(self, key):
-        try:
-            message = self.folderInbox[key]
-            payload = base64.b64decode(
-                message.get_payload().encode())
+        msg = self.decrypted.get(key)
+        if msg:
+            return msg
 
-            decoded = await self.rsaExec.decryptData(
-                BytesIO(payload),
-                self.privKey)
-            msg = self.parser.parsebytes(decoded)
+        try:
+            msg = await self.messageDecrypt(key)
         except Exception:
             traceback.print_exc()
         else:
-            await asyncio.sleep(0.1)
             log.debug(f'Decoded message (key: {key})')
+            self.decrypted[key] = msg
             return msg
 
+    async def yieldNewMessages(self):
+        # Headers-only messages from the index, latest first
+        for key, entry in self.index.list():
+            yield key, self.index.message(key)
+
+    def messagesSearch(self, text: str):
+        return self.index.search(text)
+
+    @property
+    def keyId(self) -> str:
+        return hashlib.sha256(self.pubKey).hexdigest()
+
+    def indexKeyMatches(self) -> bool:
+        # Was the index encrypted with the current key ?
+        try:
+            return self.indexKeyPath.read_text().strip() == self.keyId
+        except OSError:
+            return False
+
+    async def indexLoad(self):
+        keyMatch = self.indexKeyMatches()
+
+        if keyMatch and self.indexPath.is_file():
+            try:
+                decoded = await self.rsaExec.decryptData(
+                    BytesIO(self.indexPath.read_bytes()), self.privKey)
+                self.index = MailHeadersIndex.loads(decoded)
+            except Exception as err:
+                log.debug(f'Could not load the headers index: {err}')
+        elif self.indexPath.is_file():
+            log.debug('Headers index encrypted with another key, ignoring')
+
+        await self.indexSync(decrypt=keyMatch)
+
+    async def indexSync(self, decrypt: bool = True):
+        """
+        Index the messages which are not in the index yet (this
+        decrypts them), and remove the entries of deleted messages.
+
+        If decrypt is False (the messages were stored with another key),
+        the messages which are not in the index are not decrypted.
+        """
+        keys = set(self.folderInbox.keys())
+        changed = False
+
+        for key in list(self.index.entries.keys()):
+            if key not in keys:
+                self.index.remove(key)
+                changed = True
+
+        if not decrypt:
+            skipped = len(keys) - len(self.index)
+            if skipped > 0:
+                log.debug(f'{skipped} message(s) stored with another key '
+                          'were not indexed')
+
+            keys = set()
+
+        for key in keys:
+            if key in self.index:
+                continue
+
+            try:
+                msg = await self.messageDecrypt(key)
+            except Exception as err:
+                log.debug(f'Cannot index message {key}: {err}')
+            else:
+                self.index.add(key, msg, subdir=msg.get_subdir(),
+                               flags=msg.get_flags())
+                changed = True
+
+        if changed:
+            await self.indexSave()
+
+    async def indexSave(self):
+        try:
+            encrypted = await self.rsaExec.encryptData(
+                BytesIO(self.index.dumps()), self.pubKey)
+
+            tmpPath = self.indexPath.with_suffix('.tmp')
+            tmpPath.write_bytes(encrypted)
+            os.replace(tmpPath, self.indexPath)
+            self.indexKeyPath.write_text(self.keyId)
+        except Exception as err:
+            log.debug(f'Could not save the headers index: {err}')
+            return False
+        else:
+            return True
+
     async def setup(self):
         from galacteek.crypto.rsa import RSAExecutor
         self.rsaExec = RSAExecutor()
@@ -120,6 +334,8 @@ class EncryptedMailDir(BitMessageMailDir):
         self.path.mkdir(parents=True, exist_ok=True)
         self.folderInbox = self.maildir.add_folder('new')
 
+        await self.indexLoad()
+
     async def encryptMessage(self, message):
         from io import BytesIO
         try:
@@ -141,15 +357,46 @@ class EncryptedMailDir(BitMessageMailDir):
         try:
             eMsg = await self.encryptMessage(message)
             if eMsg:
-                self.folderInbox.add(eMsg)
+                key = self.folderInbox.add(eMsg)
             else:
                 raise Exception('Could not encrypt message')
         except Exception as err:
             log.debug(str(err))
             return False
         else:
+            self.index.add(key, message)
+            await self.indexSave()
+
+            await self.emitNewMessage(key, self.index.message(key))
+            return True
+
+    def msgRemoveInbox(self, messageId):
+        if super().msgRemoveInbox(messageId):
+            self.decrypted.pop(messageId, None)
+            self.index.remove(messageId)
+            ensure(self.indexSave())
             return True
 
+        return False
+
+    def updateMessage(self, mKey, msg):
+        # Only the subdir and flags of a message can change, update
+        # them in the index and in the encrypted message
+
+        try:
+            message = self.folderInbox[mKey]
+            message.set_subdir(msg.get_subdir())
+            message.set_flags(msg.get_flags())
+            self.folderInbox[mKey] = message
+        except Exception as err:
+            log.debug(f'updateMessage failed: {err}')
+            return False
+
+        self.index.update(mKey, subdir=msg.get_subdir(),
+                          flags=msg.get_flags())
+        ensure(self.indexSave())
+        return True
+
 
 class RegularMailDir(BitMessageMailDir):
     folderInbox: Maildir = None
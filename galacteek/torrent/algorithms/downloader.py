@@ -1,7 +1,5 @@
 import asyncio
-import hashlib
 import logging
-import random
 import time
 from collections import deque, OrderedDict
 from math import ceil
@@ -11,6 +9,7 @@ from galacteek.ipfs import ipfsOp
 from galacteek import log as glklog
 
 from galacteek.torrent.algorithms.announcer import Announcer
+from galacteek.torrent.algorithms.hasher import sha1_digest
 from galacteek.torrent.algorithms.peer_manager import PeerData, PeerManager
 from galacteek.torrent.file_structure import FileStructure
 from galacteek.torrent.models import BlockRequestFuture, Peer, TorrentInfo, TorrentState
@@ -51,7 +50,7 @@ class Downloader(QObject):
 
         self._executors_processed_requests = []  # type: List[List[BlockRequestFuture]]
 
-        self._non_started_pieces = None   # type: List[int]
+        self._availability = self._download_info.availability
         self._download_start_time = None  # type: float
 
         self._piece_block_queue = OrderedDict()
@@ -162,9 +161,18 @@ class Downloader(QObject):
         assert piece_info.are_all_blocks_downloaded()
 
         piece_offset, cur_piece_length = self._get_piece_position(piece_index)
-        data = await self._file_structure.read(piece_offset, cur_piece_length)
-        actual_digest = hashlib.sha1(data).digest()
-        if actual_digest == piece_info.piece_hash:
+
+        async def read_piece():
+            return await self._file_structure.read(piece_offset, cur_piece_length)
+
+        if self._file_structure.hasher is not None:
+            valid = await self._file_structure.hasher.verify(piece_index, read_piece)
+        else:
+            data = await read_piece()
+            valid = await asyncio.get_event_loop().run_in_executor(
+                None, sha1_digest, data) == piece_info.piece_hash
+
+        if valid:
             await self._flush_piece(piece_index)
             self._finish_downloading_piece(piece_index)
             return
@@ -233,6 +241,8 @@ class Downloader(QObject):
                 return
 
     RAREST_PIECE_COUNT_TO_SELECT = 10
+    RANDOM_FIRST_PIECE_COUNT = 4
+    ENDGAME_PIECE_COUNT = 8
 
     def _select_new_piece(self, *, force: bool) -> Optional[int]:
         is_appropriate = PeerData.is_free if force else PeerData.is_available
@@ -241,14 +251,17 @@ class Downloader(QObject):
             return None
 
         pieces = self._download_info.pieces
-        available_pieces = [index for index in self._non_started_pieces
-                            if appropriate_peers & pieces[index].owners]
-        if not available_pieces:
-            return None
 
-        available_pieces.sort(key=lambda index: len(pieces[index].owners))
-        piece_count_to_select = min(len(available_pieces), Downloader.RAREST_PIECE_COUNT_TO_SELECT)
-        return available_pieces[random.randint(0, piece_count_to_select - 1)]
+        def is_candidate(index: int) -> bool:
+            return not appropriate_peers.isdisjoint(pieces[index].owners)
+
+        # Random first pieces (to have pieces to share quickly), the pieces
+        # with most owners at the end, rarest first otherwise
+        if self._download_info.downloaded_piece_count < Downloader.RANDOM_FIRST_PIECE_COUNT:
+            return self._availability.select_random(is_candidate)
+        if self._availability.tracked_count <= Downloader.ENDGAME_PIECE_COUNT:
+            return self._availability.select_endgame(is_candidate)
+        return self._availability.select_rarest(is_candidate, Downloader.RAREST_PIECE_COUNT_TO_SELECT)
 
     _typical_piece_length = 2 ** 20
     _requests_per_piece = ceil(_typical_piece_length / REQUEST_LENGTH)
@@ -273,7 +286,7 @@ class Downloader(QObject):
             piece_stock_small = (piece_stock < Downloader.DESIRED_PIECE_STOCK)
             new_piece_index = self._select_new_piece(force=piece_stock_small)
             if new_piece_index is not None:
-                self._non_started_pieces.remove(new_piece_index)
+                self._availability.untrack(new_piece_index)
                 self._start_downloading_piece(new_piece_index)
 
                 result += list(self._request_piece_blocks(max_pending_count - pending_count, new_piece_index))
@@ -284,7 +297,7 @@ class Downloader(QObject):
                 del self._piece_block_queue[piece_index]
 
         if not result:
-            if not self._piece_block_queue and not self._non_started_pieces:
+            if not self._piece_block_queue and not self._availability.tracked_count:
                 raise NoRequestsError('No more undistributed requests')
             raise NotEnoughPeersError('No peers to perform a request')
         return result
@@ -363,6 +376,7 @@ class Downloader(QObject):
             peer_data = self._peer_manager.peer_data
             if len(requests_pending) < len(processed_requests):
                 pieces = self._download_info.pieces
+                validated = []
                 for request in requests_done:
                     if request.performer in peer_data:
                         peer_data[request.performer].queue_size -= 1
@@ -370,8 +384,17 @@ class Downloader(QObject):
                     piece_info = pieces[request.piece_index]
                     if not piece_info.validating and not piece_info.downloaded and not piece_info.blocks_expected:
                         piece_info.validating = True
-                        await self._validate_piece(request.piece_index)
-                        piece_info.validating = False
+                        validated.append(request.piece_index)
+
+                if validated:
+                    # The pieces completed by this batch are verified concurrently
+                    results = await asyncio.gather(*[self._validate_piece(index) for index in validated],
+                                                   return_exceptions=True)
+                    for index in validated:
+                        pieces[index].validating = False
+                    for result in results:
+                        if isinstance(result, Exception):
+                            raise result
                 processed_requests.clear()
                 processed_requests += list(requests_pending)
             else:
@@ -397,19 +420,17 @@ class Downloader(QObject):
                 self._request_deque_relevant.clear()
 
     async def run(self):
-        self._non_started_pieces = self._get_non_finished_pieces()
+        self._availability.track(self._get_non_finished_pieces())
         self._download_start_time = time.time()
 
         # self._logger.info(
         #     f'Starting download in '
         #    f'{self._download_info.download_dir}')
 
-        if not self._non_started_pieces:
+        if not self._availability.tracked_count:
             self._download_info.complete = True
             return
 
-        random.shuffle(self._non_started_pieces)
-
         for _ in range(Downloader.DOWNLOAD_PEER_COUNT):
             processed_requests = []
             self._executors_processed_requests.append(processed_requests)
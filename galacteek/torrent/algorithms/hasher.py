@@ -0,0 +1,175 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from galacteek.torrent.models import DownloadInfo
+
+
+def sha1_digest(data: bytes) -> bytes:
+    return hashlib.sha1(data).digest()
+
+
+class PieceHashState:
+    def __init__(self, length: int):
+        self.length = length
+        self.sha1 = hashlib.sha1()
+
+        self.hashed = 0      # Length of the piece's prefix passed to sha1
+        self.pending = {}    # Blocks received out of order (offset -> data)
+        self.buffered = 0
+        self.task = None     # type: Optional[asyncio.Future]
+        self.broken = False  # Incremental hashing not possible, reread the piece
+
+    def invalidate(self):
+        self.broken = True
+        self.pending = {}
+        self.buffered = 0
+
+
+class PieceHasher:
+    """
+    SHA1 verification of the pieces, off the event loop.
+
+    Blocks are hashed incrementally as they're written (in order: blocks
+    received out of order are kept until the gap is filled), so when the
+    last block of a piece arrives, the digest is available without
+    reading the piece back. If a piece can't be hashed incrementally
+    (overlapping/duplicate blocks, blocks from a previous session, too
+    much data buffered), it's read back and hashed as a whole.
+
+    The hashing runs on a dedicated thread pool (hashlib releases the GIL
+    while hashing), so several pieces are hashed concurrently.
+    """
+
+    HASH_THREADS = 2
+
+    # Contiguous data accumulated before submitting it to the pool
+    HASH_MIN_UPDATE_SIZE = 2 ** 18
+
+    MAX_BUFFERED_PER_PIECE = 2 ** 23
+
+    def __init__(self, download_info: DownloadInfo):
+        self._download_info = download_info
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=PieceHasher.HASH_THREADS)
+        self._loop = asyncio.get_event_loop()
+        self._states: Dict[int, PieceHashState] = {}
+
+        self.hashed_bytes = 0
+        self.hash_time = 0.0
+        self.verified_count = 0
+        self.reread_count = 0
+        self.failed_count = 0
+
+    def feed(self, piece_index: int, block_begin: int, block_data: memoryview):
+        """
+        Called (on the loop) when a block of a piece was written
+        """
+
+        state = self._states.get(piece_index)
+        if state is None:
+            state = PieceHashState(self._download_info.get_real_piece_length(piece_index))
+            self._states[piece_index] = state
+
+        if state.broken:
+            return
+
+        if block_begin < state.hashed or block_begin in state.pending:
+            # Data that was already fed gets overwritten
+            state.invalidate()
+            return
+
+        state.pending[block_begin] = bytes(block_data)
+        state.buffered += len(block_data)
+
+        if state.buffered > PieceHasher.MAX_BUFFERED_PER_PIECE:
+            state.invalidate()
+            return
+
+        if state.task is None or state.task.done():
+            state.task = asyncio.ensure_future(self._drain(state))
+
+    async def _hash_update(self, state: PieceHashState, data: bytes):
+        start_time = time.monotonic()
+        await self._loop.run_in_executor(self._pool, state.sha1.update, data)
+
+        self.hashed_bytes += len(data)
+        self.hash_time += time.monotonic() - start_time
+
+    async def _drain(self, state: PieceHashState, final: bool = False):
+        while not state.broken:
+            chunks = []
+            position = state.hashed
+            while position in state.pending:
+                data = state.pending.pop(position)
+                chunks.append(data)
+                position += len(data)
+
+            size = position - state.hashed
+            if not size:
+                return
+
+            if size < PieceHasher.HASH_MIN_UPDATE_SIZE and position < state.length and not final:
+                # Wait for more data, put it back
+                offset = state.hashed
+                for data in chunks:
+                    state.pending[offset] = data
+                    offset += len(data)
+                return
+
+            state.buffered -= size
+            state.hashed = position
+            await self._hash_update(state, b''.join(chunks))
+
+    def discard(self, piece_index: int):
+        state = self._states.pop(piece_index, None)
+        if state is not None:
+            state.invalidate()
+            if state.task is not None:
+                state.task.cancel()
+
+    async def verify(self, piece_index: int, read_piece: Callable[[], Awaitable[bytes]]) -> bool:
+        """
+        Verify the digest of a piece (all its blocks were written)
+        """
+
+        piece_info = self._download_info.pieces[piece_index]
+        state = self._states.pop(piece_index, None)
+        digest = None
+
+        if state is not None and not state.broken:
+            if state.task is not None:
+                await state.task
+            await self._drain(state, final=True)
+
+            if not state.broken and state.hashed == state.length:
+                digest = state.sha1.digest()
+
+        if digest is None:
+            self.reread_count += 1
+
+            data = await read_piece()
+            start_time = time.monotonic()
+            digest = await self._loop.run_in_executor(self._pool, sha1_digest, data)
+            self.hashed_bytes += len(data)
+            self.hash_time += time.monotonic() - start_time
+
+        valid = digest == piece_info.piece_hash
+        if valid:
+            self.verified_count += 1
+            self._download_info.session_statistics.add_verified(piece_info.length)
+        else:
+            self.failed_count += 1
+        return valid
+
+    @property
+    def hash_rate(self) -> Optional[float]:
+        if self.hash_time > 0:
+            return self.hashed_bytes / self.hash_time
+
+    def close(self):
+        for piece_index in list(self._states.keys()):
+            self.discard(piece_index)
+        self._pool.shutdown(wait=False)
@@ -84,9 +84,9 @@ class PeerManager:
                 self._statistics.peer_count -= 1
                 del self._peer_data[peer]
 
-                for info in self._download_info.pieces:
+                for index, info in enumerate(self._download_info.pieces):
                     if peer in info.owners:
-                        info.owners.remove(peer)
+                        self._download_info.remove_owner(index, peer)
                 if peer in self._statistics.peer_last_download:
                     del self._statistics.peer_last_download[peer]
                 if peer in self._statistics.peer_last_upload:
@@ -27,20 +27,25 @@ class SpeedMeasurer(QObject):
 
         downloaded_queue = deque()
         uploaded_queue = deque()
+        verified_queue = deque()
         while True:
             downloaded_queue.append(self._statistics.downloaded_per_session)
             uploaded_queue.append(self._statistics.uploaded_per_session)
+            verified_queue.append(self._statistics.verified_per_session)
 
             if len(downloaded_queue) > 1:
                 period_in_seconds = (len(downloaded_queue) - 1) * SpeedMeasurer.SPEED_UPDATE_TIMEOUT
                 downloaded_per_period = downloaded_queue[-1] - downloaded_queue[0]
                 uploaded_per_period = uploaded_queue[-1] - uploaded_queue[0]
+                verified_per_period = verified_queue[-1] - verified_queue[0]
                 self._statistics.download_speed = downloaded_per_period / period_in_seconds
                 self._statistics.upload_speed = uploaded_per_period / period_in_seconds
+                self._statistics.verify_speed = verified_per_period / period_in_seconds
 
             if len(downloaded_queue) > max_queue_length:
                 downloaded_queue.popleft()
                 uploaded_queue.popleft()
+                verified_queue.popleft()
 
             if pyqtSignal:
                 self.updated.emit()
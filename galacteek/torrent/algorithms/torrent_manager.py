@@ -5,6 +5,7 @@ from typing import List, Optional
 
 from galacteek.torrent.algorithms.announcer import Announcer
 from galacteek.torrent.algorithms.downloader import Downloader
+from galacteek.torrent.algorithms.hasher import PieceHasher
 from galacteek.torrent.algorithms.peer_manager import PeerManager
 from galacteek.torrent.algorithms.speed_measurer import SpeedMeasurer
 from galacteek.torrent.algorithms.uploader import Uploader
@@ -43,7 +44,8 @@ class TorrentManager(QObject):
 
         self._executors = []  # type: List[asyncio.Task]
 
-        self._file_structure = FileStructure(torrent_info.download_dir, torrent_info.download_info)
+        self._file_structure = FileStructure(torrent_info.download_dir, torrent_info.download_info,
+                                             hasher=PieceHasher(download_info))
 
         self._peer_manager = PeerManager(torrent_info, our_peer_id, self._logger, self._file_structure)
         self._announcer = Announcer(torrent_info, our_peer_id, server_port, self._logger, self._peer_manager)
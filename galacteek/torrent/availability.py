@@ -0,0 +1,134 @@
+import random
+from typing import Callable, Iterable, List, Optional
+
+
+class PieceAvailability:
+    """
+    Owner counts of the pieces of a torrent.
+
+    The pieces that are not started yet ("tracked" pieces) are bucketed by
+    owner count, so that updates on have/bitfield messages and peer
+    disconnections are O(1), and so that the rarest pieces can be found
+    without sorting all the pieces.
+    """
+
+    def __init__(self, piece_count: int):
+        self._counts = [0] * piece_count
+        self._buckets = [[]]  # type: List[List[int]]
+        self._positions = {}  # piece index -> position in its bucket
+
+        self._tracked = []  # type: List[int]
+        self._tracked_positions = {}
+
+    @property
+    def tracked_count(self) -> int:
+        return len(self._tracked)
+
+    def count(self, piece_index: int) -> int:
+        return self._counts[piece_index]
+
+    def is_tracked(self, piece_index: int) -> bool:
+        return piece_index in self._positions
+
+    @staticmethod
+    def _list_add(items: List[int], positions: dict, piece_index: int):
+        positions[piece_index] = len(items)
+        items.append(piece_index)
+
+    @staticmethod
+    def _list_remove(items: List[int], positions: dict, piece_index: int):
+        # Swap with the last item and pop
+        pos = positions.pop(piece_index)
+        last = items.pop()
+        if last != piece_index:
+            items[pos] = last
+            positions[last] = pos
+
+    def _bucket(self, count: int) -> List[int]:
+        while len(self._buckets) <= count:
+            self._buckets.append([])
+        return self._buckets[count]
+
+    def track(self, piece_indexes: Iterable[int]):
+        for index in piece_indexes:
+            if index in self._positions:
+                continue
+
+            self._list_add(self._bucket(self._counts[index]), self._positions, index)
+            self._list_add(self._tracked, self._tracked_positions, index)
+
+    def untrack(self, piece_index: int):
+        if piece_index not in self._positions:
+            return
+
+        self._list_remove(self._buckets[self._counts[piece_index]], self._positions, piece_index)
+        self._list_remove(self._tracked, self._tracked_positions, piece_index)
+
+    def _move(self, piece_index: int, count: int):
+        if piece_index in self._positions:
+            self._list_remove(self._buckets[self._counts[piece_index]], self._positions, piece_index)
+            self._list_add(self._bucket(count), self._positions, piece_index)
+
+        self._counts[piece_index] = count
+
+    def increment(self, piece_index: int):
+        self._move(piece_index, self._counts[piece_index] + 1)
+
+    def decrement(self, piece_index: int):
+        if self._counts[piece_index] > 0:
+            self._move(piece_index, self._counts[piece_index] - 1)
+
+    @staticmethod
+    def _scan(bucket: List[int]) -> Iterable[int]:
+        # Iterate over a bucket from a random position
+        size = len(bucket)
+        start = random.randrange(size)
+        for i in range(size):
+            yield bucket[(start + i) % size]
+
+    def select_rarest(self, is_candidate: Callable[[int], bool], select_among: int = 10) -> Optional[int]:
+        """
+        Select (randomly) one of the select_among rarest candidate pieces
+        """
+        candidates = []
+        for bucket in self._buckets[1:]:
+            if not bucket:
+                continue
+
+            for index in self._scan(bucket):
+                if is_candidate(index):
+                    candidates.append(index)
+                    if len(candidates) == select_among:
+                        return random.choice(candidates)
+
+        return random.choice(candidates) if candidates else None
+
+    RANDOM_SELECTION_ATTEMPTS = 32
+
+    def select_random(self, is_candidate: Callable[[int], bool]) -> Optional[int]:
+        """
+        Select a random candidate piece (used for the first pieces, which are
+        not worth being the rarest: they need to be completed quickly)
+        """
+        if self._tracked:
+            for _ in range(PieceAvailability.RANDOM_SELECTION_ATTEMPTS):
+                index = random.choice(self._tracked)
+                if self._counts[index] and is_candidate(index):
+                    return index
+
+        return self.select_rarest(is_candidate)
+
+    def select_endgame(self, is_candidate: Callable[[int], bool]) -> Optional[int]:
+        """
+        Select the candidate piece with the most owners (the last pieces are
+        completed sooner with more peers to request them from)
+        """
+        for bucket in reversed(self._buckets[1:]):
+            if not bucket:
+                continue
+
+            for index in self._scan(bucket):
+                if is_candidate(index):
+                    return index
+
+        return None
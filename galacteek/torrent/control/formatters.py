@@ -67,6 +67,8 @@ def format_status(state: TorrentState, long_format: bool) -> List[str]:
         humanize_speed(state.download_speed) if state.download_speed is not None else 'unknown'))
     lines.append('Upload speed: {}\n'.format(
         humanize_speed(state.upload_speed) if state.upload_speed is not None else 'unknown'))
+    lines.append('Verification speed: {}\n'.format(
+        humanize_speed(state.verify_speed) if state.verify_speed is not None else 'unknown'))
 
     lines.append('Size: {}/{}\t'.format(humanize_size(state.downloaded_size), humanize_size(state.selected_size)))
     lines.append('Ratio: {:.1f}\n'.format(state.ratio))
@@ -71,10 +71,13 @@ class OnDemandFile:
 
 
 class FileStructure:
-    def __init__(self, download_dir: str, download_info: DownloadInfo):
+    def __init__(self, download_dir: str, download_info: DownloadInfo, hasher=None):
         self.threadpool = concurrent.futures.ThreadPoolExecutor(max_workers=8)
         self._download_info = download_info
 
+        # Verifies the pieces as they're written (PieceHasher)
+        self.hasher = hasher
+
         self._loop = asyncio.get_event_loop()
         self._lock = asyncio.Lock()
         self._descriptors = []
@@ -149,5 +152,8 @@ class FileStructure:
             f.flush()
 
     def close(self):
+        if self.hasher is not None:
+            self.hasher.close()
+
         for f in self._descriptors:
             f.close()
@@ -16,6 +16,7 @@ from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtCore import QObject
 
 
+from galacteek.torrent.availability import PieceAvailability
 from galacteek.torrent.utils import grouper
 
 
@@ -235,8 +236,10 @@ class SessionStatistics:
         self._peer_last_upload = {}
         self._downloaded_per_session = 0
         self._uploaded_per_session = 0
+        self._verified_per_session = 0
         self.download_speed = None  # type: Optional[float]
         self.upload_speed = None    # type: Optional[float]
+        self.verify_speed = None    # type: Optional[float]
 
         if prev_session_stats is not None:
             self._total_downloaded = prev_session_stats.total_downloaded
@@ -261,6 +264,10 @@ class SessionStatistics:
     def uploaded_per_session(self) -> int:
         return self._uploaded_per_session
 
+    @property
+    def verified_per_session(self) -> int:
+        return self._verified_per_session
+
     PEER_CONSIDERATION_TIME = 10
 
     @staticmethod
@@ -289,6 +296,9 @@ class SessionStatistics:
         self._downloaded_per_session += size
         self._total_downloaded += size
 
+    def add_verified(self, size: int):
+        self._verified_per_session += size
+
     def add_uploaded(self, peer: Peer, size: int):
         self._peer_last_upload[peer] = time.time()
         self._uploaded_per_session += size
@@ -326,6 +336,7 @@ class DownloadInfo:
             raise ValueError('Invalid count of piece hashes')
 
         self._interesting_pieces = None
+        self._availability = PieceAvailability(piece_count)
         self.downloaded_piece_count = 0
         self._complete = False
 
@@ -417,6 +428,7 @@ class DownloadInfo:
             info.reset_run_state()
 
         self._interesting_pieces = set()
+        self._availability = PieceAvailability(self.piece_count)
 
     def reset_stats(self):
         self._session_statistics = SessionStatistics(self._session_statistics)
@@ -468,6 +480,22 @@ class DownloadInfo:
     def interesting_pieces(self) -> Set[int]:
         return self._interesting_pieces
 
+    @property
+    def availability(self) -> PieceAvailability:
+        return self._availability
+
+    def add_owner(self, piece_index: int, peer: 'Peer'):
+        owners = self._pieces[piece_index].owners
+        if peer not in owners:
+            owners.add(peer)
+            self._availability.increment(piece_index)
+
+    def remove_owner(self, piece_index: int, peer: 'Peer'):
+        owners = self._pieces[piece_index].owners
+        if peer in owners:
+            owners.remove(peer)
+            self._availability.decrement(piece_index)
+
     @property
     def complete(self) -> bool:
         return self._complete
@@ -579,6 +607,7 @@ class TorrentState:
 
         self.download_speed = statistics.download_speed
         self.upload_speed = statistics.upload_speed
+        self.verify_speed = statistics.verify_speed
 
         self.total_uploaded = statistics.total_uploaded
         self.total_downloaded = statistics.total_downloaded
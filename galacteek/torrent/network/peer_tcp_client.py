@@ -236,7 +236,7 @@ class PeerTCPClient:
 
     def _mark_as_owner(self, piece_index: int):
         self._piece_owned[piece_index] = True
-        self._download_info.pieces[piece_index].owners.add(self._peer)
+        self._download_info.add_owner(piece_index, self._peer)
         if piece_index in self._download_info.interesting_pieces:
             self.am_interested = True
 
@@ -322,6 +322,8 @@ class PeerTCPClient:
 
             await self._file_structure.write(piece_index * self._download_info.piece_length + block_begin, block_data,
                                              acquire_lock=False)
+            if self._file_structure.hasher is not None:
+                self._file_structure.hasher.feed(piece_index, block_begin, block_data)
             piece_info.mark_downloaded_blocks(self._peer, request)
 
             await asyncio.sleep(0.1)
@@ -29,6 +29,8 @@ from PyQt5.QtCore import pyqtSignal
 
 from galacteek.core.models.unixfs import UnixFSEntryInfo
 from galacteek.core.models.unixfs import UnixFSDirectoryModel
+from galacteek.core.models.unixfs import UnixFSModelAgent
+from galacteek.core.models.unixfs import UnixFSFilenameSearch
 
 from galacteek.config import cParentGet
 
@@ -348,6 +350,10 @@ class IPFSHashExplorerWidget(QWidget):
         self.pinButton.pinQueueName = 'unixfs'
 
         self.model = UnixFSDirectoryModel(self)
+        self.model.rowsInserted.connect(self.onEntriesInserted)
+        self.agent = UnixFSModelAgent(self.model,
+                                      entryFactory=self.entryInfoFor)
+        self.agent.listingEnded.connectTo(self.onListingEnded)
 
         self.gitEnabled = showGit
         self.hideHashes = hideHashes
@@ -357,7 +363,8 @@ class IPFSHashExplorerWidget(QWidget):
         self.parentButton = None
         self.rootHash = None
         self.rootPath = None
-        self.srIdxList = []
+        self.search = None
+        self.listStartLt = None
         self.changeCid(hashRef)
 
         self.mainLayout = QVBoxLayout(self)
@@ -512,8 +519,8 @@ class IPFSHashExplorerWidget(QWidget):
         self.searchRegLine.setFocus(Qt.OtherFocusReason)
 
     def onSearchEdited(self, text):
-        # Reset search results index list
-        self.srIdxList = []
+        # Reset the search
+        self.search = None
 
     def onSearchRun(self):
         sText = self.searchRegLine.text()
@@ -521,13 +528,15 @@ class IPFSHashExplorerWidget(QWidget):
         if not sText:
             return
 
-        if not self.srIdxList:
-            self.srIdxList = self.model.searchByFilename(sText)
+        if not self.search:
+            self.search = UnixFSFilenameSearch(self.model, sText)
 
         selModel = self.dirListView.selectionModel()
 
         try:
-            idx = self.srIdxList.pop(0)
+            idx = self.search.next()
+            assert idx is not None
+
             selModel.clearSelection()
             selModel.select(
                 idx,
@@ -535,6 +544,10 @@ class IPFSHashExplorerWidget(QWidget):
             )
             self.dirListView.scrollTo(idx)
         except Exception:
+            if self.model.canFetchMore(QModelIndex()):
+                # Search the next pages when they're fetched
+                self.model.fetchMore(QModelIndex())
+
             messageBox('No search results')
 
     def setInfo(self, text):
@@ -550,6 +563,8 @@ class IPFSHashExplorerWidget(QWidget):
         if self.listTask:
             self.listTask.cancel()
 
+        self.agent.close()
+
     @ipfsOp
     async def gitClone(self, ipfsop, entry, dest):
         """
@@ -674,7 +689,9 @@ class IPFSHashExplorerWidget(QWidget):
 
     def updateTree(self):
         self.buttonRetry.hide()
+        self.cancelTasks()
         self.model.clearModel()
+        self.search = None
 
         if self.rootPath and self.rootPath.valid:
             self.listTask = self.app.task(
@@ -793,103 +810,46 @@ class IPFSHashExplorerWidget(QWidget):
 
         self.statusLoading(False)
 
-    async def list(self, ipfsop, path, parentItem=None,
-                   autoexpand=False, resolve_type=True):
-        """
-        Does the actual directory listing with a streamed ls call
-        """
-
-        # Settings
-        entryBatchCount = self.cUnixFs.list.entryBatchSize
-        entryProgressEvery = self.cUnixFs.list.entryProgressEvery
-        entryProcessSleep = self.cUnixFs.list.entryProcessSleep
-        entryListSleep = self.cUnixFs.list.entryListSleep
-        genTimeout = self.cUnixFs.list.entryFetchTimeout
-
-        eCount = 0  # entry count
-        wiStart, wiEnd = None, None
-        startLt = self.app.loop.time()
-        stCount, stLt = None, None
-
-        _cp, dePath, deExists = self.app.multihashDb.pathDirEntries(
-            self.rootPath.objPath)
-
-        # Load from local cache or do a streamed ls
-        if deExists:
-            eGenerator = self.app.multihashDb.getDirEntries(
-                self.rootPath.objPath)
-        else:
-            eGenerator = ipfsop.listStreamed(path, resolve_type)
-
-        fetching = True
-        while fetching:
-            try:
-                entries = await ipfsop.waitFor(
-                    eGenerator.__anext__(),
-                    genTimeout
-                )
-
-                if entries is None:
-                    # No entries were produced
-                    raise UnixFSTimeoutError()
-
-                for entry in entries:
-                    if entry is None:
-                        continue
-
-                    eCount += 1
-
-                    rowCount = self.model.rowCount(QModelIndex())
-                    rowStart = max(0, rowCount - 1)
-                    rowEnd = rowStart + 1
+    def entryInfoFor(self, entry):
+        entryInfo = UnixFSEntryInfo(entry, self.rootHash)
+        entryInfo.mimeFromDb(self.app.mimeDb)
+        return entryInfo
 
-                    # Set start window index for the first time
-                    if wiStart is None:
-                        wiStart = self.model.index(rowStart, 0, QModelIndex())
-
-                    # Set end window index
-                    wiEnd = self.model.index(rowEnd, 0, QModelIndex())
-
-                    # Create the entry and add it to the model
-                    entryInfo = UnixFSEntryInfo(entry, self.rootHash)
-                    entryInfo.mimeFromDb(self.app.mimeDb)
-                    self.model.entries.append(entryInfo)
-
-                    # Emit dataChanged() periodically
-                    if divmod(eCount, entryBatchCount)[1] == 0:
-                        self.model.dataChanged.emit(wiStart, wiEnd)
-
-                        # The model was refreshed, update the window index
-                        wiStart = self.model.index(rowStart, 0, QModelIndex())
-
-                    if divmod(eCount, entryProgressEvery)[1] == 0:
-                        self.loadingCube.clip.setSpeed(
-                            min(
-                                self.loadingCube.clip.speed() + 5,
-                                400
-                            )
-                        )
+    def onEntriesInserted(self, parent, first, last):
+        if self.listStartLt is None:
+            return
 
-                        stCount, stLt = eCount, self.app.loop.time()
+        eCount = self.model.rowCount(QModelIndex())
+        elapsed = self.app.loop.time() - self.listStartLt
 
-                        entriesPerSec = int(stCount / (stLt - startLt))
-                        self.setInfo(iLoadedEntries(eCount, entriesPerSec))
+        self.loadingCube.clip.setSpeed(
+            min(self.loadingCube.clip.speed() + 5, 400))
 
-                    await ipfsop.sleep(entryProcessSleep)
+        if elapsed > 0:
+            self.setInfo(iLoadedEntries(eCount, int(eCount / elapsed)))
 
-                # Give it some deserved sleep
-                await ipfsop.sleep(entryListSleep)
+    async def onListingEnded(self, path):
+        # Stop updating the loaded entries info
+        self.listStartLt = None
 
-            except StopAsyncIteration:
-                fetching = False
+    async def list(self, ipfsop, path, parentItem=None,
+                   autoexpand=False, resolve_type=True):
+        """
+        Lists the directory with a streamed ls call. Only the first
+        page of entries is fetched here, the model fetches the next
+        pages when the view scrolls down
+        """
 
-        #
-        # The CID was fully listed
-        # Emit dataChanged() and serialize the entries
-        #
+        self.agent.pageSize = self.cUnixFs.list.pageSize
+        self.agent.packSize = self.cUnixFs.list.entryBatchSize
+        self.listStartLt = self.app.loop.time()
 
-        if wiStart and wiEnd:
-            self.model.dataChanged.emit(wiStart, wiEnd)
+        await self.agent.listDirectory(
+            ipfsop, path,
+            resolve_type=resolve_type,
+            generatorTimeout=self.cUnixFs.list.entryFetchTimeout,
+            raiseErrors=True
+        )
 
         # Pin the directory
         # TODO: add a config section by mimetype, to decide what gets
@@ -898,20 +858,6 @@ class IPFSHashExplorerWidget(QWidget):
 
         await ipfsop.ctx.pin(str(path), recursive=False)
 
-        _c, _de, deExists = self.app.multihashDb.pathDirEntries(
-            self.rootPath.objPath)
-
-        if not deExists:
-            await self.serializeEntries()
-
-    async def serializeEntries(self):
-        fEntries = self.model.formatEntries()
-
-        if fEntries:
-            await self.app.multihashDb.writeDirEntries(
-                self.rootPath.objPath, fEntries
-            )
-
     @ipfsStatOp
     async def getResource(self, ipfsop, rPath, dest, rStat):
         """
@@ -0,0 +1,94 @@
+"""
+Config lookups benchmark: cost of the config accessors used on hot
+paths, with the previous implementation (caller module found with
+inspect.stack(), key resolved with OmegaConf.select() on every call)
+and with config handles.
+
+Run with: python tests/benchmarks/bench_config.py
+"""
+
+import inspect
+import tempfile
+import timeit
+from pathlib import Path
+
+from galacteek import config
+from galacteek.config import cAttr
+from galacteek.config import cGet
+from galacteek.config import callerMod
+from galacteek.config import configHandle
+from galacteek.config import regConfigFromPyPkg
+
+
+callSites = [
+    # IPFSOperator.opConfig()
+    ('galacteek.ipfs.ipfsops', 'ops.catChunked'),
+
+    # BaseURLSchemeHandler.schemeConfig
+    ('galacteek.browser.schemes', 'byScheme.default'),
+
+    # PubsubService.config()
+    ('galacteek.ipfs.pubsub', 'serviceTypes.base'),
+
+    # ResourceAccessBlocker.enabled
+    ('galacteek.services.dweb.inter', 'resourceBlocker.enabled')
+]
+
+
+def legacyCallerMod():
+    frm = inspect.stack()[2]
+    mod = inspect.getmodule(frm[0])
+    return mod.__name__
+
+
+def legacyGet(attr: str, mod=None):
+    if not mod:
+        mod = legacyCallerMod()
+
+    cEntry = regConfigFromPyPkg(mod)
+    if cEntry:
+        return cAttr(mod, cEntry['configAll'], attr)
+
+
+def callerLookup(finder):
+    # Same stack depth as a module calling cGet()
+    return finder()
+
+
+def bench(label, func, number):
+    total = timeit.timeit(func, number=number)
+    print(f'  {label:<36} {(total / number) * 1000000:10.2f} us/call')
+
+
+def run(number: int = 2000):
+    config.cSetSavePath(Path(tempfile.mkdtemp()))
+
+    print('Caller module lookup')
+    bench('before: inspect.stack()',
+          lambda: callerLookup(legacyCallerMod), number)
+    bench('after: sys._getframe()',
+          lambda: callerLookup(callerMod), number)
+    print()
+
+    for mod, attr in callSites:
+        regConfigFromPyPkg(mod)
+        handle = configHandle(mod)
+
+        assert legacyGet(attr, mod=mod) == handle.get(attr)
+
+        print(f'{mod}: {attr}')
+
+        bench('before: cGet() (with caller lookup)',
+              lambda: (legacyCallerMod(), legacyGet(attr, mod=mod)),
+              number)
+        bench('before: cGet(mod=...)',
+              lambda: legacyGet(attr, mod=mod), number)
+        bench('after: cGet(mod=...)',
+              lambda: cGet(attr, mod=mod), number)
+        bench('after: configHandle().get()',
+              lambda: handle.get(attr), number)
+        print()
+
+
+if __name__ == '__main__':
+    run()
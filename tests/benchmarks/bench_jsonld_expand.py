@@ -0,0 +1,189 @@
+"""
+JSON-LD expansion benchmark: expand throughput on yaml-ld objects, with
+no active contexts cache, with the previous cache (keys and values
+serialized with json.dumps()) and with the digest-keyed cache (in
+memory, and preloaded from the context store as after a restart).
+
+The yaml-ld objects are read from the paths given on the command line,
+or from the galacteek-ld-web4 package if installed. Built-in sample
+objects are used otherwise. ips:// contexts are loaded from the
+galacteek-ld-web4 contexts when available.
+
+Run with: python tests/benchmarks/bench_jsonld_expand.py [paths]
+"""
+
+import asyncio
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from pathlib import Path
+from urllib.parse import urlparse
+
+import orjson
+import yaml
+
+from galacteek.ld import asyncjsonld as jsonld
+from galacteek.ld.ctxcache import LDContextStore
+
+
+sampleContext = {
+    '@version': 1.1,
+    '@vocab': 'ips://galacteek.ld/',
+    'xsd': 'http://www.w3.org/2001/XMLSchema#',
+    'dateCreated': {'@type': 'xsd:dateTime'},
+    'url': {'@type': '@id'},
+    'tags': {'@container': '@set', '@type': '@id'},
+    'author': {
+        '@id': 'ips://galacteek.ld/author',
+        '@context': {'did': {'@id': 'ips://galacteek.ld/did',
+                             '@type': '@id'}}
+    }
+}
+
+sampleObjects = [
+    {
+        '@context': 'ips://galacteek.ld/Hashmark',
+        '@type': 'Hashmark',
+        '@id': f'ips://galacteek.ld/Hashmark#{idx}',
+        'title': f'Hashmark {idx}',
+        'url': f'ipfs://bafybeigdyrzt5sfp7udm7hu76uh7y26nf3efuylqabf3oclgtqy55fbzd{idx}',  # noqa
+        'dateCreated': '2021-01-01T00:00:00Z',
+        'tags': ['ips://galacteek.ld/Tag#a', 'ips://galacteek.ld/Tag#b'],
+        'author': {'did': 'did:ipid:abc', 'name': 'Bob'}
+    } for idx in range(50)
+]
+
+
+class LegacyActiveContextCache(object):
+    # The previous implementation (from pyld)
+
+    def __init__(self, size=100):
+        self.order = deque()
+        self.cache = {}
+        self.size = size
+
+    def get(self, active_ctx, local_ctx):
+        key1 = json.dumps(active_ctx)
+        key2 = json.dumps(local_ctx)
+        return self.cache.get(key1, {}).get(key2)
+
+    def set(self, active_ctx, local_ctx, result):
+        if len(self.order) == self.size:
+            entry = self.order.popleft()
+            del self.cache[entry['activeCtx']][entry['localCtx']]
+        key1 = json.dumps(active_ctx)
+        key2 = json.dumps(local_ctx)
+        self.order.append({'activeCtx': key1, 'localCtx': key2})
+        self.cache.setdefault(key1, {})[key2] = json.loads(json.dumps(result))
+
+
+def ldWeb4Root():
+    try:
+        import galacteek_ld_web4
+        return Path(galacteek_ld_web4.__file__).parent
+    except ImportError:
+        return None
+
+
+def yamlLdObjects(paths: list):
+    objects = []
+
+    for path in paths:
+        for root, dirs, files in os.walk(str(path)):
+            for name in files:
+                if not name.endswith('yaml-ld'):
+                    continue
+
+                with open(os.path.join(root, name), 'rt') as fd:
+                    obj = yaml.load(fd.read(), Loader=yaml.Loader)
+                    if isinstance(obj, (dict, list)):
+                        objects.append(obj)
+
+    return objects
+
+
+def localLoader(contextsRoot: Path):
+    # Loads the ips contexts from the filesystem (no IPFS node needed)
+
+    docs = {}
+
+    async def loader(url, options={}):
+        if url not in docs:
+            o = urlparse(url)
+            doc = None
+
+            if contextsRoot:
+                path = contextsRoot.joinpath(o.netloc, o.path.lstrip('/'))
+                if path.is_file():
+                    doc = orjson.loads(path.read_bytes())
+
+            docs[url] = doc if doc else {'@context': sampleContext}
+
+        return {
+            'contentType': 'application/ld+json',
+            'document': docs[url],
+            'documentUrl': url,
+            'contextUrl': None
+        }
+
+    return loader
+
+
+async def expandAll(objects, loader, rounds):
+    start = time.perf_counter()
+
+    for r in range(rounds):
+        for obj in objects:
+            await jsonld.expand(copy.deepcopy(obj), {
+                'documentLoader': loader
+            })
+
+    return time.perf_counter() - start
+
+
+async def run(paths: list, rounds: int = 10):
+    web4 = ldWeb4Root()
+
+    if not paths and web4:
+        paths = [web4]
+
+    objects = yamlLdObjects(paths) or sampleObjects
+    loader = localLoader(web4.joinpath('contexts') if web4 else None)
+    storePath = Path(tempfile.mkdtemp()).joinpath('ldcontexts.cache')
+    store = LDContextStore(storePath, maxEntries=512)
+
+    print(f'{len(objects)} objects, {rounds} rounds')
+
+    def report(label, total):
+        count = len(objects) * rounds
+        print(f'  {label:<32} {count / total:10.1f} objects/s '
+              f'({(total / count) * 1000:.3f} ms/object)')
+
+    jsonld._cache['activeCtx'] = None
+    report('no cache', await expandAll(objects, loader, rounds))
+
+    jsonld._cache['activeCtx'] = LegacyActiveContextCache(size=512)
+    report('before: json.dumps() keys',
+           await expandAll(objects, loader, rounds))
+
+    jsonld._cache['activeCtx'] = jsonld.ActiveContextCache(
+        size=512, store=store.append)
+    report('after: digest keys', await expandAll(objects, loader, rounds))
+    store.close()
+
+    # Restart: the processed contexts come from the store
+    cache = jsonld._cache['activeCtx'] = jsonld.ActiveContextCache(size=512)
+    for key, ctx in LDContextStore(storePath, maxEntries=512).load().items():
+        cache.add(key, ctx)
+
+    report('after: preloaded (first round)',
+           await expandAll(objects, loader, 1) * rounds)
+    print(f'  hits: {cache.hits}, misses: {cache.misses}')
+
+
+if __name__ == '__main__':
+    asyncio.run(run([Path(arg) for arg in sys.argv[1:]]))
@@ -0,0 +1,87 @@
+"""
+Torrent piece selection benchmark, on synthetic swarms: cost of
+selecting a new piece to download with the previous implementation
+(all the non-started pieces sorted by owner count on every selection)
+and with the piece availability index, and cost of the index updates
+on have/bitfield messages.
+
+Run with: python tests/benchmarks/bench_torrent_pieces.py
+"""
+
+import random
+import time
+
+from galacteek.torrent.availability import PieceAvailability
+
+
+RAREST_PIECE_COUNT_TO_SELECT = 10
+
+
+def legacy_select(non_started_pieces, owners, appropriate_peers):
+    available_pieces = [index for index in non_started_pieces
+                        if appropriate_peers & owners[index]]
+    if not available_pieces:
+        return None
+
+    available_pieces.sort(key=lambda index: len(owners[index]))
+    piece_count_to_select = min(len(available_pieces),
+                                RAREST_PIECE_COUNT_TO_SELECT)
+    return available_pieces[random.randint(0, piece_count_to_select - 1)]
+
+
+def swarm(piece_count: int, peer_count: int, seed_ratio: float = 0.1):
+    # Bitfields: a few seeds, the other peers own a random share of pieces
+    owners = [set() for _ in range(piece_count)]
+    bitfields = []
+
+    for peer in range(peer_count):
+        share = 1.0 if random.random() < seed_ratio else random.random()
+        owned = [index for index in range(piece_count)
+                 if random.random() < share]
+        bitfields.append(owned)
+
+        for index in owned:
+            owners[index].add(peer)
+
+    return owners, bitfields
+
+
+def run(piece_count: int, peer_count: int, selections: int = 200):
+    owners, bitfields = swarm(piece_count, peer_count)
+    appropriate_peers = set(random.sample(range(peer_count), peer_count // 2))
+    non_started = list(range(piece_count))
+    random.shuffle(non_started)
+
+    start = time.perf_counter()
+    availability = PieceAvailability(piece_count)
+    availability.track(non_started)
+    for owned in bitfields:
+        for index in owned:
+            availability.increment(index)
+    updates = sum(len(owned) for owned in bitfields)
+    update_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(selections):
+        legacy_select(non_started, owners, appropriate_peers)
+    legacy_time = (time.perf_counter() - start) / selections
+
+    def is_candidate(index):
+        return not appropriate_peers.isdisjoint(owners[index])
+
+    start = time.perf_counter()
+    for _ in range(selections):
+        availability.select_rarest(is_candidate, RAREST_PIECE_COUNT_TO_SELECT)
+    index_time = (time.perf_counter() - start) / selections
+
+    print(f'{piece_count:>6} pieces, {peer_count:>3} peers: '
+          f'before {legacy_time * 1000:8.3f} ms/selection, '
+          f'after {index_time * 1000:8.3f} ms/selection, '
+          f'updates {update_time / updates * 1e9:6.0f} ns/have')
+
+
+if __name__ == '__main__':
+    random.seed(0)
+
+    for piece_count, peer_count in [(1000, 20), (10000, 50), (50000, 100)]:
+        run(piece_count, peer_count)
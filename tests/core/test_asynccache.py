@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from cachetools import TTLCache
+
+from galacteek.core.asynccache import cachedcoromethod
+from galacteek.core.asynccache import selfcachedcoromethod
+
+
+class Resolver:
+    def __init__(self):
+        self.calls = 0
+
+    @cachedcoromethod(TTLCache(16, 60), negativeTtl=0.1)
+    async def resolve(self, name):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return None if name == 'missing' else name.upper()
+
+    @selfcachedcoromethod('statCache')
+    async def stat(self, path):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        if path == 'error':
+            raise ValueError(path)
+        return {'path': path}
+
+
+class TestAsyncCache:
+    @pytest.mark.asyncio
+    async def test_coalesce(self):
+        r = Resolver()
+
+        res = await asyncio.gather(*[r.resolve('a') for i in range(8)])
+        assert res == ['A'] * 8
+        assert r.calls == 1
+        assert await r.resolve('a') == 'A'
+
+        stats = Resolver.resolve.cacheStats
+        assert stats.misses == 1
+        assert stats.coalesced == 7
+        assert stats.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_negative(self):
+        r = Resolver()
+
+        assert await r.resolve('missing') is None
+        assert await r.resolve('missing') is None
+        assert r.calls == 1
+
+        await asyncio.sleep(0.15)
+        assert await r.resolve('missing') is None
+        assert r.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_selfcached(self):
+        r1, r2 = Resolver(), Resolver()
+
+        await asyncio.gather(r1.stat('/a'), r1.stat('/a'), r2.stat('/a'))
+        assert r1.calls == 1
+        assert r2.calls == 1
+
+        res = await asyncio.gather(r1.stat('error'), r1.stat('error'),
+                                   return_exceptions=True)
+        assert all(isinstance(err, ValueError) for err in res)
+        assert r1.calls == 2
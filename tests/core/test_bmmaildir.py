@@ -0,0 +1,40 @@
+from email.message import EmailMessage
+
+from galacteek.services.net.bitmessage.storage import MailHeadersIndex
+
+
+def message(sender, subject, date):
+    msg = EmailMessage()
+    msg['From'] = sender
+    msg['Subject'] = subject
+    msg['Date'] = date
+    msg.set_payload('body')
+    return msg
+
+
+class TestMailHeadersIndex:
+    def test_index(self):
+        index = MailHeadersIndex()
+        index.add('k1', message('alice@bitmessage', 'Hello',
+                                'Mon, 01 Mar 2021 10:00:00 +0000'))
+        index.add('k2', message('bob@bitmessage', 'Re: hello',
+                                'Tue, 02 Mar 2021 10:00:00 +0000'))
+        index.add('k3', message('carol@bitmessage', 'Meeting',
+                                'Sun, 28 Feb 2021 10:00:00 +0000'))
+
+        assert [key for key, e in index.list()] == ['k2', 'k1', 'k3']
+        assert [key for key, e in index.search('HELLO')] == ['k2', 'k1']
+        assert [key for key, e in index.search('carol')] == ['k3']
+
+        index.update('k1', subdir='cur')
+        msg = index.message('k1')
+        assert msg['Subject'] == 'Hello'
+        assert msg.get_subdir() == 'cur'
+        assert msg.get_payload() is None
+
+        loaded = MailHeadersIndex.loads(index.dumps())
+        assert loaded.entries == index.entries
+
+        index.remove('k2')
+        assert 'k2' not in index
+        assert len(index) == 2
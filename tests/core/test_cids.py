@@ -3,6 +3,9 @@ import multihash
 from galacteek.ipfs.cidhelpers import IPFSPath
 from galacteek.ipfs.cidhelpers import cidValid
 from galacteek.ipfs.cidhelpers import getCID
+from galacteek.ipfs.cidhelpers import cidDecode
+from galacteek.ipfs.cidhelpers import parseCacheClear
+from galacteek.ipfs.cidhelpers import parseCacheStats
 
 
 class TestCIDs:
@@ -23,3 +26,22 @@ class TestCIDs:
         cid = getCID('bafykbzaced4xstofs4tc5q4irede6uzaz3qzcdvcb2eedxgfakzwdyjnxgohq')
         m = multihash.decode(cid.multihash)
         assert m.name == 'blake2b-256'
+
+    def test_parse_cache(self):
+        parseCacheClear()
+
+        path = '/ipfs/bafykbzaced4xstofs4tc5q4irede6uzaz3qzcdvcb2eedxgfakzwdyjnxgohq/a'  # noqa
+        p1 = IPFSPath(path)
+        p2 = IPFSPath(path)
+        assert p1.valid and p1 == p2
+
+        p1.fragment = 'section'
+        assert p2.fragment is None
+
+        stats = parseCacheStats()
+        assert stats['path']['hits'] == 1
+        assert stats['path']['misses'] == 1
+
+        assert cidDecode('QmT1TPVjdZ9CRnqwyQ9WygDoRgRRibFrEyWufenu92SuU0') is None
+        assert not IPFSPath('/ipfs/QmT1TPVjdZ9CRnqwyQ9WygDoRgRRibFrEyWufenu92SuU0').valid
+        assert parseCacheStats()['cid']['hits'] == 1
@@ -74,6 +74,11 @@ class TestDatabase:
         assert mark3.url == 'ens://test.eth'
         assert mark3.path is None
 
+        res = await database.hashmarksSearch('tagg')
+        assert len(res) == 3
+        res = await database.hashmarksSearch('glass')
+        assert res.pop().title == title
+
         tags = list(reversed(await database.hashmarksPopularTags(min=1)))
         assert tags.pop().name == '@Earth#dapp'
         assert tags.pop().name == '@Earth#ok'
@@ -100,8 +105,12 @@ class TestDatabase:
         assert visit.historyitem.id == item.id
         assert visit.historyitem.url == p.ipfsUrl
 
-        # TODO
-        await database.urlHistorySearch(title)
+        res = await database.urlHistorySearch(title)
+        assert res == [{'title': title, 'url': p.ipfsUrl}]
+
+        res = await database.urlHistorySearch('glass bro')
+        assert len(res) == 1
+        assert not await database.urlHistorySearch('glassware')
 
         await database.closeOrm()
 
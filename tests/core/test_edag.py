@@ -0,0 +1,65 @@
+import hashlib
+import orjson
+import pytest
+
+from galacteek.ipfs.dag import EvolvingDAG
+
+
+class BlocksOp:
+    # Stores the DAG blocks in memory
+
+    def __init__(self):
+        self.blocks = {}
+        self.puts = 0
+
+    async def dagPut(self, data, pin=True, offline=False):
+        data = orjson.loads(orjson.dumps(data))
+        cid = hashlib.sha256(orjson.dumps(
+            data, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        self.blocks[cid] = data
+        self.puts += 1
+        return cid
+
+    async def dagGet(self, cid, timeout=30):
+        return orjson.loads(orjson.dumps(self.blocks.get(cid)))
+
+
+class IncrementalDAG(EvolvingDAG):
+    incremental = True
+    blockMinSize = 128
+
+
+def peers(count):
+    return {
+        f'peer{idx}': {
+            'did': f'did:ipid:{idx}',
+            'handle': 'x' * 128
+        } for idx in range(count)
+    }
+
+
+class TestEvolvingDAG:
+    @pytest.mark.asyncio
+    async def test_blocks(self):
+        op = BlocksOp()
+        edag = IncrementalDAG('/edag.json')
+        root = {'peers': peers(8), 'date': 'now'}
+
+        enc, cid = await edag.blocksEncode(op, root, edag._blocks)
+        assert cid is None
+        assert enc[edag.blocksKey] == ['peers']
+        assert len(op.blocks[enc['peers']['/']][edag.blocksKey]) == 8
+        assert op.puts == 9
+        stored = set(op.blocks.keys())
+
+        # Only the changed block and its parents are stored again
+        root['peers']['peer1']['did'] = 'did:ipid:new'
+        await edag.blocksEncode(op, root, edag._blocks)
+        assert op.puts == 11
+
+        # Round-trip
+        rootCid = await op.dagPut(enc)
+        loaded = IncrementalDAG('/edag.json')
+        inflated = await loaded.blocksInflate(op, await op.dagGet(rootCid))
+        assert inflated == {'peers': peers(8), 'date': 'now'}
+        assert set(loaded._blocks.values()) == stored
@@ -0,0 +1,56 @@
+import itertools
+
+from PyQt5.QtCore import QUrl
+
+from galacteek.browser.greasemonkey import GreasemonkeyManager
+from galacteek.browser.greasemonkey import GreasemonkeyMatcher
+from galacteek.browser.greasemonkey import GreasemonkeyScript
+
+
+def script(name, includes=[], excludes=[], run_at='document-end'):
+    lines = [f'// @name {name}', f'// @run-at {run_at}']
+    lines += [f'// @include {pat}' for pat in includes]
+    lines += [f'// @exclude {pat}' for pat in excludes]
+
+    return GreasemonkeyScript.parse('\n'.join(
+        ['// ==UserScript=='] + lines + ['// ==/UserScript==', '']))
+
+
+class TestGreasemonkeyMatching:
+    def test_index(self):
+        scripts = [
+            script('all'),
+            script('example', ['https://example.org/*']),
+            script('example-any', ['*://example.org/*'],
+                   excludes=['*/private/*']),
+            script('hosts', ['https://a.org/*', 'http://b.org/x*']),
+            script('regex', ['/^https?://(www\\.)?c\\.org//']),
+            script('start', ['https://example.org/*'],
+                   run_at='document-start'),
+            script('idle', ['*example*'], run_at='document-idle')
+        ]
+
+        manager = GreasemonkeyManager([])
+        for s in scripts:
+            manager._add_script(s)
+
+        urls = [
+            'https://example.org/', 'http://example.org/private/a',
+            'https://a.org/page', 'http://b.org/xyz', 'http://b.org/y',
+            'https://www.c.org/', 'https://evil.org/?u=https://a.org/',
+            'file:///tmp/example.html', 'ipfs://bafy/example'
+        ]
+
+        for url, attempt in itertools.product(urls, range(2)):
+            qurl = QUrl(url)
+            matching = manager.scripts_for(qurl)
+            matcher = GreasemonkeyMatcher(qurl)
+
+            def expected(run):
+                if not matcher.is_greaseable:
+                    return []
+                return [s for s in run if matcher.matches(s)]
+
+            assert matching.start == expected(manager._run_start)
+            assert matching.end == expected(manager._run_end)
+            assert matching.idle == expected(manager._run_idle)
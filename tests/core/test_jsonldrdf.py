@@ -0,0 +1,57 @@
+import json
+
+import pytest
+from rdflib import Graph
+from rdflib.compare import isomorphic
+
+from galacteek.ld import asyncjsonld as jsonld
+from galacteek.ld import jsonldrdf
+
+
+doc = {
+    '@context': {
+        '@vocab': 'https://schema.org/',
+        'xsd': 'http://www.w3.org/2001/XMLSchema#',
+        'tags': {'@container': '@list'},
+        'published': {'@type': 'xsd:dateTime'},
+        'knows': {'@type': '@id'}
+    },
+    '@id': 'ips://galacteek.ld/Article#1',
+    '@type': 'Article',
+    'name': 'Hello',
+    'title': {'@value': 'Bonjour', '@language': 'fr'},
+    'count': 5,
+    'ratio': 1.5,
+    'published': '2021-01-01T00:00:00Z',
+    'tags': ['a', {'@id': 'ips://galacteek.ld/Tag'}],
+    'knows': 'did:ipid:abc',
+    'author': {'name': 'Bob', 'address': {'streetAddress': 'x'}},
+    '@reverse': {'https://schema.org/hasPart': {'@id': 'ips://galacteek.ld/p'}}
+}
+
+
+class TestJsonLdToRdf:
+    @pytest.mark.asyncio
+    async def test_convert(self):
+        expanded = await jsonld.expand(doc, {'base': 'ips://galacteek.ld/'})
+
+        rows = jsonldrdf.expandedToRows(expanded)
+        rows = jsonldrdf.rowsDecode(jsonldrdf.rowsEncode(rows))
+        graph = jsonldrdf.rowsToGraph(rows, Graph())
+
+        ref = Graph().parse(data=json.dumps(expanded), format='json-ld')
+
+        assert len(graph) == len(ref) == 17
+        assert isomorphic(graph, ref)
+
+    def test_json_literal(self):
+        rows = jsonldrdf.expandedToRows([{
+            '@id': 'ips://galacteek.ld/Doc#1',
+            'https://schema.org/data': [{
+                '@value': {'b': 1, 'a': [True]},
+                '@type': '@json'
+            }]
+        }])
+
+        assert rows[0][2] == [jsonldrdf.T_LITERAL, '{"a":[true],"b":1}',
+                              jsonldrdf.RDF_JSON_LITERAL, None]
@@ -0,0 +1,108 @@
+import copy
+
+import pytest
+
+from galacteek.ld import asyncjsonld as jsonld
+from galacteek.ld.ctxcache import LDContextStore
+
+
+doc = {
+    '@context': {
+        '@version': 1.1,
+        '@vocab': 'https://schema.org/',
+        'knows': {'@type': '@id'},
+        'author': {
+            '@id': 'https://schema.org/author',
+            '@context': {'name': 'https://schema.org/givenName'}
+        }
+    },
+    '@type': 'Article',
+    'name': 'Hello',
+    'knows': 'did:ipid:abc',
+    'author': {'name': 'Bob'}
+}
+
+
+def snapshot(cache):
+    # Deep copies of the cached contexts, without the inverse contexts
+    # (computed lazily)
+    def strip(ctx):
+        return {key: strip(value) if key == 'previousContext' else value
+                for key, value in ctx.items() if key != 'inverse'}
+
+    return {key: copy.deepcopy(strip(ctx))
+            for key, ctx in cache.cache.items()}
+
+
+@pytest.fixture
+def ctxCache():
+    cache = jsonld.ActiveContextCache(size=8)
+    prev = jsonld._cache['activeCtx']
+    jsonld._cache['activeCtx'] = cache
+    yield cache
+    jsonld._cache['activeCtx'] = prev
+
+
+class TestActiveContextCache:
+    @pytest.mark.asyncio
+    async def test_expand(self, ctxCache):
+        expanded = await jsonld.expand(copy.deepcopy(doc))
+        assert ctxCache.misses > 0 and ctxCache.hits == 0
+
+        cached = snapshot(ctxCache)
+
+        assert await jsonld.expand(copy.deepcopy(doc)) == expanded
+        assert ctxCache.hits > 0
+
+        # Cached contexts are not modified
+        assert snapshot(ctxCache) == cached
+        assert expanded[0]['https://schema.org/author'][0][
+            'https://schema.org/givenName'][0]['@value'] == 'Bob'
+
+        other = copy.deepcopy(doc)
+        other['@context']['@vocab'] = 'https://example.org/'
+        expanded = await jsonld.expand(other)
+        assert 'https://example.org/name' in expanded[0]
+
+    def test_bounded(self, ctxCache):
+        for idx in range(32):
+            ctxCache.set({'mappings': {}}, {'a': str(idx)},
+                         {'mappings': {'a': idx}})
+
+        assert len(ctxCache.cache) == len(ctxCache.keys) == 8
+        assert ctxCache.get({'mappings': {}}, {'a': '31'}) == {
+            'mappings': {'a': 31}}
+        assert ctxCache.get({'mappings': {}}, {'a': '0'}) is None
+
+
+class TestContextStore:
+    @pytest.mark.asyncio
+    async def test_persist(self, tmp_path, ctxCache):
+        path = tmp_path.joinpath('ldcontexts.cache')
+
+        store = LDContextStore(path, maxEntries=4)
+        ctxCache.store = store.append
+
+        expanded = await jsonld.expand(copy.deepcopy(doc))
+        store.close()
+
+        entries = LDContextStore(path, maxEntries=4).load()
+        assert len(entries) == len(ctxCache.cache)
+
+        cache = jsonld.ActiveContextCache(size=8)
+        for key, ctx in entries.items():
+            cache.add(key, ctx)
+
+        jsonld._cache['activeCtx'] = cache
+        assert await jsonld.expand(copy.deepcopy(doc)) == expanded
+        assert cache.hits > 0 and cache.misses == 0
+
+        # Compaction
+        store = LDContextStore(path, maxEntries=4)
+        for idx in range(16):
+            store.append(str(idx), {'mappings': {}})
+        store.close()
+
+        store = LDContextStore(path, maxEntries=4)
+        assert list(store.load().keys()) == ['12', '13', '14', '15']
+        assert store.written == 4
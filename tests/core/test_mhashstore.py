@@ -0,0 +1,108 @@
+import orjson
+import pytest
+
+from galacteek.core.multihashmetadb import IPFSObjectMetadataStore
+
+
+path1 = '/ipfs/QmT1TPVjdZ9CRnqwyQ9WygDoRgRRibFrEyWufenu92SuUV'
+path2 = '/ipfs/Qma1TPVjdZ9CReqwyQ9Wvv3oRgRRi5FrEyWufenu92SuUV'
+
+
+@pytest.fixture
+def storepath(tmpdir):
+    return str(tmpdir.join('mhashmeta.sqlite3'))
+
+
+class TestMetadataStore:
+    @pytest.mark.asyncio
+    async def test_store(self, storepath):
+        store = IPFSObjectMetadataStore(storepath, cacheSize=2)
+        assert await store.setup() is True
+
+        assert await store.get(path1) is None
+
+        await store.store(path1, mimetype='text/html')
+        await store.store(path1, mimetype='text/plain', size=42)
+
+        meta = await store.get(path1)
+        assert meta['mimetype'] == 'text/html'
+        assert meta['size'] == 42
+
+        res = await store.getMany([path1, path2, 'invalid'])
+        assert res[path1]['size'] == 42
+        assert res[path2] is None
+        assert res['invalid'] is None
+
+        await store.close()
+
+        store = IPFSObjectMetadataStore(storepath)
+        assert (await store.get(path1))['size'] == 42
+        await store.close()
+
+    @pytest.mark.asyncio
+    async def test_dirents(self, storepath):
+        store = IPFSObjectMetadataStore(storepath, direntsPageSize=4)
+        entries = [{'Name': str(idx)} for idx in range(10)]
+
+        await store.writeDirEntries(path1, entries[0:3], partial=True)
+        await store.writeDirEntries(path1, entries[3:10], partial=True)
+        assert not await store.dirEntriesComplete(path1)
+
+        pages = [p async for p in store.getDirEntriesPartial(path1)]
+        assert pages == [entries[0:3], entries[3:10]]
+
+        await store.completeDirEntries(path1)
+        assert await store.dirEntriesComplete(path1)
+
+        packs = [p async for p in store.getDirEntries(path1, egenCount=4)]
+        assert sum(packs, []) == entries
+
+        await store.writeDirEntries(path2, entries)
+        packs = [p async for p in store.getDirEntries(path2, egenCount=16)]
+        assert sum(packs, []) == entries
+
+        await store.close()
+
+    @pytest.mark.asyncio
+    async def test_evict(self, storepath):
+        store = IPFSObjectMetadataStore(storepath, maxSize=100,
+                                        evictEvery=0)
+
+        await store.store(path1, data='a' * 48)
+        await store.store(path2, data='b' * 48)
+        await store.evict()
+
+        assert await store.get(path1) is None
+        assert (await store.get(path2))['data'] == 'b' * 48
+        await store.close()
+
+    @pytest.mark.asyncio
+    async def test_migrate(self, tmpdir, storepath):
+        tree = tmpdir.mkdir('mhashmetadb')
+        key = path1[6:]
+        container = tree.mkdir(key[0:8])
+        container.join(key).write_binary(
+            orjson.dumps({'mimetype': 'image/png'}))
+        container.join(f'{key}.direntries').write_binary(
+            orjson.dumps([{'Name': 'a'}, {'Name': 'b'}]))
+
+        store = IPFSObjectMetadataStore(storepath, legacyPath=str(tree))
+        await store.setup()
+
+        assert not tree.check()
+        assert (await store.get(path1))['mimetype'] == 'image/png'
+
+        packs = [p async for p in store.getDirEntries(path1)]
+        assert packs == [[{'Name': 'a'}, {'Name': 'b'}]]
+        await store.close()
+
+    @pytest.mark.asyncio
+    async def test_rdfcache(self, storepath):
+        store = IPFSObjectMetadataStore(storepath)
+
+        assert await store.getRdf(path1, '1') is None
+        assert await store.storeRdf(path1, '1', b'[]')
+        assert await store.getRdf(path1, '1') == b'[]'
+        assert await store.getRdf(path1, '2') is None
+        assert not await store.storeRdf('/ipns/a.org', '1', b'[]')
+        await store.close()
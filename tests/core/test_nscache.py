@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import pytest
+
+from galacteek.ipfs.ipfsops.nscache import IPNSCache
+
+
+key = '/ipns/QmT1TPVjdZ9CRnqwyQ9WygDoRgRRibFrEyWufenu92SuUV'
+path = '/ipfs/QmT1TPVjdZ9CRnqwyQ9WygDoRgRRibFrEyWufenu92SuUV'
+
+
+def nsCache(tmpdir, **kw):
+    kw.setdefault('maxEntries', 16)
+    kw.setdefault('maxAge', 3600)
+    kw.setdefault('staleLifetime', 60)
+    kw.setdefault('snapshotDelay', 0.1)
+    return IPNSCache(tmpdir.join('nscache.json'), **kw)
+
+
+class TestNSCache:
+    @pytest.mark.asyncio
+    async def test_persistence(self, tmpdir):
+        cache = nsCache(tmpdir)
+        cache.nsCacheLoad()
+
+        await cache.nsCacheSet(key, path, origin='ipidmanager')
+        assert cache.nsCacheGet(key) == path
+
+        # Not snapshotted yet, replayed from the log
+        cache2 = nsCache(tmpdir)
+        cache2.nsCacheLoad()
+        assert cache2.nsCacheGet(key, knownOrigin=True) == path
+
+        await asyncio.sleep(0.3)
+        assert cache.stats.snapshots == 1
+        assert not tmpdir.join('nscache.json.log').check()
+
+        cache3 = nsCache(tmpdir)
+        cache3.nsCacheLoad()
+        assert cache3.nsCacheGet(key) == path
+        await cache.close()
+
+    @pytest.mark.asyncio
+    async def test_eviction(self, tmpdir):
+        cache = nsCache(tmpdir, maxEntries=4)
+
+        for idx in range(8):
+            await cache.nsCacheSet(f'/ipns/site{idx}.org', path)
+
+        assert len(cache.cache) == 4
+        assert cache.nsCacheGet('/ipns/site0.org') is None
+        assert cache.nsCacheGet('/ipns/site7.org') == path
+
+        cache.cache['/ipns/site7.org']['resolvedLast'] -= 7200
+        assert cache.nsCacheGet('/ipns/site7.org') is None
+        await cache.close()
+
+    @pytest.mark.asyncio
+    async def test_revalidate(self, tmpdir):
+        cache = nsCache(tmpdir)
+        calls = []
+
+        async def revalidate():
+            calls.append(1)
+            await cache.nsCacheSet(key, '/ipfs/new')
+
+        await cache.nsCacheSet(key, path)
+        cache.cache[key]['resolvedLast'] = int(time.time()) - 30
+
+        assert cache.nsCacheGet(key, maxLifetime=10) is None
+        assert cache.nsCacheGet(
+            key, maxLifetime=10, revalidate=revalidate) == path
+        assert cache.nsCacheGet(
+            key, maxLifetime=10, revalidate=revalidate) == path
+
+        await asyncio.sleep(0.05)
+        assert len(calls) == 1
+        assert cache.nsCacheGet(key, maxLifetime=10) == '/ipfs/new'
+        await cache.close()
@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+
+from galacteek.ipfs.pinning import PinningMaster
+
+
+@pytest.fixture
+def pinner(gConfigInit, tmpdir):
+    return PinningMaster(None, statusFilePath=str(tmpdir.join('pins.json')))
+
+
+class TestPinningScheduler:
+    def test_priorities(self, pinner):
+        for idx in range(3):
+            pinner.pendingPush(('hashmarks', f'/ipfs/h{idx}', True, None,
+                                pinner.queuePriority('hashmarks')))
+
+        for qname in ['a', 'b']:
+            for idx in range(2):
+                pinner.pendingPush((qname, f'/ipfs/{qname}{idx}', True, None,
+                                    pinner.queuePriority(qname)))
+
+        assert pinner.pendingCount == 7
+        assert [pinner.pendingPop()[1] for x in range(7)] == [
+            '/ipfs/a0', '/ipfs/b0', '/ipfs/a1', '/ipfs/b1',
+            '/ipfs/h0', '/ipfs/h1', '/ipfs/h2'
+        ]
+        assert pinner.pendingPop() is None
+
+    @pytest.mark.asyncio
+    async def test_concurrency(self, pinner):
+        done = asyncio.Event()
+        pinned = []
+
+        async def pin(path, recursive=False, qname='default'):
+            await done.wait()
+            pinned.append(path)
+            return (path, 0, 'OK')
+
+        pinner.pin = pin
+
+        for idx in range(10):
+            pinner.pendingPush(('a', f'/ipfs/{idx}', True, None,
+                                pinner.PRIORITY_USER))
+
+        pinner.schedule()
+        assert pinner.runningCount == pinner.cMaxConcurrent
+
+        done.set()
+        while pinner.runningCount > 0:
+            await asyncio.sleep(0.05)
+
+        assert len(pinned) == 10
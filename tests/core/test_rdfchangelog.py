@@ -0,0 +1,57 @@
+from rdflib import URIRef
+from rdflib import Literal
+
+from galacteek.ld.rdf.changelog import GraphChangeLog
+from galacteek.ld.rdf.changelog import GraphDelta
+
+
+s = URIRef('ips://galacteek.ld/test')
+p = URIRef('ips://galacteek.ld/name')
+
+
+class TestGraphChangeLog:
+    def test_delta(self):
+        clog = GraphChangeLog(maxEntries=8)
+        assert clog.revision == 0
+
+        clog.recordAdd((s, p, Literal('a')))
+        clog.recordAdd((s, p, Literal('b')))
+        rev = clog.revision
+
+        clog.recordRemove((s, p, Literal('a')))
+        clog.recordAdd((s, p, Literal('c')))
+
+        delta = clog.changesSince(rev)
+        assert delta.toRevision == clog.revision
+        assert delta.added == [(s, p, Literal('c'))]
+        assert delta.removed == [(s, p, Literal('a'))]
+
+        g = GraphDelta.graphFromNt(GraphDelta.ntriples(delta.added))
+        assert (s, p, Literal('c')) in g
+
+        # Revision from the future
+        assert clog.changesSince(clog.revision + 1) is None
+
+    def test_journal_overflow(self):
+        clog = GraphChangeLog(maxEntries=2)
+
+        for x in range(4):
+            clog.recordAdd((s, p, Literal(str(x))))
+
+        assert clog.changesSince(0) is None
+        assert len(clog.changesSince(2).added) == 2
+
+    def test_reset(self):
+        clog = GraphChangeLog()
+        clog.recordAdd((s, p, Literal('a')))
+        epoch, rev = clog.epoch, clog.revision
+
+        clog.reset()
+        assert clog.epoch != epoch
+        assert clog.revision == rev
+        assert clog.changesSince(0) is None
+
+        # Deltas don't share their lists
+        d1, d2 = GraphDelta(0, 1), GraphDelta(0, 1)
+        d1.added.append((s, p, Literal('a')))
+        assert d2.added == []
@@ -0,0 +1,71 @@
+import pytest
+
+from rdflib import URIRef
+from rdflib import Literal
+from rdflib.plugins.stores.memory import Memory
+
+from galacteek.ld import rdf
+from galacteek.ld.rdf import BaseGraph
+from galacteek.ld.rdf import IConjunctiveGraph
+from galacteek.ld.sparql import querydb
+
+
+s = URIRef('ips://galacteek.ld/test')
+p = URIRef('ips://galacteek.ld/name')
+
+query = '''
+SELECT ?name WHERE {
+    ?s <ips://galacteek.ld/name> ?name .
+}
+'''
+
+
+class App:
+    executor = None
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(rdf, 'runningApp', lambda: App())
+
+
+class TestQueries:
+    def test_querydb(self):
+        assert querydb.get('HashmarksSearch') is \
+            querydb.get('HashmarksSearch')
+        assert querydb.prepared('HashmarksSearch') is \
+            querydb.prepared('HashmarksSearch')
+        assert querydb.prepare('SELECT ?s WHERE { ?s un:known ?o }') is None
+
+    @pytest.mark.asyncio
+    async def test_results_cache(self, app):
+        graph = BaseGraph()
+        graph.add((s, p, Literal('a')))
+
+        results = await graph.queryAsync(query, cache=True)
+        assert [str(r['name']) for r in results] == ['a']
+        assert await graph.queryAsync(query, cache=True) is results
+
+        # Bindings are part of the key
+        bound = await graph.queryAsync(
+            query, initBindings={'s': URIRef('urn:x')}, cache=True)
+        assert list(bound) == []
+
+        rev = graph.storeRevision
+        graph.add((s, p, Literal('b')))
+        assert graph.storeRevision > rev
+
+        results = await graph.queryAsync(query, cache=True)
+        assert sorted(str(r['name']) for r in results) == ['a', 'b']
+
+    @pytest.mark.asyncio
+    async def test_shared_store(self, app):
+        store = Memory()
+        cgraph = IConjunctiveGraph(store=store)
+        graph = BaseGraph(store, identifier=URIRef('urn:g:1'))
+
+        assert len(await cgraph.queryAsync(query, cache=True)) == 0
+
+        # A write in a graph of the store invalidates the cached results
+        graph.add((s, p, Literal('a')))
+        assert len(await cgraph.queryAsync(query, cache=True)) == 1
@@ -0,0 +1,40 @@
+import random
+
+from galacteek.core.models.rowdiff import rowsDiff
+from galacteek.core.models.rowdiff import rowsPatch
+
+
+def ident(row):
+    return row[0]
+
+
+class TestRowsDiff:
+    def test_ops(self):
+        old = [('a', 1), ('b', 1), ('c', 1), ('d', 1)]
+        new = [('a', 1), ('c', 2), ('b', 1), ('e', 1)]
+
+        ops = list(rowsDiff(old, new, identity=ident))
+        assert ops == [
+            ('remove', 3, 1),
+            ('move', 2, 1),
+            ('change', 1, [('c', 2)]),
+            ('insert', 3, [('e', 1)])
+        ]
+        assert rowsPatch(list(old), ops) == new
+
+        # Unchanged
+        assert list(rowsDiff(old, list(old), identity=ident)) == []
+
+    def test_random(self):
+        rnd = random.Random(42)
+
+        def rows():
+            return [(rnd.randint(0, 8), rnd.randint(0, 2))
+                    for x in range(rnd.randint(0, 12))]
+
+        for x in range(2000):
+            old, new = rows(), rows()
+
+            for identity in [None, ident]:
+                ops = list(rowsDiff(old, new, identity=identity))
+                assert rowsPatch(list(old), ops) == new
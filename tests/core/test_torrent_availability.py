@@ -0,0 +1,46 @@
+import random
+
+from galacteek.torrent.availability import PieceAvailability
+
+
+class TestPieceAvailability:
+    def test_updates(self):
+        rnd = random.Random(7)
+        piece_count = 500
+        availability = PieceAvailability(piece_count)
+        counts = [0] * piece_count
+
+        availability.track(range(piece_count))
+
+        for _ in range(5000):
+            index = rnd.randrange(piece_count)
+            if rnd.random() < 0.6:
+                availability.increment(index)
+                counts[index] += 1
+            elif counts[index]:
+                availability.decrement(index)
+                counts[index] -= 1
+
+            if rnd.random() < 0.02:
+                availability.untrack(rnd.randrange(piece_count))
+
+        tracked = [index for index in range(piece_count)
+                   if availability.is_tracked(index)]
+        assert len(tracked) == availability.tracked_count
+        assert [availability.count(index)
+                for index in range(piece_count)] == counts
+
+        def is_candidate(index):
+            return index % 2 == 0
+
+        owned = [index for index in tracked
+                 if counts[index] and is_candidate(index)]
+
+        rarest = availability.select_rarest(is_candidate, select_among=1)
+        assert counts[rarest] == min(counts[index] for index in owned)
+
+        endgame = availability.select_endgame(is_candidate)
+        assert counts[endgame] == max(counts[index] for index in owned)
+
+        assert availability.select_random(is_candidate) in owned
+        assert availability.select_rarest(lambda index: False) is None